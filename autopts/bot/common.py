@@ -19,6 +19,7 @@ import datetime
 import importlib
 import json
 import logging
+import math
 import os
 import shutil
 import subprocess
@@ -30,11 +31,13 @@ from argparse import Namespace
 from pathlib import Path
 
 from autopts import client as autoptsclient
-from autopts.bot.common_features import github, google_drive, mail, report
+from autopts.bot.common_features import github, google_drive, mail, report, run_journal
+from autopts.bot.common_features.run_journal import RunJournal
 from autopts.client import Client, CliParser, TestCaseRunStats, init_logging, run_recovery
 from autopts.config import AUTOPTS_ROOT_DIR, MAX_SERVER_RESTART_TIME, generate_file_paths, SERIAL_BAUDRATE
 from autopts.ptsprojects.boards import get_debugger_snr, get_free_device, get_tty, release_device
-from autopts.ptsprojects.testcase_db import DATABASE_FILE
+from autopts.ptsprojects.testcase_db import DATABASE_FILE, QUARANTINE_FAILING, QUARANTINE_FLAKY, TestCaseTable
+from autopts.pybtp.iutctl_common import DEFAULT_FATAL_LOG_PATTERNS
 from autopts.types import AutoPTSMode
 
 log = logging.debug
@@ -65,6 +68,10 @@ class BuildAndFlashException(Exception):
     pass
 
 
+class QuarantineSkipException(Exception):
+    pass
+
+
 class BotCliParser(CliParser):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -125,15 +132,24 @@ class BotConfigArgs(Namespace):
         self.bd_addr = args.get('bd_addr', '')
         self.pts_addr = args.get('pts_addr', '')
         self.enable_max_logs = args.get('enable_max_logs', False)
+        self.pts_log_types = args.get('pts_log_types', None)
         self.retry = args.get('retry', 0)
         self.no_retry_on_regression = args.get('no_retry_on_regression')
+        self.adaptive_retry = args.get('adaptive_retry', False)
+        self.reuse_cached_pass = args.get('reuse_cached_pass', False)
         self.repeat_until_fail = args.get('repeat_until_fail', False)
         self.stress_test = args.get('stress_test', False)
+        self.repeat = args.get('repeat', 0)
+        self.repeat_time = float(args.get('repeat_time', 0))
         self.ykush = args.get('ykush', None)
         self.ykush_replug_delay = args.get('ykush_replug_delay', 3)
         self.active_hub_server = args.get('active_hub_server', None)
         self.recovery = args.get('recovery', False)
+        self.skip_healthy_recovery = args.get('skip_healthy_recovery', False)
         self.superguard = float(args.get('superguard', 0))
+        self.learned_superguard = args.get('learned_superguard', False)
+        self.quarantine = args.get('quarantine', None)
+        self.fatal_log_patterns = args.get('fatal_log_patterns', DEFAULT_FATAL_LOG_PATTERNS)
         self.cron_optim = args.get('cron_optim', False)
         self.project_repos = args.get('repos', None)
         self.test_case_limit = args.get('test_case_limit', 0)
@@ -146,6 +162,7 @@ class BotConfigArgs(Namespace):
         self.dongle_init_retry = args.get('dongle_init_retry', 5)
         self.build_env_cmd = args.get('build_env_cmd', None)
         self.copy_workspace = args.get('copy_workspace', True)
+        self.incremental_log_pull = args.get('incremental_log_pull', False)
         self.wid_usage = args.get('wid_usage', False)
         self.pts_addr_map = args.get('pts_addr_map', {})
         self.restricted_pts_addrs = args.get('restricted_pts_addrs', [])
@@ -192,10 +209,16 @@ class BotClient(Client):
         self.backup = {'available': False,
                        'create': False,
                        'all_stats': None,
-                       'tc_stats': None}
+                       'resume_plan': None}
+        # Journal of the test run, if the backup mode is enabled
+        self.journal = None
         # Parser for more informative test failure information
         self.fail_info_parser = None
+        # Indexes the failure information of the finished test cases
+        self.fail_info_indexer = None
         self.error_txt_content = ""
+        # Puller of PTS logs, if pulled incrementally between test cases
+        self.server_logs_puller = None
 
     def parse_or_find_tty(self, args):
         if args.tty_alias:
@@ -214,56 +237,27 @@ class BotClient(Client):
     def load_backup_of_previous_run(self):
         """
         If the backup mode was enabled in the previous test run, and it
-        has been terminated unexpectedly, it is possible to resume the test series
-        from the last remembered config/test_case.
+        has been terminated unexpectedly, it is possible to resume the test
+        series from the run journal. The test cases done are not run again
+        and the test case in progress at the termination is retried once.
         """
 
         self.load_test_case_database()
 
-        continue_test_case = None
-        continue_config = None
+        plan = run_journal.plan_resume(RunJournal.read(self.file_paths['RUN_JOURNAL_FILE']))
+        if plan is None:
+            return
+
         if os.path.exists(self.file_paths['ALL_STATS_JSON_FILE']):
             self.backup['all_stats'] = TestCaseRunStats.load_from_backup(self.file_paths['ALL_STATS_JSON_FILE'])
             self.backup['all_stats'].db = self.test_case_database
-            continue_config = self.backup['all_stats'].pending_config
-
-            # The last config and test case preformed in the broken test run
-            if os.path.exists(self.file_paths['TC_STATS_JSON_FILE']):
-                self.backup['tc_stats'] = TestCaseRunStats.load_from_backup(self.file_paths['TC_STATS_JSON_FILE'])
-                self.backup['tc_stats'].db = self.test_case_database
-                continue_config = self.backup['tc_stats'].pending_config
-                continue_test_case = self.backup['tc_stats'].pending_test_case
 
-        if continue_config is None:
-            return
-
-        with open(self.file_paths['TEST_CASES_JSON_FILE']) as f:
-            data = f.read()
-            run_config = json.loads(data)
-
-        # Skip already completed configs
-        if continue_test_case:
-            # Skip already completed test cases and the faulty one
-            config = run_config[continue_config]
-            tc_index = config['test_cases'].index(continue_test_case)
-            config['test_cases'] = config['test_cases'][tc_index + 1:]
-            self.backup['tc_stats'].index += 1
-            self.backup['tc_stats'].update(continue_test_case, 0, 'TIMEOUT')
-
-            if not config['test_cases']:
-                # The faulty test case was the last one in the config. Move to the next config
-                self._merge_stats(self.backup['all_stats'], self.backup['tc_stats'])
-                self.backup['all_stats'].save_to_backup(self.file_paths['ALL_STATS_JSON_FILE'])
-                self.backup['tc_stats'] = None
-                continue_config += 1
-
-        run_config = run_config[continue_config:]
         self.backup['available'] = True
-        self.backup['run_config'] = run_config
+        self.backup['resume_plan'] = plan
 
-        if not run_config:
-            # All test cases done, the last one was faulty
-            self.backup['all_stats'].test_run_completed = True
+        if plan.completed:
+            if self.backup['all_stats']:
+                self.backup['all_stats'].test_run_completed = True
             return
 
         self.backup['skip_build'] = True
@@ -291,7 +285,7 @@ class BotClient(Client):
         if errmsg:
             return errmsg
 
-        if self.args.use_backup and os.path.exists(self.file_paths['ALL_STATS_JSON_FILE']):
+        if self.args.use_backup and os.path.exists(self.file_paths['RUN_JOURNAL_FILE']):
             self.load_backup_of_previous_run()
 
         return errmsg
@@ -316,9 +310,8 @@ class BotClient(Client):
         files_to_save = [
             self.file_paths['ALL_STATS_RESULTS_XML_FILE'],
             self.file_paths['TC_STATS_RESULTS_XML_FILE'],
-            self.file_paths['TEST_CASES_JSON_FILE'],
+            self.file_paths['RUN_JOURNAL_FILE'],
             self.file_paths['ALL_STATS_JSON_FILE'],
-            self.file_paths['TC_STATS_JSON_FILE'],
             self.file_paths['BOT_STATE_JSON_FILE'],
         ]
 
@@ -329,11 +322,13 @@ class BotClient(Client):
         limit_counter = 0
 
         if self.backup['available']:
-            if self.backup['all_stats'].test_run_completed:
+            plan = self.backup['resume_plan']
+            if plan.completed:
                 # All test cases have been completed before termination
                 return
 
-            run_config = self.backup['run_config']
+            self.run_config = plan.schedule
+            run_config = plan.run_config
         else:
             _run_order, config_testcases_map = get_filtered_test_cases(
                 self.iut_config, self.args, self.config_default, self.ptses[0])
@@ -360,28 +355,66 @@ class BotClient(Client):
 
             self.run_config = new_run_config
 
-        if self.args.use_backup:
-            with open(self.file_paths['TEST_CASES_JSON_FILE'], 'w') as file:
-                file.write(json.dumps(run_config, indent=4))
+            if self.args.quarantine and self.test_case_database:
+                run_config = schedule_quarantine(run_config, self.test_case_database.get_quarantine(),
+                                                 self.args.quarantine)
+                self.run_config = run_config
+            self._journal(run_journal.SCHEDULE, run_config=run_config)
+            run_config = list(enumerate(run_config))
 
-        for i, entry in enumerate(run_config):
+        for i, (config, entry) in enumerate(run_config):
             run_args = copy.deepcopy(self.args)
             run_args.test_cases = entry['test_cases']
             run_args.iut_map = entry['iut_map']
             run_args.iut_config_file = entry['config_file']
+            run_args.retry = entry.get('retry', self.args.retry)
+            run_args.quarantine_phase = entry.get('phase')
 
             if i == 0 and self.args.use_backup and self.backup.get('skip_build', False):
                 run_args.no_build = True
 
-            yield i, run_args
+            yield config, run_args
+
+    def _journal(self, record_type, **data):
+        if self.journal:
+            self.journal.append(record_type, **data)
+
+    def _resume_tc_stats(self, stats, plan):
+        """Continues the stats of the config in progress at the termination"""
+        stats.index = plan.done_count
+
+        if plan.session_log_dir:
+            stats.session_log_dir = plan.session_log_dir
 
-    def _backup_tc_stats(self, config=None, test_case=None, stats=None, **kwargs):
-        if not self.backup or not stats:
+        if plan.timed_out_test_case:
+            # Terminated the test run twice, do not retry again
+            stats.update(plan.timed_out_test_case, 0, 'TIMEOUT')
+            stats.index += 1
+            self._journal(run_journal.DONE, config=plan.config,
+                          test_case=plan.timed_out_test_case, status='TIMEOUT')
+
+    def _pull_server_logs_incrementally(self):
+        if not self.args.incremental_log_pull or not self.args.copy_workspace or \
+                self.args.autopts_mode == AutoPTSMode.GUI_CLIENT_ONLY:
             return
 
-        stats.pending_config = config
-        stats.pending_test_case = test_case
-        stats.save_to_backup(self.file_paths['TC_STATS_JSON_FILE'])
+        try:
+            if self.server_logs_puller is None:
+                self.server_logs_puller = report.ServerLogsPuller(self.args,
+                                                                  self.file_paths['TMP_DIR'],
+                                                                  self.file_paths['PTS_XMLS_DIR'])
+            self.server_logs_puller.pull()
+        except BaseException as e:
+            logging.exception(e)
+
+    def _index_fail_info(self):
+        if not self.fail_info_indexer:
+            return
+
+        try:
+            self.fail_info_indexer()
+        except BaseException as e:
+            logging.exception(e)
 
     def _merge_stats(self, all_stats, stats):
         all_stats.merge(stats)
@@ -389,9 +422,6 @@ class BotClient(Client):
         if os.path.exists(stats.xml_results):
             os.remove(stats.xml_results)
 
-        if os.path.exists(self.file_paths['TC_STATS_JSON_FILE']):
-            os.remove(self.file_paths['TC_STATS_JSON_FILE'])
-
     def _ensure_ptses_ready(self, args):
         while True:
             try:
@@ -407,7 +437,27 @@ class BotClient(Client):
 
     def run_test_cases(self):
         all_stats = self.backup['all_stats']
-        stats = self.backup['tc_stats']
+        resume_plan = self.backup['resume_plan']
+        stats = None
+        run_start = time.monotonic()
+        quarantine = self.args.quarantine or {}
+
+        if quarantine and self.test_case_database:
+            self.test_case_database.quarantine_expire_passes = quarantine.get(
+                'expire_passes', self.test_case_database.quarantine_expire_passes)
+            self.test_case_database.quarantine_failing_count = quarantine.get(
+                'failing_count', self.test_case_database.quarantine_failing_count)
+
+        lane_addr = autoptsclient.normalize_bd_addr(quarantine.get('flaky_pts_addr'))
+
+        # Journaled when it starts, a termination before that retries it again
+        retried_test_case = None
+        if resume_plan and resume_plan.retried_test_case:
+            retried_test_case = (resume_plan.config, resume_plan.retried_test_case)
+
+        if self.args.use_backup:
+            self.journal = RunJournal(self.file_paths['RUN_JOURNAL_FILE'])
+            self.journal.open()
 
         if not all_stats:
             all_stats = TestCaseRunStats([], [], 0, xml_results_file=self.file_paths['ALL_STATS_RESULTS_XML_FILE'])
@@ -421,15 +471,25 @@ class BotClient(Client):
         for config, config_args in self._yield_next_config():
             try:
                 if not stats:
+                    resumed = resume_plan is not None and config == resume_plan.config
+                    # The results of the test cases done before the termination
+                    # are kept in the XML results file.
+                    test_cases = resume_plan.schedule[config]['test_cases'] if resumed else config_args.test_cases
                     stats = TestCaseRunStats(projects,
-                                             config_args.test_cases,
+                                             test_cases,
                                              config_args.retry,
                                              self.test_case_database,
                                              xml_results_file=self.file_paths['TC_STATS_RESULTS_XML_FILE'])
                     stats.session_log_dir = all_stats.session_log_dir
 
-                    if self.args.use_backup:
-                        self._backup_tc_stats(config=config, test_case=None, stats=stats)
+                    if resumed:
+                        self._resume_tc_stats(stats, resume_plan)
+
+                    self._journal(run_journal.CONFIG, config=config)
+
+                if config_args.quarantine_phase == QUARANTINE_FAILING and \
+                        time.monotonic() - run_start > quarantine.get('time_budget', math.inf) * 60:
+                    raise QuarantineSkipException
 
                 self.apply_config(config_args, config_args.iut_config_file,
                                   self.iut_config[config_args.iut_config_file])
@@ -441,10 +501,25 @@ class BotClient(Client):
                     for addr in getattr(self.args, "restricted_pts_addrs", []) or []
                 }
 
+                if lane_addr and config_args.quarantine_phase == QUARANTINE_FLAKY:
+                    # The flaky test cases run on the dedicated PTS lane
+                    rules = {tc: lane_addr for tc in config_args.test_cases} | rules
+                elif lane_addr:
+                    restricted_pts_addrs.add(lane_addr)
+
                 runtime_test_case_cache = {}
 
                 def _pre_test_case_fn(config=None, test_case=None, stats=None, **kwargs):
-                    self._backup_tc_stats(config=config, test_case=test_case, stats=stats, **kwargs)
+                    nonlocal retried_test_case
+
+                    if (config, test_case) == retried_test_case:
+                        self._journal(run_journal.RESUME, config=config, test_case=test_case)
+                        retried_test_case = None
+
+                    self._journal(run_journal.START, config=config, test_case=test_case,
+                                  session_log_dir=stats.session_log_dir)
+                    self._pull_server_logs_incrementally()
+                    self._index_fail_info()
 
                     mapped_addr = rules.get(test_case) if test_case else None
 
@@ -474,6 +549,8 @@ class BotClient(Client):
                         'test_cases': selected_test_cases,
                     }
 
+                def _post_test_case_fn(config=None, test_case=None, status=None, **kwargs):
+                    self._journal(run_journal.DONE, config=config, test_case=test_case, status=status)
 
                 stats = autoptsclient.run_test_cases(self.ptses,
                                                      self.test_cases,
@@ -481,6 +558,7 @@ class BotClient(Client):
                                                      stats,
                                                      config=config,
                                                      pre_test_case_fn=_pre_test_case_fn,
+                                                     post_test_case_fn=_post_test_case_fn,
                                                      file_paths=copy.deepcopy(self.file_paths))
 
             except BuildAndFlashException:
@@ -488,6 +566,14 @@ class BotClient(Client):
                 for tc in config_args.test_cases:
                     status = 'BUILD_OR_FLASH ERROR'
                     stats.update(tc, time.time(), status)
+                    self._journal(run_journal.DONE, config=config, test_case=tc, status=status)
+
+            except QuarantineSkipException:
+                log(f'Time budget exceeded, failing test cases of config {self.run_config[config]["config_file"]} skipped')
+                for tc in config_args.test_cases:
+                    status = 'QUARANTINED'
+                    stats.update(tc, 0, status)
+                    self._journal(run_journal.DONE, config=config, test_case=tc, status=status)
 
             if stats:
                 self._merge_stats(all_stats, stats)
@@ -495,6 +581,7 @@ class BotClient(Client):
 
             if self.args.use_backup:
                 all_stats.save_to_backup(self.file_paths['ALL_STATS_JSON_FILE'])
+                self._journal(run_journal.CONFIG_DONE, config=config)
 
         # End of bot run - all test cases completed
         if all_stats.num_test_cases == 0:
@@ -507,6 +594,8 @@ class BotClient(Client):
         if self.args.use_backup:
             all_stats.test_run_completed = True
             all_stats.save_to_backup(self.file_paths['ALL_STATS_JSON_FILE'])
+            self._journal(run_journal.COMPLETED)
+            self.journal.close()
 
         try:
             mapping = {'GMCS': 'MCS',
@@ -586,6 +675,8 @@ class BotClient(Client):
                 report.make_error_txt(self.error_txt_content, self.file_paths['ERROR_TXT_FILE'])
 
         if self.fail_info_parser:
+            # Index the logs of the last test case
+            self._index_fail_info()
             stats.fail_info_cb = self.fail_info_parser
 
         report_data = bot_state
@@ -625,7 +716,8 @@ class BotClient(Client):
             report_data['pts_logs_folder'], report_data['pts_xml_folder'] = \
                 report.pull_server_logs(self.args,
                                         self.file_paths['TMP_DIR'],
-                                        self.file_paths['PTS_XMLS_DIR'])
+                                        self.file_paths['PTS_XMLS_DIR'],
+                                        puller=self.server_logs_puller)
 
         report.make_report_xlsx(self.file_paths['REPORT_XLSX_FILE'],
                                 report_data['tc_results'],
@@ -643,6 +735,8 @@ class BotClient(Client):
                                report_data['repo_status'],
                                report_data['errata'])
 
+        self.make_slowest_wids_txt(stats)
+
         if 'githubdrive' in self.bot_config or 'gdrive' in self.bot_config:
             self.make_report_folder(report_data)
 
@@ -666,6 +760,21 @@ class BotClient(Client):
         # Entry point of the simple client layer
         return super().start()
 
+    def make_slowest_wids_txt(self, stats):
+        all_runs_table = None
+
+        # The test case database has been closed and moved at the end of the run
+        if stats.db and os.path.exists(self.args.database_file):
+            db = TestCaseTable(stats.db.name, self.args.database_file)
+            try:
+                all_runs_table = autoptsclient.get_formatted_slowest_wids(db.get_wid_latencies())
+            finally:
+                db.close()
+
+        report.make_slowest_wids_txt(self.file_paths['SLOWEST_WIDS_TXT_FILE'],
+                                     autoptsclient.get_formatted_slowest_wids(stats.wid_latencies),
+                                     all_runs_table)
+
     def make_readme_md(self, readme_md_path, report_data):
         """Creates README.md for Github logging repo
         """
@@ -718,6 +827,7 @@ class BotClient(Client):
             self.file_paths['REPORT_TXT_FILE'],
             (self.file_paths['REPORT_TXT_FILE'], f'report_{report_data["start_time_stamp"]}.txt'),
             (self.file_paths['REPORT_XLSX_FILE'], f'report_{report_data["start_time_stamp"]}.xlsx'),
+            self.file_paths['SLOWEST_WIDS_TXT_FILE'],
             self.file_paths['REPORT_README_MD_FILE'],
             report_data['database_file'],
         ]
@@ -987,6 +1097,31 @@ def split_test_cases_per_iut_target(run_order, config_testcases_map, iut_target_
     return list(grouped.values())
 
 
+def schedule_quarantine(run_config, quarantine, options):
+    """Splits the run config entries into the phases of the stable, the
+    flaky and the consistently failing test cases, run in this order.
+
+    quarantine -- {test case name: quarantine state}
+    options -- the quarantine bot options, the flaky test cases get the
+               flaky_retry retries
+    """
+    phases = {None: [], QUARANTINE_FLAKY: [], QUARANTINE_FAILING: []}
+
+    for entry in run_config:
+        test_cases = {}
+        for tc in entry['test_cases']:
+            test_cases.setdefault(quarantine.get(tc), []).append(tc)
+
+        for phase, tcs in test_cases.items():
+            phase_entry = dict(entry, test_cases=tcs, phase=phase)
+            if phase == QUARANTINE_FLAKY and 'flaky_retry' in options:
+                phase_entry['retry'] = options['flaky_retry']
+
+            phases[phase].append(phase_entry)
+
+    return [entry for entries in phases.values() for entry in entries]
+
+
 def sort_and_reduce_prefixes(prefixes):
     sorted_prefixes = sorted(prefixes, key=len)
     final_prefixes = []
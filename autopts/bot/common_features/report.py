@@ -14,10 +14,12 @@
 #
 
 import datetime
+import io
 import logging
 import os
 import re
 import shutil
+import xmlrpc.client
 import zipfile
 from pathlib import Path
 from xmlrpc.client import ServerProxy
@@ -28,9 +30,9 @@ import yaml
 
 from autopts.bot import common
 from autopts.bot.common_features import github
-from autopts.client import PtsDirectClient
 from autopts.config import AUTOPTS_ROOT_DIR
 from autopts.types import AutoPTSMode
+from autopts.utils import PTS_WORKSPACE_KEEP_FILE_EXTS, archive_workspace_logs
 
 log = logging.debug
 
@@ -242,10 +244,27 @@ def make_report_txt(report_txt_path, results_dict, regressions_list,
             if tc in errata:
                 res = f'{res} - ERRATA {errata[tc]}'
 
+            if result.get("flake_score") is not None:
+                res = f'{res} - FLAKE {result["flake_score"]:.2f}'
+
+            if result.get("cached"):
+                res = f'{res} - CACHED'
+
             tg = tc.split('/')[0]
             f.write(f"{tg.ljust(8, ' ')}{tc.ljust(32, ' ')}{res}\n")
 
 
+def make_slowest_wids_txt(slowest_wids_txt_path, run_table, all_runs_table=None):
+    """Creates txt file with the slowest WIDs of this run and, if the
+    test case database is used, of all runs
+    """
+    with open(slowest_wids_txt_path, "w") as f:
+        f.write(f"Slowest WIDs of this run:\n{run_table}\n")
+
+        if all_runs_table:
+            f.write(f"\nSlowest WIDs of all runs:\n{all_runs_table}\n")
+
+
 def report_parse_test_cases(report):
     if not os.path.exists(report):
         return None
@@ -393,33 +412,123 @@ def copy_server_log_file(tmp_dir, pts, ports):
         logging.exception(e)
 
 
-def pull_server_logs(args, tmp_dir, xml_folder):
-    """Copy Bluetooth Protocol Viewer logs from auto-pts servers.
-    :param args: args
+# Maximum size of the uncompressed logs pulled with a single request
+SERVER_LOGS_CHUNK_SIZE = 32 * 1024 * 1024
+
+
+class ServerLogsPuller:
+    """Pulls Bluetooth Protocol Viewer logs from auto-pts servers.
+
+    The logs can be pulled incrementally between test cases. Each pull
+    fetches only the files created or modified since the previous one.
     """
 
-    workspace_name = os.path.basename(args.workspace)
-    pqw6_ext = '.pqw6'
-    if workspace_name.endswith(pqw6_ext):
-        workspace_name = workspace_name[:-len(pqw6_ext)]
-        workspace_dir = os.path.dirname(args.workspace)
-    else:
-        workspace_dir = workspace_name
+    def __init__(self, args, tmp_dir, xml_folder):
+        self.args = args
+        self.tmp_dir = tmp_dir
+        self.xml_folder = xml_folder
+
+        workspace_name = os.path.basename(args.workspace)
+        pqw6_ext = '.pqw6'
+        if workspace_name.endswith(pqw6_ext):
+            workspace_name = workspace_name[:-len(pqw6_ext)]
+            self.workspace_dir = os.path.dirname(args.workspace)
+        else:
+            self.workspace_dir = workspace_name
+
+        self.logs_folder = os.path.join(tmp_dir, workspace_name)
+        shutil.rmtree(self.logs_folder, ignore_errors=True)
+        shutil.rmtree(xml_folder, ignore_errors=True)
+        Path(xml_folder).mkdir(parents=True, exist_ok=True)
+
+        # Pull cursor of each server
+        self._cursors = {}
+        # The latest PASS .xml log of each test case
+        self._last_xmls = {}
+
+    def _get_servers(self):
+        servers = {}
+        for address, port in zip(self.args.ip_addr, self.args.srv_port, strict=False):
+            if address in servers:
+                servers[address].append(port)
+            else:
+                servers[address] = [port]
 
-    logs_folder = os.path.join(tmp_dir, workspace_name)
-    shutil.rmtree(logs_folder, ignore_errors=True)
-    shutil.rmtree(xml_folder, ignore_errors=True)
-    Path(xml_folder).mkdir(parents=True, exist_ok=True)
+        return servers
 
-    def _pull_logs(_pts):
-        last_xml = ('', '')
-        file_list = _pts.list_workspace_tree(workspace_dir)
+    def pull(self, final=False):
+        if self.args.autopts_mode == AutoPTSMode.AUTO_CLIENT_ONLY:
+            # Logs available locally
+            from autoptsserver import get_workspace
 
-        if args.cron_optim:
-            _pts.shutdown_pts_bpv()
+            def _pull_workspace_logs(workspace_dir, cursor, max_bytes):
+                if not Path(workspace_dir).is_absolute():
+                    workspace_dir = get_workspace(workspace_dir)
+                return archive_workspace_logs(workspace_dir, cursor, max_bytes)
+
+            self._pull_from('local', _pull_workspace_logs)
+            return
+
+        # Use xmlrpc proxy to pull logs
+        servers = self._get_servers()
+        for addr in servers:
+            with ServerProxy(f"http://{addr}:{servers[addr][0]}/",
+                             allow_none=True) as proxy:
+                if final and self.args.cron_optim:
+                    proxy.shutdown_pts_bpv()
+
+                try:
+                    self._pull_from(addr, proxy.pull_workspace_logs)
+                except xmlrpc.client.Fault as e:
+                    # autoptsserver without support of archived pull
+                    log(e)
+                    self._pull_file_by_file(proxy)
+
+                if final:
+                    copy_server_log_file(self.tmp_dir, proxy, servers[addr])
+
+    def _pull_from(self, key, pull_workspace_logs):
+        more = True
+        while more:
+            result = pull_workspace_logs(self.workspace_dir,
+                                         self._cursors.get(key, 0.0),
+                                         SERVER_LOGS_CHUNK_SIZE)
+            self._cursors[key] = result['cursor']
+            more = result['more']
+
+            archive = result['archive']
+            archive = getattr(archive, 'data', archive)
+
+            with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+                zf.extractall(self.logs_folder)
+
+            for xml_path in result['pass_xmls']:
+                self._add_pass_xml(os.path.join(self.logs_folder, xml_path))
+
+    def _add_pass_xml(self, file_path):
+        # Include PTS .xml logs of test cases with PASS verdict
+        # into a separate "XMLs" folder. Those will have reference
+        # entries in report.xlsx
+        test_name, timestamp = split_xml_filename(file_path)
+        last_xml = self._last_xmls.get(test_name)
+
+        if last_xml:
+            # When single test passes multiple times
+            # (e.g. when 'stress-test' parameter is used)
+            # include only the latest one in report.
+            if timestamp <= last_xml[1]:
+                return
+            os.remove(last_xml[0])
+
+        xml_file_path = os.path.join(self.xml_folder, os.path.basename(file_path))
+        shutil.copy(file_path, xml_file_path)
+        self._last_xmls[test_name] = (xml_file_path, timestamp)
+
+    def _pull_file_by_file(self, _pts):
+        file_list = _pts.list_workspace_tree(self.workspace_dir)
 
         if not file_list:
-            log(f"No files found in workspace: {workspace_dir}")
+            log(f"No files found in workspace: {self.workspace_dir}")
             return
 
         # Last path will be workspace directory
@@ -427,18 +536,16 @@ def pull_server_logs(args, tmp_dir, xml_folder):
 
         while len(file_list) > 0:
             file_path = file_list.pop(0)
-            xml_file_path = file_path
             try:
                 file_bin = _pts.copy_file(file_path)
 
-                if not any(file_path.endswith(ext) for ext in
-                           ['.pts', '.pqw6', '.xlsx', '.gitignore', '.bls', '.bqw', '.btt']):
+                if not file_path.endswith(PTS_WORKSPACE_KEEP_FILE_EXTS):
                     _pts.delete_file(file_path)
 
                 if file_bin is None:
                     continue
 
-                file_path = '/'.join([logs_folder,
+                file_path = '/'.join([self.logs_folder,
                                       file_path[len(workspace_root) + 1:]
                                      .replace('\\', '/')])
                 Path(os.path.dirname(file_path)).mkdir(parents=True,
@@ -447,55 +554,24 @@ def pull_server_logs(args, tmp_dir, xml_folder):
                 with open(file_path, 'wb') as handle:
                     handle.write(file_bin.data)
 
-                # Include PTS .xml logs of test cases with PASS verdict
-                # into a separate "XMLs" folder. Those will have reference
-                # entries in report.xlsx
                 if file_path.endswith('.xml') and 'tc_log' not in file_path \
                         and b'Final Verdict:PASS' in file_bin.data:
-                    (test_name, timestamp) = split_xml_filename(file_path)
-                    if test_name in last_xml[0]:
-                        # When single test passes multiple times
-                        # (e.g. when 'stress-test' parameter is used)
-                        # include only the latest one in report.
-                        if timestamp <= last_xml[1]:
-                            continue
-                        os.remove(last_xml[0])
-                    xml_file_path = \
-                        '/'.join([xml_folder,
-                                  xml_file_path[
-                                  xml_file_path.rfind('\\') + 1:]
-                                 .replace('\\', '/')])
-                    Path(os.path.dirname(xml_file_path)).mkdir(
-                        parents=True,
-                        exist_ok=True)
-                    with open(xml_file_path, 'wb') as handle:
-                        handle.write(file_bin.data)
-                    last_xml = (xml_file_path, timestamp)
+                    self._add_pass_xml(file_path)
             except BaseException as e:
                 logging.exception(e)
 
-    if args.autopts_mode == AutoPTSMode.AUTO_CLIENT_ONLY:
-        # Logs available locally
-        _pull_logs(PtsDirectClient)
-    else:
-        # Use xmlrpc proxy to pull logs
-        server_addr = args.ip_addr
-        server_port = args.srv_port
 
-        servers = {}
-        for address, port in zip(server_addr, server_port, strict=False):
-            if address in servers:
-                servers[address].append(port)
-            else:
-                servers[address] = [port]
+def pull_server_logs(args, tmp_dir, xml_folder, puller=None):
+    """Copy Bluetooth Protocol Viewer logs from auto-pts servers.
+    :param args: args
+    :param puller: ServerLogsPuller used earlier for incremental pulls
+    """
+    if puller is None:
+        puller = ServerLogsPuller(args, tmp_dir, xml_folder)
 
-        for addr in servers:
-            with ServerProxy(f"http://{addr}:{servers[addr][0]}/",
-                             allow_none=True) as proxy:
-                _pull_logs(proxy)
-                copy_server_log_file(tmp_dir, proxy, servers[addr])
+    puller.pull(final=True)
 
-    return logs_folder, xml_folder
+    return puller.logs_folder, puller.xml_folder
 
 
 def ascii_profile_summary(tc_results):
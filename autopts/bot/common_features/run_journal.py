@@ -0,0 +1,171 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Append-only journal of a bot test run.
+
+Each record is a JSON line, flushed and fsync'd before the test run goes
+on, so a power loss leaves at most one torn line at the end. The resume
+plan is derived from a single pass over the records.
+"""
+
+import json
+import logging
+import os
+from typing import NamedTuple
+
+log = logging.debug
+
+# The run config entries: {'config_file', 'test_cases', 'iut_map'}
+SCHEDULE = 'schedule'
+# The config of the index in the schedule is applied
+CONFIG = 'config'
+# A test case run is started
+START = 'start'
+# The final status of a test case, after its retries
+DONE = 'done'
+# The results of the config are merged into all stats
+CONFIG_DONE = 'config_done'
+# The test case in progress at the termination is retried, written when
+# the retried test case starts
+RESUME = 'resume'
+# All the test cases have been run
+COMPLETED = 'completed'
+
+
+class ResumePlan(NamedTuple):
+    schedule: list
+    # [(config index, run config entry with the test cases left)]
+    run_config: list
+    # Index of the first config left
+    config: int
+    # Number of the test cases of the first config done
+    done_count: int
+    # The test case in progress at the termination, retried once
+    retried_test_case: str
+    # The retried test case that terminated the run again
+    timed_out_test_case: str
+    session_log_dir: str
+    completed: bool
+
+
+class RunJournal:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def open(self):
+        torn = False
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+        if torn:
+            # Do not append to the line torn by a power loss
+            self._file.write('\n')
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def append(self, record_type, **data):
+        record = {'type': record_type, **data}
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @staticmethod
+    def read(path):
+        with open(path, encoding='utf-8') as f:
+            records = [_parse_record(line) for line in f]
+
+        return [record for record in records if record is not None]
+
+
+def _parse_record(line):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        log(f'Skipping a torn journal record {line!r}')
+        return None
+
+
+def plan_resume(records):
+    """Returns the ResumePlan of the journal records, None if no test
+    cases were scheduled."""
+    schedule = None
+    done = set()
+    done_configs = set()
+    in_progress = None
+    retried = None
+    session_log_dir = None
+    completed = False
+
+    for record in records:
+        record_type = record['type']
+
+        if record_type == SCHEDULE:
+            schedule = record['run_config']
+        elif record_type == START:
+            in_progress = (record['config'], record['test_case'])
+            session_log_dir = record.get('session_log_dir') or session_log_dir
+        elif record_type == DONE:
+            done.add((record['config'], record['test_case']))
+        elif record_type == CONFIG_DONE:
+            done_configs.add(record['config'])
+        elif record_type == RESUME:
+            retried = (record['config'], record['test_case'])
+        elif record_type == COMPLETED:
+            completed = True
+
+    if schedule is None:
+        return None
+
+    if in_progress in done:
+        in_progress = None
+
+    timed_out = None
+    if in_progress is not None and in_progress == retried:
+        timed_out = in_progress
+        in_progress = None
+
+    run_config = []
+    first_config = len(schedule)
+    done_count = 0
+
+    for config, entry in enumerate(schedule):
+        if config in done_configs:
+            continue
+
+        test_cases = [tc for tc in entry['test_cases']
+                      if (config, tc) not in done and (config, tc) != timed_out]
+
+        if not run_config:
+            first_config = config
+            done_count = sum((config, tc) in done for tc in entry['test_cases'])
+
+        run_config.append((config, dict(entry, test_cases=test_cases)))
+
+    return ResumePlan(schedule=schedule,
+                      run_config=run_config,
+                      config=first_config,
+                      done_count=done_count,
+                      retried_test_case=in_progress[1] if in_progress else None,
+                      timed_out_test_case=timed_out[1] if timed_out else None,
+                      session_log_dir=session_log_dir,
+                      completed=completed or not run_config)
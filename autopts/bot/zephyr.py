@@ -17,13 +17,15 @@
 # more details.
 #
 
-import glob
 import importlib
 import os
+import re
 import shutil
 import sys
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import serial
@@ -114,19 +116,109 @@ def zephyr_hash_url(commit):
     return f"{ZEPHYR_PROJECT_URL}/commit/{commit}"
 
 
-def zephyr_get_assertion_info(test_case_name):
-    logs_dir = FILE_PATHS['IUT_LOGS_DIR']
-    pattern = test_case_name.replace('/', '_')
-    search_pattern = os.path.join(logs_dir, '**', f'{pattern}_*', f'{pattern}_iutctl.log')
-    log_files = glob.glob(search_pattern, recursive=True)
+# Test case log directory, see TestCase.initialize_logging
+TEST_CASE_LOG_DIR_REGEX = re.compile(r'^(.+)_\d{4}(?:_\d{2}){5}$')
 
-    for log_file in log_files:
-        with open(log_file, encoding='utf-8') as f:
-            for line in f:
-                if 'ASSERTION' in line:
-                    return line.strip()
+# Less new directories are scanned in the calling thread
+PARALLEL_SCAN_MIN = 16
 
-    return None
+
+class AssertionIndex:
+    """Index of the assertion lines in the IUT logs of the test cases.
+
+    Only the test case log directories not seen before are scanned at
+    update, so the index grows with each test case finished. Many new
+    directories, e.g. of a restored session, are scanned in parallel.
+    """
+
+    def __init__(self, logs_dir=None, pattern=b'ASSERTION'):
+        self._logs_dir = logs_dir
+        self.pattern = pattern
+        self._lock = threading.Lock()
+        self._scanned_dirs = set()
+        # {test case log dir name prefix: (log dir name, assertion line)}
+        self._assertions = {}
+
+    @property
+    def logs_dir(self):
+        return self._logs_dir or FILE_PATHS['IUT_LOGS_DIR']
+
+    def _find_new_test_case_dirs(self):
+        new_dirs = []
+
+        for root, dirs, _files in os.walk(self.logs_dir):
+            session_dirs = []
+            for name in dirs:
+                if not TEST_CASE_LOG_DIR_REGEX.match(name):
+                    session_dirs.append(name)
+                    continue
+
+                path = os.path.join(root, name)
+                if path not in self._scanned_dirs:
+                    new_dirs.append(path)
+
+            # Do not descend into the test case log directories
+            dirs[:] = session_dirs
+
+        return new_dirs
+
+    def _scan_test_case_dir(self, path):
+        prefix = TEST_CASE_LOG_DIR_REGEX.match(os.path.basename(path)).group(1)
+
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except OSError:
+            return None
+
+        for entry in entries:
+            if not (entry.name.startswith(prefix) and entry.name.endswith('_iutctl.log')):
+                continue
+
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+
+            pos = data.find(self.pattern)
+            if pos < 0:
+                continue
+
+            start = data.rfind(b'\n', 0, pos) + 1
+            end = data.find(b'\n', pos)
+            if end < 0:
+                end = len(data)
+
+            return data[start:end].decode('utf-8', errors='replace').strip()
+
+        return None
+
+    def update(self):
+        """Indexes the test case log directories created since the last update"""
+        with self._lock:
+            new_dirs = self._find_new_test_case_dirs()
+
+            if len(new_dirs) < PARALLEL_SCAN_MIN:
+                lines = [self._scan_test_case_dir(path) for path in new_dirs]
+            else:
+                with ThreadPoolExecutor() as executor:
+                    lines = list(executor.map(self._scan_test_case_dir, new_dirs))
+
+            for path, line in zip(new_dirs, lines, strict=True):
+                self._scanned_dirs.add(path)
+                if line is None:
+                    continue
+
+                name = os.path.basename(path)
+                prefix = TEST_CASE_LOG_DIR_REGEX.match(name).group(1)
+                # The latest run of the test case wins
+                if prefix not in self._assertions or self._assertions[prefix][0] < name:
+                    self._assertions[prefix] = (name, line)
+
+    def get(self, test_case_name):
+        """Returns the indexed assertion line of the test case or None"""
+        assertion = self._assertions.get(test_case_name.replace('/', '_'))
+        if assertion is None:
+            return None
+
+        return assertion[1]
 
 
 class ZephyrBotConfigArgs(BotConfigArgs):
@@ -145,7 +237,9 @@ class ZephyrBotClient(BotClient):
         super().__init__(get_iut, project, 'zephyr', ZephyrBotConfigArgs,
                          ZephyrBotCliParser)
         self.config_default = "prj.conf"
-        self.fail_info_parser = zephyr_get_assertion_info
+        self.assertion_index = AssertionIndex()
+        self.fail_info_parser = self.assertion_index.get
+        self.fail_info_indexer = self.assertion_index.update
 
     def apply_config(self, args, config, value):
         iutctl = self.get_iut()
@@ -210,6 +304,8 @@ class ZephyrBotClient(BotClient):
             try:
                 build_and_flash(args.project_path, args.tester_app_dir, board_type, args.debugger_snr,
                                 overlays, args.project_repos, args.build_env_cmd)
+                self.get_iut().image_file = os.path.join(args.project_path, args.tester_app_dir,
+                                                         'build', 'zephyr', 'zephyr.elf')
 
                 flush_serial(args.tty_file, rtscts=args.rtscts, baudrate=args.tty_baudrate)
             except BaseException as e:
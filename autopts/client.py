@@ -23,6 +23,7 @@ import datetime
 import errno
 import json
 import logging
+import math
 import os
 import queue
 import random
@@ -30,6 +31,7 @@ import re
 import shutil
 import signal
 import socket
+import socketserver
 import sys
 import threading
 import time
@@ -39,7 +41,7 @@ import xmlrpc.client
 from argparse import Namespace
 from collections.abc import Callable
 from os.path import dirname
-from xmlrpc.server import SimpleXMLRPCServer
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
 
 from termcolor import colored
 
@@ -47,13 +49,17 @@ from autopts.config import FILE_PATHS
 from autopts.ptsprojects import ptstypes, stack
 from autopts.ptsprojects.boards import get_available_boards, tty_to_com
 from autopts.ptsprojects.ptstypes import E_FATAL_ERROR
+from autopts.ptsprojects.result_cache import ResultCacheInputs
 from autopts.ptsprojects.testcase import PTSCallback, TestCaseLT1, TestCaseLT2, TestCaseLT3
-from autopts.ptsprojects.testcase_db import TestCaseTable
+from autopts.ptsprojects.testcase_db import WID_LATENCY_BUCKETS, TestCaseRepeats, TestCaseTable, WidLatencyHistogram
 from autopts.pybtp import btp
 from autopts.pybtp.btp import get_iut_method as get_iut
+from autopts.pybtp.iutctl_common import BTP_SOCKET_CLOSED, IUT_FATAL_ERROR, set_fatal_error_handler
+from autopts.pybtp.supported_cmds_cache import get_cache_file, set_supported_cmds_cache_file
 from autopts.pybtp.types import BTPError, BTPFatalError, BTPInitError, MissingWIDError, SynchError
 from autopts.types import AutoPTSMode, PTSProxy
 from autopts.utils import (
+    CancellationToken,
     CounterWithFlag,
     InterruptableThread,
     ResultWithFlag,
@@ -63,9 +69,11 @@ from autopts.utils import (
     get_global_end,
     have_admin_rights,
     raise_on_global_end,
+    set_cancel_token,
     set_global_end,
     ykush_replug_usb,
 )
+from autopts.wid.wid import report_unhandled_wids
 from cliparser import CliParser
 
 log = logging.debug
@@ -74,6 +82,18 @@ log_lock = threading.RLock()
 RUNNING_TEST_CASE = {}
 autoprojects = None
 TEST_CASE_TIMEOUT_MS = 300000  # milliseconds
+# Time for a cancelled test case to reach a wait point, before its
+# thread is interrupted
+CANCEL_GRACE_TIME = 5  # seconds
+
+# States of an LTJob. The KeyboardInterrupt is injected only into a
+# RUNNING job, never into the pre- or post-test-case steps.
+LT_JOB_PENDING = 'PENDING'
+LT_JOB_PRE_RUN = 'PRE_RUN'
+LT_JOB_RUNNING = 'RUNNING'
+LT_JOB_INTERRUPTED = 'INTERRUPTED'
+LT_JOB_POST_RUN = 'POST_RUN'
+LT_JOB_DONE = 'DONE'
 
 # To test autopts client locally:
 # Envrinment variable AUTO_PTS_LOCAL must be set for FakeProxy to
@@ -294,6 +314,21 @@ class ClientCallback(PTSCallback):
             self._results[key] = ResultWithFlag()
 
 
+class ClientCallbackRequestHandler(SimpleXMLRPCRequestHandler):
+    """Keeps the connection open between consecutive callbacks"""
+    protocol_version = 'HTTP/1.1'
+
+
+class ThreadingClientCallbackServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    """Serves each callback connection in its own thread
+
+    The autoptsserver sends the WID and method result callbacks and
+    the log callbacks over separate connections, so the log traffic
+    cannot delay WID delivery.
+    """
+    daemon_threads = True
+
+
 class ClientCallbackServer(threading.Thread):
     """Thread for XML-RPC callback server
 
@@ -323,8 +358,9 @@ class ClientCallbackServer(threading.Thread):
         log("%s.%s", self.__class__.__name__, self.run.__name__)
         log("Client callback serving on port %s ...", self.port)
 
-        self.server = SimpleXMLRPCServer(("", self.port),
-                                         allow_none=True, logRequests=False)
+        self.server = ThreadingClientCallbackServer(("", self.port),
+                                                    requestHandler=ClientCallbackRequestHandler,
+                                                    allow_none=True, logRequests=False)
         self.server.register_instance(self.callback)
         self.server.register_introspection_functions()
         self.server.timeout = 1.0
@@ -459,6 +495,11 @@ def init_pts_thread_entry(proxy, args, exceptions, finish_count):
 
     proxy.enable_maximum_logging(args.enable_max_logs)
 
+    pts_log_types = getattr(args, 'pts_log_types', None)
+    if pts_log_types:
+        proxy.set_log_types([ptstypes.PTS_LOGTYPE_STRING.index(f'PTS_LOGTYPE_{name.upper()}')
+                             for name in pts_log_types])
+
 
 class PTSProxyFactory:
     @staticmethod
@@ -652,11 +693,17 @@ class TestCaseRunStats:
         self.xml_results = xml_results_file
         self.db = db
         self.est_duration = 0
-        self.pending_config = None
-        self.pending_test_case = None
         self.test_run_completed = False
         self.session_log_dir = None
         self.fail_info_cb = None
+        # {test case name: the reason of the last IUT fatal error}
+        self.fatal_errors = {}
+        # {(project, wid, kind): WidLatencyHistogram} of this run
+        self.wid_latencies = {}
+        # Id of the test run in the repeat runs of the database
+        self.run_id = datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
+        # {test case name: TestCaseRepeats} of the --repeat runs
+        self.repeats = {}
 
         if self.xml_results and not os.path.exists(self.xml_results):
             os.makedirs(dirname(self.xml_results), exist_ok=True)
@@ -690,10 +737,16 @@ class TestCaseRunStats:
         self.max_project_name = max(self.max_project_name, stats2.max_project_name)
         self.max_test_case_name = max(self.max_test_case_name, stats2.max_test_case_name)
         self.est_duration = self.est_duration + stats2.est_duration
-        self.pending_config = stats2.pending_config
-        self.pending_test_case = stats2.pending_test_case
         self.session_log_dir = stats2.session_log_dir
 
+        for key, histogram in stats2.wid_latencies.items():
+            self.wid_latencies.setdefault(key, WidLatencyHistogram()).merge(histogram)
+
+        self.fatal_errors.update(stats2.fatal_errors)
+
+        for test_case, repeats in stats2.repeats.items():
+            self.repeats.setdefault(test_case, TestCaseRepeats()).merge(repeats)
+
         stats2_tree = ElementTree.parse(stats2.xml_results)
         root2 = stats2_tree.getroot()
 
@@ -702,7 +755,8 @@ class TestCaseRunStats:
         root1.extend(root2)
         self_tree.write(self.xml_results)
 
-    def update(self, test_case_name, duration, status, description='', test_start_time=None, test_end_time=None):
+    def update(self, test_case_name, duration, status, description='', test_start_time=None, test_end_time=None,
+               cached=False):
         tree = ElementTree.parse(self.xml_results)
         root = tree.getroot()
 
@@ -744,6 +798,8 @@ class TestCaseRunStats:
         elem.attrib["regression"] = str(regression)
         elem.attrib["progress"] = str(progress)
         elem.attrib["run_count"] = str(run_count + 1)
+        # The result of the last run with the same inputs, not run again
+        elem.attrib["cached"] = '1' if cached else '0'
 
         tree.write(self.xml_results)
 
@@ -773,6 +829,27 @@ class TestCaseRunStats:
 
         return descriptions
 
+    def update_wid_latencies(self, wid_timings):
+        histograms = {}
+
+        for timing in wid_timings:
+            for kind, latency in (('response', timing.response_time),
+                                  ('handler', timing.handler_time)):
+                key = (timing.project_name, timing.wid, kind)
+                histograms.setdefault(key, WidLatencyHistogram()).add(latency)
+
+        for key, histogram in histograms.items():
+            self.wid_latencies.setdefault(key, WidLatencyHistogram()).merge(histogram)
+
+        if self.db and histograms:
+            self.db.update_wid_latencies(histograms)
+
+    def add_repeat_run(self, test_case_name, status, duration, signature=''):
+        self.repeats.setdefault(test_case_name, TestCaseRepeats()).add(status, duration, signature)
+
+        if self.db:
+            self.db.add_repeat_run(self.run_id, test_case_name, status, duration, signature)
+
     def get_wid_usage(self):
         extract_wid_testcases_to_csv()
 
@@ -800,13 +877,20 @@ class TestCaseRunStats:
                     parsed_result = pattern
                     break
 
-            if self.fail_info_cb:
+            if tc_xml.attrib["name"] in self.fatal_errors:
+                assertion_line = self.fatal_errors[tc_xml.attrib["name"]]
+            elif self.fail_info_cb:
                 assertion_line = self.fail_info_cb(tc_xml.attrib["name"])
-                if assertion_line:
-                    if additional_info:
-                        additional_info += " | " + assertion_line
-                    else:
-                        additional_info = assertion_line
+            else:
+                assertion_line = None
+
+            if assertion_line:
+                if additional_info:
+                    additional_info += " | " + assertion_line
+                else:
+                    additional_info = assertion_line
+
+            repeats = self.repeats.get(tc_xml.attrib["name"])
 
             results[tc_xml.attrib["name"]] = {
                 "status": status,
@@ -815,7 +899,9 @@ class TestCaseRunStats:
                 "test_end_time": end_time,
                 "duration": duration,
                 "parsed_result": parsed_result,
-                "additional_info": additional_info
+                "additional_info": additional_info,
+                "flake_score": repeats.flake_score() if repeats else None,
+                "cached": tc_xml.attrib.get("cached") == '1',
             }
 
         return results
@@ -862,6 +948,10 @@ class TestCaseRunStats:
                                     self.num_test_cases,
                                     len(self.get_regressions()),
                                     len(self.get_progresses())))
+        if self.repeats:
+            print('\nFlakiness:')
+            print(get_formatted_flakiness(self.repeats))
+
         if not detailed:
             return
 
@@ -871,6 +961,8 @@ class TestCaseRunStats:
         print('\n'.join(self.get_progresses()))
         print('\nNew cases:')
         print('\n'.join(self.get_new_cases()))
+        print('\nSlowest WIDs:')
+        print(get_formatted_slowest_wids(self.wid_latencies))
 
 
 def get_formatted_summary(status_count, num_test_cases, regressions_count, progresses_count):
@@ -906,6 +998,69 @@ def get_formatted_summary(status_count, num_test_cases, regressions_count, progr
     return '\n'.join(summary)
 
 
+def get_formatted_slowest_wids(wid_latencies, limit=10):
+    """Formats the WIDs with the highest mean response time as a table
+
+    wid_latencies -- {(project, wid, kind): WidLatencyHistogram}
+    """
+    def seconds(value):
+        return f'>{WID_LATENCY_BUCKETS[-1]}' if math.isinf(value) else f'{value:.2f}'
+
+    wids = sorted({(project, wid) for project, wid, _ in wid_latencies},
+                  key=lambda key: wid_latencies[(*key, 'response')].mean(), reverse=True)
+
+    rows = [['Project', 'WID', 'Count', 'Response mean', 'p95', 'Handler mean', 'p95']]
+    for project, wid in wids[:limit]:
+        response = wid_latencies[(project, wid, 'response')]
+        handler = wid_latencies[(project, wid, 'handler')]
+        rows.append([project, str(wid), str(response.count),
+                     seconds(response.mean()), seconds(response.percentile(95)),
+                     seconds(handler.mean()), seconds(handler.percentile(95))])
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths, strict=True)).rstrip()
+                     for row in rows)
+
+
+def get_formatted_flakiness(repeats):
+    """Formats the repeated test cases, the flakiest first, as a table
+
+    repeats -- {test case name: TestCaseRepeats}
+    """
+    test_cases = sorted(repeats, key=lambda name: repeats[name].flake_score(), reverse=True)
+
+    rows = [['Test case', 'Runs', 'Verdicts', 'p50', 'p95', 'Flake', 'Top failure']]
+    for name in test_cases:
+        repeat = repeats[name]
+        verdicts = ' '.join(f'{verdict}:{count}' for verdict, count in repeat.verdicts.most_common())
+        signature = repeat.signatures.most_common(1)
+        rows.append([name, str(repeat.count), verdicts,
+                     f'{repeat.percentile(50):.2f}', f'{repeat.percentile(95):.2f}',
+                     f'{repeat.flake_score():.2f}', signature[0][0] if signature else ''])
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths, strict=True)).rstrip()
+                      for row in rows)
+
+
+def get_failure_signature(status, fatal_error=None, exception_msg=''):
+    """Returns the signature grouping the runs failed the same way, e.g.
+    'IUT FATAL ERROR: ASSERTION FAIL @ conn.c:N', '' for a PASS. The
+    numbers are masked, so the addresses and handles do not split it."""
+    if status == 'PASS':
+        return ''
+
+    detail = fatal_error or next((line for line in exception_msg.splitlines() if line.strip()), '')
+    if not detail:
+        return status
+
+    detail = re.sub(r'0x[0-9a-fA-F]+|\d+', 'N', detail.strip())
+
+    return f'{status}: {detail}'
+
+
 def run_test_case_wrapper(func):
     def wrapper(*args):
         test_case_name = args[2]
@@ -975,6 +1130,47 @@ def run_test_case_wrapper(func):
     return wrapper
 
 
+def report_cached_result(test_case_name, stats, duration):
+    """Records the cached PASS of a test case with unchanged inputs, as
+    if it was run"""
+    print((str(stats.index + 1).rjust(stats.num_test_cases_width) +
+           "/" +
+           str(stats.num_test_cases).ljust(stats.num_test_cases_width + stats.margin) +
+           test_case_name.split('/')[0].ljust(stats.max_project_name + stats.margin) +
+           test_case_name.ljust(stats.max_test_case_name + stats.margin - 1)), end=' ')
+
+    status = 'PASS'
+    _, progress = stats.update(test_case_name, duration, status, cached=True)
+
+    result = "PASS (cached) ".ljust(15) + str(round(duration, 3))
+    if progress:
+        result += "PROGRESS".rjust(len("REGRESSION") + stats.margin)
+
+    if sys.stdout.isatty():
+        print(colored(result, get_result_color(status)))
+    else:
+        print(result)
+
+    sys.stdout.flush()
+
+    return status, duration
+
+
+def get_result_cache_inputs(ptses, args, stats):
+    """Returns the ResultCacheInputs of the test cases run with the args,
+    None if the results are not kept"""
+    if not stats.db:
+        return None
+
+    try:
+        pts_version = ptses[0].get_version()
+    except Exception as e:
+        log(f'Result cache disabled, failed to get the PTS version: {e}')
+        return None
+
+    return ResultCacheInputs(args, get_iut(), pts_version)
+
+
 def get_error_code(exc):
     """Return string error code for argument exception"""
     error_code = None
@@ -1033,32 +1229,93 @@ def synchronize_instances(state, break_state=None, end_flag=None):
     return match.get(predicate=wait_for)
 
 
+class LTJob:
+    """A test case of one lower tester, run by its LTThread"""
+
+    def __init__(self, pts, test_case, exceptions, finish_count, mode):
+        self.args = (pts, test_case, exceptions, finish_count, mode)
+        self.token = CancellationToken()
+        self.done = threading.Event()
+        # Changed under the interrupt lock of the LTThread
+        self.state = LT_JOB_PENDING
+
+
 class LTThread(InterruptableThread):
-    def __init__(self, name=None, args=()):
-        super().__init__(name=name)
-        self._args = args
-        self.locked = False
+    """Persistent lower tester worker. Runs the LTJobs received over its
+    queue one by one, so no thread is created per test case."""
+
+    def __init__(self, name=None):
+        super().__init__(name=name, daemon=True)
+        self.jobs = queue.Queue()
+        self.job = None
+
+    def submit(self, job):
+        self.jobs.put(job)
+
+    def stop(self):
+        self.jobs.put(None)
 
     def run(self):
-        exceptions = self._args[2]
-        finish_count = self._args[3]
+        while True:
+            try:
+                job = self.jobs.get()
+            except KeyboardInterrupt:
+                # Injected too late, the job has already finished
+                continue
+
+            if job is None:
+                break
+
+            self._run_job(job)
+
+    def _set_job_state(self, job, state):
+        with self.interrupt_lock:
+            interrupted = job.state == LT_JOB_INTERRUPTED
+            job.state = state
+
+        if interrupted:
+            # Drop the KeyboardInterrupt injected but not raised yet, e.g.
+            # into a thread blocked in a call
+            self.clear_interrupt()
+
+    def _try_set_job_state(self, job, state):
+        try:
+            self._set_job_state(job, state)
+            return True
+        except KeyboardInterrupt:
+            log(f'{self.name} interrupted at the end of the test case')
+            return False
+
+    def _end_running(self, job, state):
+        """Leaves the running phase of the job. A KeyboardInterrupt injected
+        meanwhile is raised here at the latest and absorbed."""
+        while not self._try_set_job_state(job, state):
+            pass
+
+    def _run_job(self, job):
+        exceptions = job.args[2]
+        finish_count = job.args[3]
         try:
-            self.locked = self.interrupt_lock.acquire()
+            self.job = job
+            self._set_job_state(job, LT_JOB_PRE_RUN)
 
             # Use by default the IUT1 in this thread
-            from autopts.pybtp.btp import get_iut_method as get_iut
             iutctl = get_iut()
             if hasattr(iutctl, 'select_iut'):
                 iutctl.select_iut(0)
 
-            self._run_test_case(*self._args)
+            self._run_test_case(*job.args)
         except Exception as exc:
             logging.exception(exc)
             exceptions.put(exc)
+        except KeyboardInterrupt:
+            log(f'{self.name} interrupted')
         finally:
+            # No KeyboardInterrupt can break the worker after this
+            self._end_running(job, LT_JOB_DONE)
+            self.job = None
             finish_count.add(1)
-            if self.locked:
-                self.interrupt_lock.release()
+            job.done.set()
 
     def cancel_sync_points(self):
         iut = get_iut()
@@ -1070,29 +1327,48 @@ class LTThread(InterruptableThread):
         else:
             iut.stack.synch.cancel_synch()
 
+    def cancel(self):
+        job = self.job
+        if job is not None:
+            job.token.cancel()
+
     def interrupt(self):
+        # The test case ends at its next wait point
+        self.cancel()
         self.cancel_sync_points()
 
-        # Acquire the lock to prevent breaking pre- or post-test-case steps,
-        # which crucial and do not fail in general.
-        while not self.interrupt_lock.acquire(True, timeout=1) and not get_global_end():
-            # Ctrl + C friendly loop
-            pass
+        # An idle worker has nothing to interrupt
+        job = self.job
+        if job is None or job.done.wait(CANCEL_GRACE_TIME):
+            return
 
-        # Acquire the logger lock to prevent breaking the lock or other
-        # logger handles at interrupt.
-        while not log_lock.acquire(True, timeout=1) and not get_global_end():
-            # Ctrl + C friendly loop
-            pass
+        # The lock is held only to check the state of the job and inject,
+        # so the worker does not wait for it during the grace time.
+        with self.interrupt_lock:
+            # Do not break the pre- or post-test-case steps, which are
+            # crucial and do not fail in general.
+            if job.state != LT_JOB_RUNNING:
+                log(f'{self.name} not interrupted in the {job.state} state')
+                return
+
+            # The test case waits outside the wait points, e.g. on the PTS.
+            # Inject the KeyboardInterrupt as the last resort.
+            log(f'{self.name} not cancelled in {CANCEL_GRACE_TIME} s, interrupting')
+            job.state = LT_JOB_INTERRUPTED
+
+            # Acquire the logger lock to prevent breaking the lock or other
+            # logger handles at interrupt.
+            while not log_lock.acquire(True, timeout=1) and not get_global_end():
+                # Ctrl + C friendly loop
+                pass
 
-        try:
-            super().interrupt()
-        except BaseException as e:
-            logging.exception(e)
-            traceback.print_exc()
-        finally:
-            log_lock.release()
-            self.interrupt_lock.release()
+            try:
+                super().interrupt()
+            except BaseException as e:
+                logging.exception(e)
+                traceback.print_exc()
+            finally:
+                log_lock.release()
 
     def _run_test_case(self, pts, test_case, exceptions, finish_count, mode):
         """Runs the test case specified by a TestCase instance."""
@@ -1115,8 +1391,8 @@ class LTThread(InterruptableThread):
             test_case.pre_run()
             test_case.status = "RUNNING"
             test_case.state = "RUNNING"
-            self.interrupt_lock.release()
-            self.locked = False
+            self._set_job_state(self.job, LT_JOB_RUNNING)
+            set_cancel_token(self.job.token)
 
             if not synchronize_instances(test_case.state, ["FINISHED"], end_flag=finish_count):
                 raise SynchError
@@ -1157,13 +1433,8 @@ class LTThread(InterruptableThread):
                     pts.set_wid_response(response)
 
             except BaseException as test_case_error:
-                try:
-                    self.locked = self.interrupt_lock.acquire(blocking=False)
-                except KeyboardInterrupt:
-                    # In case KeyboardInterrupt was injected, we deliberately ignore it here
-                    pass
-                except Exception as e:
-                    log(f"Unexpected error while acquiring interrupt lock: {e}")
+                set_cancel_token(None)
+                self._end_running(self.job, LT_JOB_POST_RUN)
 
                 if isinstance(test_case_error, threading.BrokenBarrierError):
                     log(f'SYNCH: Cancelled waiting at a barrier, tc {test_case.name}')
@@ -1176,8 +1447,8 @@ class LTThread(InterruptableThread):
                 pts.stop_test_case(test_case.project_name, test_case.name)
 
             finally:
-                if not self.locked:
-                    self.locked = self.interrupt_lock.acquire(blocking=False)
+                set_cancel_token(None)
+                self._end_running(self.job, LT_JOB_POST_RUN)
 
             if finish_count.is_set():
                 test_case.state = E_FATAL_ERROR
@@ -1202,6 +1473,7 @@ class LTThread(InterruptableThread):
             error_code = get_error_code(None)
 
         finally:
+            set_cancel_token(None)
             test_case.state = "FINISHED"
 
             if test_case.status != "PASS":
@@ -1225,6 +1497,30 @@ class LTThread(InterruptableThread):
             self.cancel_sync_points()
 
 
+# {LT number: LTThread}, one worker per PTS instance
+_lt_threads = {}
+_lt_threads_lock = threading.Lock()
+
+
+def get_lt_thread(lt_number):
+    """Returns the worker of the lower tester, started if needed"""
+    with _lt_threads_lock:
+        thread = _lt_threads.get(lt_number)
+        if thread is None or not thread.is_alive():
+            thread = LTThread(name=f'LT{lt_number}-thread')
+            thread.start()
+            _lt_threads[lt_number] = thread
+
+    return thread
+
+
+def stop_lt_threads():
+    with _lt_threads_lock:
+        for thread in _lt_threads.values():
+            thread.stop()
+        _lt_threads.clear()
+
+
 @run_test_case_wrapper
 def run_test_case(ptses, test_case_instances, test_case_name, stats,
                   session_log_dir, exceptions, timeout, mode):
@@ -1281,15 +1577,23 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
     # Multi-instance related stuff
     finish_count = CounterWithFlag(init_count=0)
     thread_count = 0
-    thread_list = []
+    jobs = []
     pts = None
+    fatal_errors = []
+
+    def on_fatal_error(fatal):
+        # End the test case now instead of waiting for a PTS timeout
+        fatal_errors.append(fatal)
+        finish_count.set_flag()
+
+    stats.fatal_errors.pop(test_case_name, None)
+    set_fatal_error_handler(on_fatal_error)
 
     for thread_count, (test_case_lt, pts) in enumerate(zip(test_case_lts, ptses, strict=False), 1):
-        thread = LTThread(
-            name=f'LT{thread_count}-thread',
-            args=(pts, test_case_lt, exceptions, finish_count, mode))
-        thread_list.append(thread)
-        thread.start()
+        thread = get_lt_thread(thread_count)
+        job = LTJob(pts, test_case_lt, exceptions, finish_count, mode)
+        jobs.append((thread, job))
+        thread.submit(job)
 
     superguard_timeout = False
     try:
@@ -1307,30 +1611,36 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
         log('Test case interrupted with SIGINT')
         raise
     finally:
+        set_fatal_error_handler(None)
         finish_count.set_flag()
-        for i, thread in enumerate(thread_list):
-            if thread.is_alive():
-                log(f"Interrupting {test_case_lts[i]} test case of thread {thread.name}")
-                thread.interrupt()
-
-        while True:
-            alive_threads = []
-            for _i, thread in enumerate(thread_list):
-                if thread.is_alive():
-                    alive_threads.append(thread)
+        for i, (thread, job) in enumerate(jobs):
+            if not job.done.is_set():
+                log(f"Cancelling {test_case_lts[i]} test case of thread {thread.name}")
+                job.token.cancel()
 
-            if len(alive_threads) == 0:
-                break
-
-            log(f"Waiting for {alive_threads} to finish ...")
-            thread_list = alive_threads
-            time.sleep(1)
+        for thread, job in jobs:
+            if not job.done.is_set():
+                thread.interrupt()
 
-        if superguard_timeout:
+        for thread, job in jobs:
+            # Ctrl + C friendly wait, a dead worker will not finish the job
+            while not job.done.wait(1) and thread.is_alive():
+                log(f"Waiting for {thread.name} to finish ...")
+
+        if fatal_errors:
+            fatal = fatal_errors[0]
+            test_case_lts[0].status = fatal.status
+            stats.fatal_errors[test_case_name] = fatal.reason
+            logging.error("%s: %s, IUT log context:\n%s", fatal.status, fatal.reason,
+                          '\n'.join(fatal.context))
+        elif superguard_timeout:
             test_case_lts[0].status = 'SUPERGUARD TIMEOUT'
 
     logger.removeHandler(file_handler)
 
+    for test_case_lt in test_case_lts:
+        stats.update_wid_latencies(test_case_lt.wid_timings)
+
     for test_case_lt in test_case_lts:
         if test_case_lt.status != "PASS":
             return test_case_lt.status
@@ -1454,6 +1764,98 @@ def print_pts_instances(ptses):
         logger.info("  LT%s: %s  BD_ADDR=%s", idx + 1, info, addr)
 
 
+# Learned superguard = max(floor, percentile duration * margin)
+LEARNED_SUPERGUARD_PERCENTILE = 99
+LEARNED_SUPERGUARD_MARGIN = 3
+LEARNED_SUPERGUARD_FLOOR = 120  # seconds
+
+
+def get_learned_superguards(args, stats, test_cases):
+    """Returns {test case name: superguard in seconds} learned from the
+    durations of the previous PASS runs in the test case database.
+    """
+    if not getattr(args, 'learned_superguard', False) or not stats.db:
+        return {}
+
+    percentiles = stats.db.get_duration_percentiles(test_cases, LEARNED_SUPERGUARD_PERCENTILE)
+    superguards = {}
+
+    for test_case, duration in percentiles.items():
+        superguard = max(LEARNED_SUPERGUARD_FLOOR, duration * LEARNED_SUPERGUARD_MARGIN)
+        if args.superguard:
+            superguard = min(superguard, args.superguard)
+        superguards[test_case] = superguard
+
+    return superguards
+
+
+# Number of the last results of a test case considered by --adaptive_retry
+ADAPTIVE_RETRY_HISTORY = 10
+# A transient failure is not retried if the test case has failed in at
+# least so many last results, and none of them passed
+ADAPTIVE_RETRY_MIN_HISTORY = 3
+# Failure classes retried unless the history shows a consistent failure
+TRANSIENT_FAILURE_CLASSES = ('inconc', 'pts_timeout', 'btp_timeout', 'other')
+# Failure classes retried only if the test case passed in its history,
+# or has no history
+DETERMINISTIC_FAILURE_CLASSES = ('fail', 'assert')
+# Failure classes recovered by the IUT restart at the next test case
+NO_RECOVERY_FAILURE_CLASSES = ('inconc', 'fail')
+
+
+def get_failure_class(status):
+    """Returns the class of the failure signature of the test case status,
+    None for a PASS."""
+    if status == 'PASS':
+        return None
+
+    if status in ('INCONC', 'INDCSV'):
+        return 'inconc'
+
+    if status == 'FAIL':
+        return 'fail'
+
+    if status == IUT_FATAL_ERROR:
+        return 'assert'
+
+    if status in IUT_FAILURE_STATUSES:
+        return 'btp_timeout'
+
+    if status in ('PTS TIMEOUT', 'SUPERGUARD TIMEOUT', *PTS_FAILURE_STATUSES):
+        return 'pts_timeout'
+
+    if status in ('NOT_IMPLEMENTED', ptstypes.E_MISSING_WID_ERROR) or status.endswith('_NOT_AVAILABLE'):
+        # Retrying will not implement the test case or add the instances
+        return 'setup'
+
+    return 'other'
+
+
+def get_adaptive_retry(status, history):
+    """Returns (retry, reason) for the failed test case status.
+
+    history -- the results of the previous runs of the test case, the
+               oldest first
+    """
+    failure_class = get_failure_class(status)
+    recent = history[-ADAPTIVE_RETRY_HISTORY:]
+    passed = 'PASS' in recent
+
+    if failure_class == 'setup':
+        return False, f'{status} is not retriable'
+
+    if failure_class in DETERMINISTIC_FAILURE_CLASSES:
+        if recent and not passed:
+            return False, f'{failure_class} and no PASS in the last {len(recent)} runs'
+
+        return True, f'{failure_class} and flaky history' if recent else f'{failure_class} and no history'
+
+    if len(recent) >= ADAPTIVE_RETRY_MIN_HISTORY and not passed:
+        return False, f'{failure_class} and no PASS in the last {len(recent)} runs'
+
+    return True, f'{failure_class} is transient'
+
+
 def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
     """Runs a list of test cases"""
     session_log_dir = stats.session_log_dir
@@ -1473,7 +1875,13 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
     test_cases = args.test_cases
     retry_config = getattr(args, 'retry_config', None)
     repeat_until_failed = getattr(args, 'repeat_until_fail', False)
+    repeat_count = getattr(args, 'repeat', 0)
+    repeat_time = getattr(args, 'repeat_time', 0) * 60
+    repeat_mode = bool(repeat_count or repeat_time)
+    adaptive_retry = getattr(args, 'adaptive_retry', False)
+    reuse_cached_pass = getattr(args, 'reuse_cached_pass', False)
     pre_test_case_fn = kwargs.get('pre_test_case_fn', None)
+    post_test_case_fn = kwargs.get('post_test_case_fn', None)
     exceptions = queue.Queue()
 
     approx = ''
@@ -1481,25 +1889,52 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
         approx = " in approximately: " + str(datetime.timedelta(seconds=stats.est_duration))
     print(f"Number of test cases to run: {stats.num_test_cases}{approx}")
 
+    report_unhandled_wids(test_case_instances, test_cases)
+
+    learned_superguards = get_learned_superguards(args, stats, test_cases)
+    if learned_superguards:
+        log(f"Learned superguards of {len(learned_superguards)} test cases")
+
+    result_histories = {}
+    if adaptive_retry and stats.db:
+        result_histories = stats.db.get_result_histories(test_cases, ADAPTIVE_RETRY_HISTORY)
+
+    # The repeats sample the verdicts, their results are not cached
+    result_cache_inputs = None
+    if not repeat_mode:
+        result_cache_inputs = get_result_cache_inputs(ptses, args, stats)
+
     for test_case in test_cases:
         stats.run_count = 0
         test_retry_count = None
+        repeat_start = time.monotonic()
 
         if retry_config is not None:
             if test_case in retry_config:
                 test_retry_count = retry_config[test_case]
 
-        while True:
-            selected_ptses = ptses
-            selected_test_case_instances = test_case_instances
-            if pre_test_case_fn:
-                prepared = pre_test_case_fn(test_case=test_case, stats=stats, **kwargs)
-
-                if isinstance(prepared, dict):
-                    selected_ptses = prepared.get('ptses') or ptses
-                    selected_test_case_instances = prepared.get('test_cases') or test_case_instances
-                else:
-                    selected_ptses = prepared or ptses
+        inputs = result_cache_inputs.digest(test_case) if result_cache_inputs else None
+        cached = None
+        if reuse_cached_pass and inputs:
+            cached = stats.db.get_cached_result(test_case, inputs)
+            if cached is not None and cached[0] == 'PASS':
+                status, duration = report_cached_result(test_case, stats, cached[1])
+            else:
+                cached = None
+
+        while cached is None:
+            # The repeats run back-to-back on the PTS instances of the first run
+            if not (repeat_mode and stats.run_count):
+                selected_ptses = ptses
+                selected_test_case_instances = test_case_instances
+                if pre_test_case_fn:
+                    prepared = pre_test_case_fn(test_case=test_case, stats=stats, **kwargs)
+
+                    if isinstance(prepared, dict):
+                        selected_ptses = prepared.get('ptses') or ptses
+                        selected_test_case_instances = prepared.get('test_cases') or test_case_instances
+                    else:
+                        selected_ptses = prepared or ptses
 
             pts_mapping = ", ".join(
                 f"LT{idx + 1}={getattr(pts, 'info', f'pts[{idx}]')} [{pts.bd_addr()}]"
@@ -1507,9 +1942,17 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
 
             logging.getLogger(__name__).info("Running %s on %s", test_case, pts_mapping)
 
+            # A test case that got slower shall not time out on each retry
+            superguard = args.superguard
+            if stats.run_count == 0 and test_case in learned_superguards:
+                superguard = learned_superguards[test_case]
+
+            logging.getLogger(__name__).info("Superguard of %s: %s", test_case,
+                                             f'{superguard:.0f} s' if superguard else 'disabled')
+
             status, duration = run_test_case(selected_ptses, selected_test_case_instances,
                                              test_case, stats, session_log_dir,
-                                             exceptions, args.superguard, args.autopts_mode)
+                                             exceptions, superguard, args.autopts_mode)
 
             raise_on_global_end()
 
@@ -1522,7 +1965,28 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
             log(f'exception_msg: {exeption_msg}')
 
             if args.recovery and (exeption_msg != '' or status not in args.not_recover):
-                run_recovery(args, ptses)
+                if not adaptive_retry:
+                    run_recovery(args, ptses, status)
+                elif exeption_msg == '' and get_failure_class(status) in NO_RECOVERY_FAILURE_CLASSES:
+                    log(f'Recovery after {status} skipped, the IUT restarts at the next test case')
+                else:
+                    # The health probes limit the recovery to the failed side
+                    run_recovery(args, ptses, status, skip_healthy=True)
+
+            if repeat_mode:
+                # Every run is a sample of the verdict distribution, no retries
+                stats.add_repeat_run(test_case, status, duration,
+                                     get_failure_signature(status, stats.fatal_errors.get(test_case),
+                                                           exeption_msg))
+                if stats.db:
+                    stats.db.update_statistics(test_case, duration, status)
+
+                stats.run_count += 1
+                if (repeat_count and stats.run_count >= repeat_count) or \
+                        (repeat_time and time.monotonic() - repeat_start >= repeat_time):
+                    break
+
+                continue
 
             if test_retry_count is not None:
                 retry_limit = test_retry_count
@@ -1545,8 +2009,26 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
                     stats.db.update_statistics(test_case, duration, status)
                 break
 
+            if adaptive_retry and status != 'PASS':
+                retry, reason = get_adaptive_retry(status, result_histories.get(test_case, []))
+                log(f'{test_case} {"retried" if retry else "not retried"}: {reason}')
+                if not retry:
+                    if stats.db:
+                        stats.db.update_statistics(test_case, duration, status)
+                    break
+
+            if stats.db and status != 'PASS':
+                # A PASS at a retry shall not hide the failure from the quarantine
+                stats.db.update_quarantine(test_case, status)
+
             stats.run_count += 1
 
+        if inputs and cached is None:
+            stats.db.set_cached_result(test_case, inputs, status, duration)
+
+        if post_test_case_fn:
+            post_test_case_fn(test_case=test_case, status=status, stats=stats, **kwargs)
+
         stats.index += 1
 
     stats.print_summary()
@@ -1652,6 +2134,7 @@ class Client:
         os.makedirs(self.file_paths["TMP_DIR"], exist_ok=True)
 
         self.load_test_case_database()
+        set_supported_cmds_cache_file(get_cache_file(self.args.database_file))
 
         if self.args.test_cases_file:
             tests = [_line for line in self.args.test_cases_file.readlines()
@@ -1683,6 +2166,11 @@ class Client:
         self.cleanup()
 
         if self.args.store:
+            if self.test_case_database:
+                # Checkpoint the WAL into the database file before moving it
+                self.test_case_database.close()
+                self.test_case_database = None
+
             os.makedirs(os.path.dirname(self.args.database_file), exist_ok=True)
             shutil.move(self.file_paths['TEST_CASE_DB_FILE'], self.args.database_file)
 
@@ -1767,6 +2255,7 @@ class Client:
 
     def cleanup(self):
         log(f'{self.__class__.__name__}.{self.cleanup.__name__}')
+        stop_lt_threads()
         autoprojects.iutctl.cleanup()
         self.shutdown_pts()
 
@@ -1826,65 +2315,181 @@ def recover_at_exception(func):
     return _recover_at_exception
 
 
-@recover_at_exception
-def run_recovery(args, ptses):
-    log('Running recovery')
+# Statuses of the test cases failed on the IUT side. With
+# --skip_healthy_recovery the PTS recovery after them is skipped, if the
+# PTS health probe passes.
+IUT_FAILURE_STATUSES = (ptstypes.E_BTP_ERROR, ptstypes.E_BTP_FATAL_ERROR, ptstypes.E_BTP_TIMEOUT,
+                        ptstypes.E_IUT_INIT_ERROR, IUT_FATAL_ERROR, BTP_SOCKET_CLOSED)
+# Statuses of the test cases failed on the PTS side. With
+# --skip_healthy_recovery the IUT USB replug after them is skipped, if
+# the IUT health probe passes.
+PTS_FAILURE_STATUSES = (ptstypes.E_XML_RPC_ERROR,)
 
-    iut = get_iut()
-    for iut_id in args.iut_map.keys():
-        if hasattr(iut, 'select_iut'):
-            iut.select_iut(iut_id)
-        iut.stop()
 
-        if args.usb_replug_available:
-            iut.btattach_stop()
-            replug_usb(args, iut)
-            iut.btattach_start()
+def _pts_healthy(pts, status):
+    if status not in IUT_FAILURE_STATUSES:
+        return False
+
+    try:
+        return pts.ready() is True
+    except BaseException as e:
+        log(f'PTS {pts} health probe failed: {e}')
+        return False
+
+
+def _iut_healthy(iut, status):
+    if status not in PTS_FAILURE_STATUSES:
+        return False
+
+    watcher = getattr(iut, 'watcher', None)
+
+    return watcher is not None and watcher.fatal is None
 
+
+def recovery_step_entry_wrapper(func):
+    def wrapper(name, durations, exceptions, finish_count, *args):
+        start = time.monotonic()
+        try:
+            func(*args)
+        except BaseException as exc:
+            logging.exception(exc)
+            exceptions.put(exc)
+        finally:
+            durations[name] = time.monotonic() - start
+            finish_count.add(1)
+
+    return wrapper
+
+
+@recovery_step_entry_wrapper
+def recover_iut_entry(args, iut_id, status, skip_healthy):
+    iut = get_iut()
     if hasattr(iut, 'select_iut'):
-        iut.select_iut(0)
+        iut.select_iut(iut_id)
 
-    for i, pts in enumerate(ptses):
-        req_sent = False
-        last_restart_time = None
+    iut.stop()
 
-        while not get_global_end():
-            try:
-                if not last_restart_time:
-                    last_restart_time = pts.get_last_recovery_time()
-                    log(f'Last restart time of PTS {pts}: {last_restart_time}')
-
-                if not req_sent:
-                    log(f'Recovering PTS {pts} ...')
-                    if isinstance(pts, PtsServerProxy):
-                        skip_shutdown_bpv = False
-
-                        if i > 0:
-                            for j in range(i):
-                                if ptses[j].server_address == pts.server_address:
-                                    skip_shutdown_bpv = True
-                                    break
-
-                        if not skip_shutdown_bpv:
-                            pts.shutdown_pts_bpv(False, True)
-
-                    pts.recover_pts()
-                    req_sent = True
-                    err = pts.callback.get_result('recover_pts', timeout=args.max_server_restart_time)
-                    if err:
-                        log('PTS recovered')
-                        break
+    if not args.usb_replug_available:
+        return
+
+    if skip_healthy and _iut_healthy(iut, status):
+        log(f'IUT {iut_id} healthy, USB replug skipped')
+        return
+
+    iut.btattach_stop()
+    replug_usb(args, iut)
+    iut.btattach_start()
+
+
+def _recover_pts(args, pts, shutdown_bpv, deadline):
+    req_sent = False
+    last_restart_time = None
+
+    while not get_global_end():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f'PTS {pts} not recovered in {args.max_server_restart_time} s')
 
-                if last_restart_time < pts.get_last_recovery_time():
+        try:
+            if not last_restart_time:
+                last_restart_time = pts.get_last_recovery_time()
+                log(f'Last restart time of PTS {pts}: {last_restart_time}')
+
+            if not req_sent:
+                log(f'Recovering PTS {pts} ...')
+                if shutdown_bpv:
+                    pts.shutdown_pts_bpv(False, True)
+
+                pts.recover_pts()
+                req_sent = True
+                err = pts.callback.get_result('recover_pts', timeout=remaining)
+                if err:
                     log('PTS recovered')
                     break
 
-            except BaseException as e:
-                log(e)
+            if last_restart_time < pts.get_last_recovery_time():
+                log('PTS recovered')
+                break
 
-            log('Server is still resetting. Wait a little more.')
-            time.sleep(1)
+        except BaseException as e:
+            log(e)
+
+        log('Server is still resetting. Wait a little more.')
+        time.sleep(1)
 
+
+@recovery_step_entry_wrapper
+def recover_ptses_entry(args, ptses, status, skip_healthy, deadline):
+    """Recovers the PTS instances of one autoptsserver. The first one
+    shuts down the PTS and BPV processes of the server, so the instances
+    are recovered in sequence and all of them, unless all are healthy."""
+    if skip_healthy and all(_pts_healthy(pts, status) for pts in ptses):
+        log(f'PTS {", ".join(str(pts) for pts in ptses)} healthy, recovery skipped')
+        return
+
+    for i, pts in enumerate(ptses):
+        _recover_pts(args, pts, i == 0 and isinstance(pts, PtsServerProxy), deadline)
+
+
+@recover_at_exception
+def run_recovery(args, ptses, status=None, skip_healthy=None):
+    """Recovers the IUTs and the PTS instances concurrently, with the
+    --max_server_restart_time deadline shared by all of them.
+
+    status is the status of the test case that failed, used by the health
+    probes of --skip_healthy_recovery. skip_healthy overrides the option.
+
+    Returns {recovery step: duration in seconds}.
+    """
+    log('Running recovery')
+
+    if skip_healthy is None:
+        skip_healthy = args.skip_healthy_recovery
+
+    # One step per IUT and one per autoptsserver
+    steps = [(f'IUT {iut_id}', recover_iut_entry, (args, iut_id, status, skip_healthy))
+             for iut_id in args.iut_map.keys()]
+
+    servers = {}
+    for pts in ptses:
+        servers.setdefault(getattr(pts, 'server_address', id(pts)), []).append(pts)
+
+    deadline = time.monotonic() + args.max_server_restart_time
+    steps.extend((f'PTS {", ".join(str(pts) for pts in server_ptses)}', recover_ptses_entry,
+                  (args, server_ptses, status, skip_healthy, deadline)) for server_ptses in servers.values())
+
+    durations = {}
+    exceptions = queue.Queue()
+    finish_count = CounterWithFlag(init_count=0)
+    thread_list = []
+
+    start = time.monotonic()
+    for name, entry, entry_args in steps:
+        thread = InterruptableThread(target=entry, name=f'recovery-{name}',
+                                     args=(name, durations, exceptions, finish_count, *entry_args))
+        thread_list.append(thread)
+        thread.start()
+
+    try:
+        # The IUT steps do not wait for a server, give them some slack
+        # after the PTS deadline.
+        finish_count.wait_for(len(thread_list), timeout=max(deadline - time.monotonic(), 0) + 60)
+    finally:
+        for thread in thread_list:
+            if thread.is_alive():
+                thread.interrupt()
+                log(f'Recovery step {thread.name} interrupted')
+
+    total = time.monotonic() - start
+    if durations:
+        slowest = max(durations, key=durations.get)
+        logging.info(f'Recovery took {total:.1f} s, the slowest step: {slowest} {durations[slowest]:.1f} s')
+        log(f'Recovery steps: {durations}')
+
+    if not exceptions.empty():
+        raise exceptions.get_nowait()
+
+    iut = get_iut()
     for iut_id in args.iut_map.keys():
         if hasattr(iut, 'select_iut'):
             iut.select_iut(iut_id)
@@ -1895,6 +2500,8 @@ def run_recovery(args, ptses):
 
     log('Recovery finished')
 
+    return durations
+
 
 def replug_usb(args, iut):
     log(f'{replug_usb.__name__}')
@@ -41,9 +41,8 @@ def generate_file_paths(file_paths=None, autopts_root_dir=AUTOPTS_ROOT_DIR):
     FILE_PATHS.update({
         'ALL_STATS_RESULTS_XML_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'all_stats_results.xml'),
         'TC_STATS_RESULTS_XML_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'tc_stats_results.xml'),
-        'TEST_CASES_JSON_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'test_cases_file.json'),
         'ALL_STATS_JSON_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'all_stats.json'),
-        'TC_STATS_JSON_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'tc_stats.json'),
+        'RUN_JOURNAL_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'run_journal.jsonl'),
         'TEST_CASE_DB_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'TestCase.db'),
         'BOT_STATE_JSON_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'bot_state.json'),
         'BOT_STATE_DIR': os.path.join(FILE_PATHS['TMP_DIR'], 'final_state'),
@@ -55,6 +54,7 @@ def generate_file_paths(file_paths=None, autopts_root_dir=AUTOPTS_ROOT_DIR):
         'REPORT_XLSX_FILE': os.path.join(autopts_root_dir, "report.xlsx"),
         'REPORT_TXT_FILE': os.path.join(autopts_root_dir, "report.txt"),
         'REPORT_DIFF_TXT_FILE': os.path.join(FILE_PATHS['TMP_DIR'], "report-diff.txt"),
+        'SLOWEST_WIDS_TXT_FILE': os.path.join(autopts_root_dir, "slowest_wids.txt"),
         'ERROR_TXT_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'error.txt'),
         'WID_USE_CSV_FILE': os.path.join(AUTOPTS_ROOT_DIR, 'wid_usage_report.csv'),
         # 'BOT_LOG_FILE': os.path.join(autopts_root_dir, 'autoptsclient_bot.log'),
@@ -65,6 +65,11 @@ logtype_whitelist = [ptstypes.PTS_LOGTYPE_START_TEST,
 
 PTS_START_LOCK = threading.RLock()
 
+# The log records are sent to the client in batches, when either
+# of the limits is reached.
+LOG_BATCH_MAX_RECORDS = 100
+LOG_BATCH_INTERVAL = 0.2  # seconds
+
 
 def pts_lock_wrapper(lock):
     def _pts_lock_wrapper(func):
@@ -102,13 +107,25 @@ class PTSLogger(win32com.server.connect.ConnectableServer):
 
         self._callback = None
         self._maximum_logging = False
+        self._log_types = None
         self._test_case_name = None
         self._end = False
         self._tc_status = ResultWithFlag()
+        self._batch = []
+        self._batch_cond = threading.Condition()
+        # Incremented at every flush request, the flusher thread sets
+        # _sent_seq to the requests it has sent the records of
+        self._flush_seq = 0
+        self._sent_seq = 0
+        self._flusher = None
         self.in_call = False
 
     def close(self):
         self._end = True
+        self.flush()
+
+        with self._batch_cond:
+            self._batch_cond.notify_all()
 
     def reopen(self):
         self._end = False
@@ -121,16 +138,116 @@ class PTSLogger(win32com.server.connect.ConnectableServer):
 
     def unset_callback(self):
         """Unset the callback"""
+        self.flush()
         self._callback = None
 
     def enable_maximum_logging(self, enable):
         """Enable/disable maximum logging"""
         self._maximum_logging = enable
 
+    def set_log_types(self, log_types):
+        """Set the log types forwarded to the client.
+
+        log_types -- list of PTS_LOGTYPE values, or None to forward
+                     the whitelisted types (all types with maximum logging)
+        """
+        self._log_types = set(log_types) if log_types is not None else None
+
     def set_test_case_name(self, test_case_name):
         """Required to identify multiple instances on client side"""
+        self.flush()
         self._test_case_name = test_case_name
 
+    def _is_log_type_wanted(self, log_type):
+        if self._log_types is not None:
+            return log_type in self._log_types
+
+        return self._maximum_logging or log_type in logtype_whitelist
+
+    def _start_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            # One long-lived thread, so the batches go through one
+            # persistent connection of the callback
+            self._flusher = threading.Thread(target=self._run_flusher, name='PTSLogFlusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_requested(self):
+        return self._flush_seq != self._sent_seq or len(self._batch) >= LOG_BATCH_MAX_RECORDS
+
+    def _run_flusher(self):
+        while True:
+            with self._batch_cond:
+                self._batch_cond.wait_for(lambda: self._batch or self._flush_seq != self._sent_seq or self._end)
+                if not self._batch and self._flush_seq == self._sent_seq:
+                    # Closed
+                    self._flusher = None
+                    return
+
+                # Collect the records for up to the batch interval
+                self._batch_cond.wait_for(self._flush_requested, timeout=LOG_BATCH_INTERVAL)
+
+                records = self._batch
+                self._batch = []
+                seq = self._flush_seq
+                callback = self._callback
+                test_case_name = self._test_case_name
+
+            # Sent without the lock, the Log calls of PTS do not wait
+            # for the client
+            if callback is not None:
+                try:
+                    for i in range(0, len(records), LOG_BATCH_MAX_RECORDS):
+                        callback.log_batch(records[i:i + LOG_BATCH_MAX_RECORDS], test_case_name)
+                except Exception as e:
+                    logging.exception(e)
+
+            with self._batch_cond:
+                self._sent_seq = seq
+                self._batch_cond.notify_all()
+
+    def _queue_record(self, record, flush_now):
+        with self._batch_cond:
+            self._batch.append(record)
+            if flush_now:
+                self._flush_seq += 1
+
+            self._start_flusher()
+            self._batch_cond.notify_all()
+
+    def flush(self):
+        """Send the buffered log records to the client, returns when they
+        have been sent"""
+        with self._batch_cond:
+            if not self._batch and self._flush_seq == self._sent_seq:
+                return
+
+            self._flush_seq += 1
+            seq = self._flush_seq
+            self._start_flusher()
+            self._batch_cond.notify_all()
+            self._batch_cond.wait_for(lambda: self._sent_seq >= seq)
+
+    def _parse_final_verdict(self, log_type, logtype_string, log_message):
+        # PTS uses PTSLogger.Log only after the RunTestCase
+        # has been finished, so consider only the final verdict
+        # of the test case.
+        # Check for "final verdict" to avoid "Encrypted Verdict".
+        # It could be 'Final verdict' or 'Final Verdict'.
+        if log_type != ptstypes.PTS_LOGTYPE_FINAL_VERDICT or \
+                logtype_string.lower() != "final verdict":
+            return None
+
+        if "PASS" in log_message:
+            return "PASS"
+        if "INDCSV" in log_message:
+            return "INDCSV"
+        if "INCONC" in log_message:
+            return "INCONC"
+        if "FAIL" in log_message:
+            return "FAIL"
+
+        return f"UNKNOWN VERDICT: {log_message.strip()}"
+
     def Log(self, log_type, logtype_string, log_time, log_message):
         """Implements:
 
@@ -152,32 +269,17 @@ class PTSLogger(win32com.server.connect.ConnectableServer):
         logger.info("%d %s %s %s", log_type, logtype_string, log_time, log_message)
 
         try:
-            if self._callback is not None:
-                if self._maximum_logging or log_type in logtype_whitelist:
-                    self._callback.log(log_type, logtype_string, log_time,
-                                       log_message, self._test_case_name)
-
-                    # PTS uses PTSLogger.Log only after the RunTestCase
-                    # has been finished, so consider only the final verdict
-                    # of the test case.
-                    # Check for "final verdict" to avoid "Encrypted Verdict".
-                    # It could be 'Final verdict' or 'Final Verdict'.
-                    if log_type == ptstypes.PTS_LOGTYPE_FINAL_VERDICT and \
-                            logtype_string.lower() == "final verdict":
-
-                        if "PASS" in log_message:
-                            new_status = "PASS"
-                        elif "INDCSV" in log_message:
-                            new_status = "INDCSV"
-                        elif "INCONC" in log_message:
-                            new_status = "INCONC"
-                        elif "FAIL" in log_message:
-                            new_status = "FAIL"
-                        else:
-                            new_status = f"UNKNOWN VERDICT: {log_message.strip()}"
-
-                        self._tc_status.set(new_status)
-                        log(f"Final verdict found: {self._test_case_name} {new_status}")
+            new_status = self._parse_final_verdict(log_type, logtype_string, log_message)
+
+            if self._callback is not None and self._is_log_type_wanted(log_type):
+                # Flush right away at the verdict, so the client
+                # logs are complete when the test case ends.
+                self._queue_record((log_type, logtype_string, log_time, log_message),
+                                   flush_now=new_status is not None)
+
+            if new_status is not None and self._callback is not None:
+                self._tc_status.set(new_status)
+                log(f"Final verdict found: {self._test_case_name} {new_status}")
         except Exception as e:
             if not self._tc_status.is_set():
                 self._tc_status.set(None)
@@ -833,6 +935,8 @@ class PyPTS:
             self._pts.RunTestCase(project_name, test_case_name)
 
             err = self._pts_logger.get_test_case_status(timeout=30)
+            # The client logs are complete when the test case ends
+            self._pts_logger.flush()
 
             self._revert_temp_changes()
         except Exception as e:
@@ -982,6 +1086,17 @@ class PyPTS:
         self._pts_logger.enable_maximum_logging(enable)
         self.add_recov(self.enable_maximum_logging, enable)
 
+    def set_log_types(self, log_types):
+        """Selects the PTS log types forwarded to the client.
+
+        log_types -- list of PTS_LOGTYPE values, or None to restore
+                     the default selection
+        """
+
+        log("%s %s", self.set_log_types.__name__, log_types)
+        self._pts_logger.set_log_types(log_types)
+        self.add_recov(self.set_log_types, log_types)
+
     def set_call_timeout(self, timeout):
         """Sets a timeout period in milliseconds for the RunTestCase() calls
         to PTS."""
@@ -18,14 +18,15 @@ import logging
 import autopts.wid.bap
 from autopts.ptsprojects.bluez.iutctl import get_iut
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__, 'autopts.wid.bap')
 def bap_wid_hdl(wid, description, test_case_name):
     log(f'{bap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.bap'])
+    return generic_wid_hdl(wid, description, test_case_name, bap_wid_hdl.wid_hdl_modules)
 
 
 def hdl_wid_302(params: WIDParams):
@@ -30,7 +30,8 @@ from autopts.config import FILE_PATHS
 from autopts.ptsprojects.boards import Board, tty_to_com
 from autopts.ptsprojects.stack import Stack
 from autopts.pybtp import btp, defs
-from autopts.pybtp.iutctl_common import BTP_ADDRESS, BTPSocketSrv, BTPWorker, LoggerWorker
+from autopts.pybtp.iutctl_common import BTP_ADDRESS, BTPSocketSrv, BTPWorker, IutWatcher, LoggerWorker
+from autopts.pybtp.supported_cmds_cache import image_fingerprint
 from autopts.pybtp.types import BTPInitError
 from autopts.rtt import BTMON, RTTLogger
 from autopts.utils import get_global_end
@@ -125,13 +126,19 @@ class IutCtl:
         self.get_btattach_cmd = get_btattach_cmd
         self.get_native_cmd = get_native_cmd
         self.boot_log = ''
+        # Ends the test case at an IUT assert or when the BTP socket closes
+        self.watcher = IutWatcher(args.fatal_log_patterns)
+        # The image run by the IUT, the kernel image if not set. Its
+        # fingerprint keys the cache of the supported BTP commands.
+        self.image_file = None
+        self.image_fingerprint = None
 
         if args.board_name:
             self.board = Board(args.board_name, self)
 
             if self.debugger_snr:
                 self.btp_address = BTP_ADDRESS + self.debugger_snr
-                self._rtt_logger = RTTLogger(args.rtt_log_syncto) if args.rtt_log else None
+                self._rtt_logger = RTTLogger(args.rtt_log_syncto, self.watcher) if args.rtt_log else None
         self._btmon = BTMON() if args.btmon else None
 
         if self.iut_mode == "tty":
@@ -173,6 +180,8 @@ class IutCtl:
 
         self.is_running = True
         self.test_case = test_case
+        self.watcher.arm()
+        self.image_fingerprint = image_fingerprint(self.image_file or self.kernel_image)
 
         self._start_mode(test_case)
 
@@ -220,7 +229,8 @@ class IutCtl:
 
         self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log")
         self.socket_srv.open(self.btp_address)
-        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
+        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name,
+                                     watcher=self.watcher)
         flow_control = "crtscts" if self.rtscts else ""
 
         if sys.platform == "win32":
@@ -264,7 +274,8 @@ class IutCtl:
     def _start_qemu_mode(self, test_case):
         self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log")
         self.socket_srv.open(self.btp_address)
-        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
+        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name,
+                                     watcher=self.watcher)
 
         if self._btattach and self._btattach_at_every_test_case:
             self.btattach_start(test_case.log_dir)
@@ -295,7 +306,8 @@ class IutCtl:
     def _start_native_mode(self, test_case):
         self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log")
         self.socket_srv.open(self.btp_address)
-        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
+        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name,
+                                     watcher=self.watcher)
 
         if self._btattach and self._btattach_at_every_test_case:
             self.btattach_start(test_case.log_dir)
@@ -399,7 +411,7 @@ class IutCtl:
 
             if self._net_tty_file:
                 self._uart_logger = LoggerWorker(self._net_tty_file, self.tty_baudrate,
-                                                 self.test_case.log_dir)
+                                                 self.test_case.log_dir, self.watcher)
                 self._uart_logger.start()
 
             if not self.iut_mode == "native":
@@ -417,6 +429,7 @@ class IutCtl:
         if not self.is_running:
             return
 
+        self.watcher.disarm()
         self._stop_mode()
 
         self.is_running = False
@@ -19,18 +19,20 @@ from time import sleep
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 from autopts.wid.gap import hdl_wid_139_mode1_lvl2, hdl_wid_139_mode1_lvl4
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__, 'autopts.wid.gap')
 def gap_wid_hdl(wid, description, test_case_name):
     log(f'{gap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.gap'])
+    return generic_wid_hdl(wid, description, test_case_name, gap_wid_hdl.wid_hdl_modules)
 
 
 # For tests in SC only, mode 1 level 3
+@wid_hdl_modules(*gap_wid_hdl.wid_hdl_modules)
 def gap_wid_hdl_mode1_lvl2(wid, description, test_case_name):
     if wid == 139:
         log("%s, %r, %r, %s", gap_wid_hdl_mode1_lvl2.__name__, wid, description,
@@ -40,6 +42,7 @@ def gap_wid_hdl_mode1_lvl2(wid, description, test_case_name):
 
 
 # For tests in SC only, mode 1 level 4
+@wid_hdl_modules(*gap_wid_hdl.wid_hdl_modules)
 def gap_wid_hdl_mode1_lvl4(wid, description, test_case_name):
     if wid == 139:
         log("%s, %r, %r, %s", gap_wid_hdl_mode1_lvl2.__name__, wid, description,
@@ -16,25 +16,24 @@
 import logging
 
 from autopts.ptsprojects.stack import get_stack
-from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__, 'autopts.ptsprojects.mynewt.gatt_wid', 'autopts.wid.gatt',
+                 overrides={'GATT/CL': (__name__, 'autopts.ptsprojects.mynewt.gatt_client_wid',
+                                        'autopts.wid.gatt_client')})
 def gattc_wid_hdl(wid, description, test_case_name):
     log(f'{gattc_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
     stack = get_stack()
     if stack.is_svc_supported('GATT_CL') and 'GATT/CL' in test_case_name:
         return generic_wid_hdl(wid, description, test_case_name,
-                               [__name__, 'autopts.ptsprojects.mynewt.gatt_client_wid',
-                                'autopts.wid.gatt_client'])
+                               gattc_wid_hdl.wid_hdl_overrides['GATT/CL'])
 
-    return generic_wid_hdl(wid, description, test_case_name,
-                           [__name__, 'autopts.ptsprojects.mynewt.gatt_wid',
-                            'autopts.wid.gatt'])
+    return generic_wid_hdl(wid, description, test_case_name, gattc_wid_hdl.wid_hdl_modules)
 
 
 def hdl_wid_24(params: WIDParams):
@@ -58,15 +57,12 @@ def hdl_wid_24(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover all include services in database.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    if not MMI.args:
+    if not params.mmi.args:
         return False
 
     # split MMI args into tuples (att_hdl, incl_svc_hdl, end_gp_hdl, svc_uuid)
     mmi_args_tupled = [
-        tuple(MMI.args[i:i + 4]) for i in range(0, len(MMI.args), 4)
+        tuple(params.mmi.args[i:i + 4]) for i in range(0, len(params.mmi.args), 4)
     ]
 
     stack = get_stack()
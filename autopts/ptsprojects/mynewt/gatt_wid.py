@@ -16,17 +16,18 @@
 import logging
 
 from autopts.ptsprojects.stack import get_stack
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__, 'autopts.wid.gatt',
+                 overrides={'GATT/CL': (__name__, 'autopts.wid.gatt_client')})
 def gatt_wid_hdl(wid, description, test_case_name):
     stack = get_stack()
     if stack.is_svc_supported('GATT_CL') and 'GATT/CL' in test_case_name:
         return generic_wid_hdl(wid, description, test_case_name,
-                               [__name__, 'autopts.wid.gatt_client'])
+                               gatt_wid_hdl.wid_hdl_overrides['GATT/CL'])
 
     log(f'{gatt_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name,
-                           [__name__, 'autopts.wid.gatt'])
+    return generic_wid_hdl(wid, description, test_case_name, gatt_wid_hdl.wid_hdl_modules)
@@ -0,0 +1,117 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Digests of the inputs of the test cases, the keys of the result cache.
+
+A test case gives the same verdict as its last run if none of its inputs
+has changed: the IUT image, the tester config, the PTS workspace with its
+PICS and PIXITs, the PTS version and the autopts code. The last result of
+a test case is kept in the test case database with the digest of these
+inputs.
+
+All the Python code of the autopts package is hashed, not only the modules
+of the test case profile. The profile modules import shared ones, and a
+stale cached PASS could hide a regression, while a cache miss only costs
+a test case run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from autopts.pybtp.supported_cmds_cache import image_fingerprint
+from autopts.utils import get_own_workspaces
+
+log = logging.debug
+
+AUTOPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Arguments of the tester config
+TESTER_CONFIG_ARGS = ('iut_config_file', 'board_name', 'iut_mode', 'bd_addr', 'iut_map')
+
+
+def _hash_files(sha1, paths, root):
+    for path in sorted(set(paths)):
+        with open(path, 'rb') as f:
+            sha1.update(os.path.relpath(path, root).replace(os.sep, '/').encode())
+            sha1.update(hashlib.sha1(f.read()).digest())
+
+
+def get_code_files(root=AUTOPTS_DIR):
+    """Returns the Python files of the autopts package, the projects,
+    the WID handlers and the BTP included"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        # The workspaces are hashed by their own
+        dirnames[:] = [name for name in dirnames if name not in ('__pycache__', 'workspaces')]
+        paths.extend(os.path.join(dirpath, name) for name in filenames if name.endswith('.py'))
+
+    return paths
+
+
+def get_workspace_files(workspace):
+    """Returns the files of the workspace directory, the PICS and PIXITs
+    included, None if the workspace is not available locally"""
+    workspace = get_own_workspaces().get(workspace, workspace)
+    if not workspace or not os.path.isfile(workspace):
+        return None
+
+    workspace_dir = os.path.dirname(os.path.abspath(workspace))
+
+    # The logs of the test cases are in the subdirectories
+    return [entry.path for entry in os.scandir(workspace_dir) if entry.is_file()]
+
+
+class ResultCacheInputs:
+    """Digests of the inputs of the test cases of a config"""
+
+    def __init__(self, args, iut=None, pts_version=None, code_root=AUTOPTS_DIR):
+        self.code_root = code_root
+        self.common = self._common_digest(args, iut, pts_version)
+
+    def _common_digest(self, args, iut, pts_version):
+        image = image_fingerprint(getattr(iut, 'image_file', None) or getattr(iut, 'kernel_image', None))
+        if image is None:
+            log('Result cache disabled, the IUT image is unknown')
+            return None
+
+        workspace_files = get_workspace_files(getattr(args, 'workspace', None))
+        if workspace_files is None:
+            log('Result cache disabled, the workspace is not available locally')
+            return None
+
+        if not pts_version:
+            log('Result cache disabled, the PTS version is unknown')
+            return None
+
+        tester_config = {name: getattr(args, name, None) for name in TESTER_CONFIG_ARGS}
+
+        sha1 = hashlib.sha1()
+        sha1.update(image.encode())
+        sha1.update(str(pts_version).encode())
+        sha1.update(json.dumps(tester_config, sort_keys=True, default=str).encode())
+        _hash_files(sha1, workspace_files, os.path.dirname(workspace_files[0]))
+        _hash_files(sha1, get_code_files(self.code_root), self.code_root)
+
+        return sha1.hexdigest()
+
+    def digest(self, test_case_name):
+        """Returns the digest of the inputs of the test case, None if the
+        result of the test case cannot be cached"""
+        if self.common is None:
+            return None
+
+        return hashlib.sha1(f'{self.common}:{test_case_name}'.encode()).hexdigest()
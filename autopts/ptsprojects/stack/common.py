@@ -15,10 +15,9 @@
 #
 import inspect
 import logging
-from threading import Event, Lock, Timer
-from time import sleep
+from threading import Event, Lock
 
-from autopts.utils import raise_on_global_end
+from autopts.utils import call_later, cancellable_sleep, raise_on_global_end
 
 
 class Property:
@@ -55,19 +54,19 @@ def wait_for_event(timeout, test, *args, **kwargs):
     flag = Event()
     flag.set()
 
-    t = Timer(timeout, timeout_cb, [timeout, flag, test])
-    t.name = f'EventTimer{t.name}'
-    t.start()
+    t = call_later(timeout, timeout_cb, timeout, flag, test)
 
-    while flag.is_set():
-        raise_on_global_end()
+    try:
+        while flag.is_set():
+            raise_on_global_end()
 
-        result = test(*args, **kwargs)
-        if result:
-            t.cancel()
-            return result
+            result = test(*args, **kwargs)
+            if result:
+                return result
 
-        sleep(0.1)
+            cancellable_sleep(0.1)
+    finally:
+        t.cancel()
 
     return False
 
@@ -76,27 +75,28 @@ def wait_event_with_condition(event_queue, condition_cb, timeout, remove):
     flag = Event()
     flag.set()
 
-    t = Timer(timeout, timeout_cb, [timeout, flag, condition_cb])
-    t.start()
+    t = call_later(timeout, timeout_cb, timeout, flag, condition_cb)
 
-    while flag.is_set():
-        raise_on_global_end()
+    try:
+        while flag.is_set():
+            raise_on_global_end()
 
-        for ev in event_queue:
-            if isinstance(ev, tuple):
-                result = condition_cb(*ev)
-            else:
-                result = condition_cb(ev)
+            for ev in event_queue:
+                if isinstance(ev, tuple):
+                    result = condition_cb(*ev)
+                else:
+                    result = condition_cb(ev)
 
-            if result:
-                t.cancel()
-                if ev and remove:
-                    event_queue.remove(ev)
+                if result:
+                    if ev and remove:
+                        event_queue.remove(ev)
 
-                return ev
+                    return ev
 
-        # TODO: Use wait() and notify() from threading.Condition
-        #  instead of sleep()
-        sleep(0.1)
+            # TODO: Use wait() and notify() from threading.Condition
+            #  instead of sleep()
+            cancellable_sleep(0.1)
+    finally:
+        t.cancel()
 
     return None
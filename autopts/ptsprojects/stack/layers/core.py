@@ -22,8 +22,14 @@ class CORE:
         self.event_queues = {
             defs.BTP_CORE_EV_IUT_READY: [],
         }
+        # Keys of the services registered in the IUT, e.g. 'gap'
+        self.registered_svcs = set()
 
     def event_received(self, event_type, event_data_tuple):
+        if event_type == defs.BTP_CORE_EV_IUT_READY:
+            # The IUT has (re)started with no services registered
+            self.registered_svcs.clear()
+
         self.event_queues[event_type].append(event_data_tuple)
 
     def wait_iut_ready_ev(self, timeout, remove=True):
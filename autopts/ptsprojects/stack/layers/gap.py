@@ -434,6 +434,23 @@ class Gap:
         self.discoverying.data = True
         self.found_devices.data = []
 
+    def wait_for_found_devices(self, timeout, condition):
+        """Waits until the found devices meet the condition. The condition
+        is checked again only after a new device has been reported.
+        """
+        checked_count = -1
+
+        def is_met():
+            nonlocal checked_count
+            count = len(self.found_devices.data)
+            if count == checked_count:
+                return False
+
+            checked_count = count
+            return condition()
+
+        return bool(wait_for_event(timeout, is_met))
+
     def set_passkey(self, passkey):
         self.passkey.data = passkey
 
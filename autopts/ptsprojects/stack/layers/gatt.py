@@ -14,7 +14,7 @@
 # more details.
 #
 import logging
-from threading import Event
+from threading import Event, Lock
 
 
 class GattAttribute:
@@ -74,9 +74,82 @@ class GattDB:
         return None
 
 
+class GattServerSnapshot:
+    """IUT GATT server database as read over BTP during a test case.
+
+    Caches the Get Attributes and Get Attribute Value responses, and the
+    GattDB built from them, so that WID handlers do not re-read the same
+    database. Invalidated by the local database updates and by attribute
+    value changes.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._attrs = {}
+        self._values = {}
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, found, name, key):
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        logging.debug("GATT server snapshot %s %s %r (%d hits, %d misses)",
+                      'hit' if found else 'miss', name, key, self.hits, self.misses)
+
+    def get_attrs(self, key):
+        """Returns cached Get Attributes response or None"""
+        with self._lock:
+            attrs = self._attrs.get(key)
+            self._count(attrs is not None, 'attrs', key)
+            return attrs
+
+    def set_attrs(self, key, attrs):
+        with self._lock:
+            self._attrs[key] = attrs
+
+    def get_attr_val(self, key):
+        """Returns cached Get Attribute Value response or None"""
+        with self._lock:
+            attr_val = self._values.get(key)
+            self._count(attr_val is not None, 'value', key)
+            return attr_val
+
+    def set_attr_val(self, key, attr_val):
+        with self._lock:
+            self._values[key] = attr_val
+
+    def get_db(self):
+        """Returns cached GattDB or None"""
+        with self._lock:
+            self._count(self._db is not None, 'db', None)
+            return self._db
+
+    def set_db(self, db):
+        with self._lock:
+            self._db = db
+
+    def invalidate_values(self, reason):
+        with self._lock:
+            logging.debug("GATT server snapshot values invalidated: %s", reason)
+            self._values.clear()
+            self._db = None
+
+    def invalidate(self, reason):
+        with self._lock:
+            logging.debug("GATT server snapshot invalidated: %s", reason)
+            self._attrs.clear()
+            self._values.clear()
+            self._db = None
+
+
 class Gatt:
     def __init__(self):
         self.server_db = GattDB()
+        self.server_snapshot = GattServerSnapshot()
         self.last_unique_uuid = 0
         self.verify_values = []
         self.notification_events = []
@@ -20,12 +20,13 @@ import errno
 import logging
 import os
 import queue
-import re
 import shlex
 import subprocess
 import sys
 import time
+from typing import NamedTuple
 
+from autopts.pybtp.types import parse_mmi_description
 from autopts.utils import get_global_end
 
 from . import ptstypes
@@ -35,6 +36,15 @@ from .utils import exec_iut_cmd
 log = logging.debug
 
 
+class WidTiming(NamedTuple):
+    project_name: str
+    wid: int
+    # From the OnImplicitSend arrival to the response
+    response_time: float
+    # The WID handler alone, including the BTP and wait_* calls
+    handler_time: float
+
+
 class ResponseWithPostWID:
     def __init__(self, response, next_steps):
         self.response = response
@@ -59,12 +69,6 @@ class MmiParser:
     def __init__(self):
         """Constructor of the parser"""
 
-        # pattern used to search for args in MMI description
-        self.pattern = re.compile(r"(?:'|=\s+)([0-9-xA-Fa-f]+)")
-
-        # list of the parsed argument values from MMI description
-        self.args = []
-
         # create attributes to reference the args
         for i in range(self.min_arg, self.max_arg):
             index = str(i)
@@ -91,28 +95,22 @@ class MmiParser:
         Description: Verify that the Implementation Under Test (IUT) can send
         data according to negotiate MTU size.
 
-        """
-        log("%s %r", self.parse_description.__name__, description)
-
-        self.args = self.pattern.findall(description)
+        Returns the immutable ParsedMmi of the description, shared by
+        concurrently handled MMIs.
 
-        log("Parse result: %r", self.args)
-
-    def reset(self):
-        """Resets the args
+        """
+        parsed = parse_mmi_description(description)
 
-        To be used when parsed values are not needed anymore
+        log("%s %r: %r", self.parse_description.__name__, description, parsed.args)
 
-        """
-        self.args = []
+        return parsed
 
-    def process_args(self, args):
+    def process_args(self, args, parsed):
         """Replaces the MMI keywords arguments (e.g. MMI.arg_1) with the
-        respective argument values from MMI description
+        respective argument values from the ParsedMmi of the MMI description
 
         """
-        log("%s: %s", self.process_args.__name__, args)
-        log("MMI.args now %r", self.args)
+        log("%s: %s %r", self.process_args.__name__, args, parsed.args)
 
         args_list = list(args)
 
@@ -120,10 +118,10 @@ class MmiParser:
             if not isinstance(arg, str):  # omit not strings
                 continue
 
-            if arg.startswith(MMI.arg_value_prefix):
+            if arg.startswith(self.arg_value_prefix):
                 mmi_index = int(arg[arg.rfind("_") + 1:])
 
-                args_list[arg_index] = self.args[mmi_index - 1]
+                args_list[arg_index] = parsed.args[mmi_index - 1]
 
         out_args = tuple(args_list)
         log("returning %r", out_args)
@@ -150,7 +148,7 @@ class TestCmd:
         self.process = None
         self.__started = False
 
-    def start(self):
+    def start(self, parsed=None):
         """Starts the command"""
         if self.__started:
             return
@@ -248,8 +246,13 @@ class TestFunc:
 
             setattr(self, attr_name, attr_value)
 
-    def start(self):
-        """Starts the function"""
+    def start(self, parsed=None):
+        """Starts the function
+
+        parsed -- ParsedMmi of the MMI description the MMI.arg_X arguments
+                  are taken from
+
+        """
         self.call_count += 1
         log(f"Starting test function: {self}")
 
@@ -259,7 +262,7 @@ class TestFunc:
                 return
 
         if self.desc_parsing_needed:
-            args = MMI.process_args(self.args)
+            args = MMI.process_args(self.args, parsed)
         else:
             args = self.args
 
@@ -311,6 +314,14 @@ class PTSCallback:
         """
         raise AbstractMethodException()
 
+    def log_batch(self, records, test_case_name):
+        """Batched variant of log
+
+        records -- list of (log_type, logtype_string, log_time, log_message)
+        """
+        for log_type, logtype_string, log_time, log_message in records:
+            self.log(log_type, logtype_string, log_time, log_message, test_case_name)
+
     def on_implicit_send(self, project_name, wid, test_case_name, description,
                          style):
         """Implements:
@@ -412,6 +423,7 @@ class TestCase(PTSCallback):
         self.generic_wid_hdl = generic_wid_hdl
         self.steps_queue = None
         self.post_wid_queue = None
+        self.wid_timings = []
         self.ptsproject_name = ptsproject_name
         self.tc_subproc = None
         self.lf_subproc = None
@@ -429,6 +441,7 @@ class TestCase(PTSCallback):
         self.state = None
         self.steps_queue = queue.Queue()
         self.post_wid_queue = []
+        self.wid_timings = []
 
     def __str__(self):
         """Returns string representation"""
@@ -571,13 +584,10 @@ class TestCase(PTSCallback):
 
             # start command
             if cmd.start_wid == wid:
-                if cmd.desc_parsing_needed:
-                    MMI.parse_description(description)
-
-                cmd.start()
+                # Parsed per MMI, the concurrent test cases do not share it
+                parsed = MMI.parse_description(description) if cmd.desc_parsing_needed else None
 
-                if cmd.desc_parsing_needed:  # clear parsed description
-                    MMI.reset()
+                cmd.start(parsed)
 
             # stop command
             if cmd.stop_wid == wid:
@@ -653,7 +663,7 @@ class TestCase(PTSCallback):
         """Callback called by PTS via xmlrpc proxy"""
 
         self.add_next_step(self.run_wid, project_name, wid,
-                           test_case_name, description, style)
+                           test_case_name, description, style, time.monotonic())
 
     def add_next_step(self, func, *args):
         """Queue WID or post-WID, that has to be run after sending
@@ -673,9 +683,12 @@ class TestCase(PTSCallback):
 
         return response
 
-    def run_wid(self, project_name, wid, test_case_name, description, style):
+    def run_wid(self, project_name, wid, test_case_name, description, style, received=None):
         """Handles MMI requested with
-         PTSControl.IPTSImplicitSendCallbackEx.OnImplicitSend"""
+         PTSControl.IPTSImplicitSendCallbackEx.OnImplicitSend
+
+        received -- time.monotonic() of the OnImplicitSend arrival
+        """
         log("%s %s", self, self.on_implicit_send.__name__)
 
         if self.iut_count > 1 and "For IUT2" in description:
@@ -691,6 +704,8 @@ class TestCase(PTSCallback):
         # start/stop command if triggered by wid
         self.start_stop_cmds_by_wid(wid, description)
 
+        handler_start = time.monotonic()
+
         if self.generic_wid_hdl is not None:
             my_response = self.handle_mmi_generic(wid, description, style,
                                                   test_case_name)
@@ -705,6 +720,8 @@ class TestCase(PTSCallback):
             else:
                 my_response = self.handle_mmi_style_ok_cancel(wid, description)
 
+        handler_time = time.monotonic() - handler_start
+
         # If there are post wid TestFunc waiting, run those after this one
         if self.post_wid_queue:
             self.add_next_step(self.run_post_wid_cmds)
@@ -719,6 +736,9 @@ class TestCase(PTSCallback):
         if hasattr(iutctl, 'select_iut'):
             iutctl.select_iut(0)
 
+        if received is not None:
+            self.wid_timings.append(WidTiming(project_name, wid, time.monotonic() - received, handler_time))
+
         log("Sending response %r to wid %d test case %s", my_response, wid, test_case_name)
         return my_response
 
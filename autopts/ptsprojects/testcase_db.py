@@ -1,69 +1,447 @@
+import bisect
+import math
 import sqlite3
+import threading
+from collections import Counter
 
 DATABASE_FILE = 'TestCase.db'
 
+# Number of the last durations kept per test case
+DURATION_HISTORY_SIZE = 50
+
+# Quarantine states of the test cases, the others are stable
+QUARANTINE_FLAKY = 'flaky'
+QUARANTINE_FAILING = 'failing'
+# Number of the consecutive PASS results that release a test case from
+# the quarantine
+QUARANTINE_EXPIRE_PASSES = 3
+# Number of the consecutive non-PASS results of a consistently failing
+# test case
+QUARANTINE_FAILING_COUNT = 3
+
+# Upper bounds in seconds of the WID latency histogram buckets. The last
+# bucket counts the latencies above the highest bound.
+WID_LATENCY_BUCKETS = (0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+
+def nearest_rank_percentile(values, percent):
+    """Returns the nearest-rank percentile of the non-empty values"""
+    values = sorted(values)
+    rank = math.ceil(len(values) * percent / 100)
+    return values[max(rank, 1) - 1]
+
+
+class WidLatencyHistogram:
+    """Histogram of the latencies of a WID"""
+
+    def __init__(self):
+        self.counts = [0] * (len(WID_LATENCY_BUCKETS) + 1)
+        self.totals = [0.0] * (len(WID_LATENCY_BUCKETS) + 1)
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def add(self, latency):
+        bucket = bisect.bisect_left(WID_LATENCY_BUCKETS, latency)
+        self.add_bucket(bucket, 1, latency)
+
+    def add_bucket(self, bucket, count, total):
+        self.counts[bucket] += count
+        self.totals[bucket] += total
+
+    def merge(self, other):
+        for bucket, count in enumerate(other.counts):
+            self.add_bucket(bucket, count, other.totals[bucket])
+
+    def mean(self):
+        count = self.count
+        if not count:
+            return 0.0
+
+        return sum(self.totals) / count
+
+    def percentile(self, percent):
+        """Returns the upper bound of the bucket of the percentile,
+        math.inf if above the highest bound."""
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                if bucket < len(WID_LATENCY_BUCKETS):
+                    return WID_LATENCY_BUCKETS[bucket]
+                break
+
+        return math.inf
+
+
+class TestCaseRepeats:
+    """Verdicts, durations and failure signatures of the repeated runs of
+    a test case"""
+
+    def __init__(self):
+        self.verdicts = Counter()
+        self.durations = []
+        self.signatures = Counter()
+
+    @property
+    def count(self):
+        return len(self.durations)
+
+    def add(self, result, duration, signature=''):
+        self.verdicts[result] += 1
+        self.durations.append(duration)
+        if signature:
+            self.signatures[signature] += 1
+
+    def merge(self, other):
+        self.verdicts.update(other.verdicts)
+        self.durations.extend(other.durations)
+        self.signatures.update(other.signatures)
+
+    def flake_score(self):
+        """Returns 0 if all runs pass or all fail, up to 1 for half of
+        the runs failing."""
+        if not self.count:
+            return 0.0
+
+        passed = self.verdicts['PASS']
+        return 2 * min(passed, self.count - passed) / self.count
+
+    def percentile(self, percent):
+        if not self.durations:
+            return 0.0
+
+        return nearest_rank_percentile(self.durations, percent)
+
+
+def next_quarantine_state(entry, result, expire_passes=QUARANTINE_EXPIRE_PASSES,
+                          failing_count=QUARANTINE_FAILING_COUNT, retried=False):
+    """Returns the quarantine entry (state, passes, fails) of a test case
+    after its result, None if the test case is stable.
+
+    entry -- the quarantine entry before the result, None if stable
+    retried -- the result is a failure retried in the same test run. It
+               is flaky evidence, only the final result of the run counts
+               as a failure in a row.
+    """
+    if retried:
+        if entry is None:
+            return QUARANTINE_FLAKY, 0, 0
+
+        return entry[0], 0, entry[2]
+
+    if result == 'PASS':
+        if entry is None:
+            return None
+
+        passes = entry[1] + 1
+        if passes >= expire_passes:
+            return None
+
+        # A failing test case that passed is flaky
+        return QUARANTINE_FLAKY, passes, 0
+
+    fails = entry[2] + 1 if entry else 1
+    state = QUARANTINE_FAILING if fails >= failing_count else QUARANTINE_FLAKY
+
+    return state, 0, fails
+
 
 class TestCaseTable:
     def __init__(self, name, database_file=DATABASE_FILE):
         self.database_file = database_file
-        self._open()
         self.name = name
+        self.quarantine_expire_passes = QUARANTINE_EXPIRE_PASSES
+        self.quarantine_failing_count = QUARANTINE_FAILING_COUNT
+        self.lock = threading.RLock()
+        # One long-lived connection, shared by the test case threads
+        self.conn = sqlite3.connect(self.database_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.cursor = self.conn.cursor()
 
-        self.cursor.execute(
-            f"CREATE TABLE IF NOT EXISTS {self.name} (name TEXT, duration REAL, "
-            "count INTEGER, result TEXT);")
-        self.conn.commit()
+        with self.lock, self.conn:
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} (name TEXT, duration REAL, "
+                "count INTEGER, result TEXT);")
+            # Databases created before the unique index was introduced
+            # may have duplicated rows. Keep the first one, the others
+            # were never read.
+            self.cursor.execute(
+                f"DELETE FROM {self.name} WHERE rowid NOT IN "
+                f"(SELECT MIN(rowid) FROM {self.name} GROUP BY name);")
+            self.cursor.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {self.name}_name_idx "
+                f"ON {self.name} (name);")
+            # kind is 'response' (from the MMI arrival to the response)
+            # or 'handler' (the WID handler alone)
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name}_wid_latency (project TEXT, "
+                "wid INTEGER, kind TEXT, bucket INTEGER, count INTEGER, total REAL, "
+                "PRIMARY KEY (project, wid, kind, bucket));")
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name}_duration_history "
+                "(name TEXT, duration REAL, result TEXT);")
+            self.cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.name}_duration_history_idx "
+                f"ON {self.name}_duration_history (name);")
+            # Every run of the repeated test cases, by the test run id
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name}_repeat_runs (run_id TEXT, "
+                "name TEXT, result TEXT, duration REAL, signature TEXT);")
+            self.cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.name}_repeat_runs_idx "
+                f"ON {self.name}_repeat_runs (run_id, name);")
+            # The last final result of a test case with the digest of its inputs
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name}_result_cache (name TEXT PRIMARY KEY, "
+                "inputs TEXT, result TEXT, duration REAL);")
+
+            self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?;",
+                                (f"{self.name}_quarantine",))
+            seed_quarantine = self.cursor.fetchone() is None
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name}_quarantine (name TEXT PRIMARY KEY, "
+                "state TEXT, passes INTEGER, fails INTEGER);")
+            if seed_quarantine:
+                # The quarantine of the existing databases starts from their history
+                self.cursor.execute(
+                    f"SELECT name, result FROM {self.name}_duration_history ORDER BY rowid;")
+                quarantine = {}
+                for test_case_name, result in self.cursor.fetchall():
+                    entry = next_quarantine_state(quarantine.get(test_case_name), result)
+                    if entry is None:
+                        quarantine.pop(test_case_name, None)
+                    else:
+                        quarantine[test_case_name] = entry
 
-        self._close()
+                self.cursor.executemany(
+                    f"INSERT INTO {self.name}_quarantine VALUES(?, ?, ?, ?);",
+                    ((test_case_name, *entry) for test_case_name, entry in quarantine.items()))
 
-    def _open(self):
-        self.conn = sqlite3.connect(self.database_file)
-        self.cursor = self.conn.cursor()
+    def close(self):
+        with self.lock:
+            if self.conn is None:
+                return
 
-    def _close(self):
-        self.cursor.close()
-        self.conn.close()
+            self.cursor.close()
+            self.conn.close()
+            self.conn = None
+            self.cursor = None
 
     def update_statistics(self, test_case_name, duration, result):
-        self._open()
+        with self.lock, self.conn:
+            self.cursor.execute(
+                f"SELECT duration, count FROM {self.name} "
+                "WHERE name=:name;", {"name": test_case_name})
+            row = self.cursor.fetchone()
 
-        self.cursor.execute(
-            f"SELECT duration, count FROM {self.name} "
-            "WHERE name=:name;", {"name": test_case_name})
-        row = self.cursor.fetchall()
-        if len(row) == 0:
-            self.cursor.execute(
-                f"INSERT INTO {self.name} VALUES(?, ?, ?, ?);",
-                (test_case_name, duration, 1, result))
-            self.conn.commit()
-            self._close()
-            return
+            if row is None:
+                mean = duration
+                count = 1
+            else:
+                (mean, count) = row
+                if not count:
+                    count = 0
+                    mean = 0
 
-        (mean, count) = row[0]
-        if not count:
-            count = 0
-            mean = 0
+                count += 1
+                mean += (duration - mean) // count
 
-        count += 1
-        mean += (duration - mean) // count
+            self.cursor.execute(
+                f"INSERT INTO {self.name} VALUES(:name, :duration, :count, :result) "
+                "ON CONFLICT(name) DO UPDATE SET duration=excluded.duration, "
+                "count=excluded.count, result=excluded.result;",
+                {"duration": mean, "count": count, "name": test_case_name, "result": result})
 
+            self.cursor.execute(
+                f"INSERT INTO {self.name}_duration_history VALUES(:name, :duration, :result);",
+                {"name": test_case_name, "duration": duration, "result": result})
+            self.cursor.execute(
+                f"DELETE FROM {self.name}_duration_history WHERE name=:name AND rowid NOT IN "
+                f"(SELECT rowid FROM {self.name}_duration_history WHERE name=:name "
+                "ORDER BY rowid DESC LIMIT :size);",
+                {"name": test_case_name, "size": DURATION_HISTORY_SIZE})
+
+            self._update_quarantine(test_case_name, result)
+
+    def _update_quarantine(self, test_case_name, result, retried=False):
         self.cursor.execute(
-            f"UPDATE {self.name} SET duration=:duration, count=:count, result=:result "
-            "WHERE name=:name", {"duration": mean,
-                                                   "count": count,
-                                                   "name": test_case_name,
-                                                   "result": result})
-        self.conn.commit()
-        self._close()
+            f"SELECT state, passes, fails FROM {self.name}_quarantine WHERE name=:name;",
+            {"name": test_case_name})
+        entry = next_quarantine_state(self.cursor.fetchone(), result, self.quarantine_expire_passes,
+                                      self.quarantine_failing_count, retried)
 
-    def get_mean_duration(self, test_case_name):
-        self._open()
+        if entry is None:
+            self.cursor.execute(f"DELETE FROM {self.name}_quarantine WHERE name=:name;",
+                                {"name": test_case_name})
+            return
 
         self.cursor.execute(
-            f"SELECT duration FROM {self.name} "
-            "WHERE name=:name;", {"name": test_case_name})
-        row = self.cursor.fetchone()
-        self._close()
+            f"INSERT INTO {self.name}_quarantine VALUES(:name, :state, :passes, :fails) "
+            "ON CONFLICT(name) DO UPDATE SET state=excluded.state, "
+            "passes=excluded.passes, fails=excluded.fails;",
+            {"name": test_case_name, "state": entry[0], "passes": entry[1], "fails": entry[2]})
+
+    def update_quarantine(self, test_case_name, result):
+        """Updates the quarantine by a failed run retried later. The final
+        result of the test run is stored by update_statistics."""
+        with self.lock, self.conn:
+            self._update_quarantine(test_case_name, result, retried=True)
+
+    def get_quarantine(self):
+        """Returns {test case name: quarantine state} of the test cases
+        in the quarantine"""
+        with self.lock:
+            self.cursor.execute(f"SELECT name, state FROM {self.name}_quarantine;")
+            rows = self.cursor.fetchall()
+
+        return dict(rows)
+
+    def _select_for_names(self, query, test_case_names, params=()):
+        """Returns the rows of the query joined with the wanted_names
+        temporary table of the given test case names"""
+        with self.lock, self.conn:
+            self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_names (name TEXT PRIMARY KEY);")
+            self.cursor.execute("DELETE FROM wanted_names;")
+            self.cursor.executemany("INSERT OR IGNORE INTO wanted_names VALUES(?);",
+                                    ((name,) for name in test_case_names))
+            self.cursor.execute(query, params)
+            rows = self.cursor.fetchall()
+            self.cursor.execute("DELETE FROM wanted_names;")
+
+        return rows
+
+    def get_many(self, test_case_names):
+        """Returns {test case name: (mean duration, last result)} of the
+        given test cases in one query. Unknown test cases are skipped.
+        """
+        rows = self._select_for_names(
+            f"SELECT t.name, t.duration, t.result FROM {self.name} AS t "
+            "JOIN wanted_names USING(name);",
+            test_case_names)
+
+        return {name: (duration, result) for name, duration, result in rows}
+
+    def get_duration_percentiles(self, test_case_names, percent, result='PASS', min_samples=5):
+        """Returns {test case name: percentile of the last durations} of
+        the runs with the result. Test cases with less than min_samples
+        such runs are skipped.
+        """
+        rows = self._select_for_names(
+            f"SELECT h.name, h.duration FROM {self.name}_duration_history AS h "
+            "JOIN wanted_names USING(name) WHERE h.result=:result;",
+            test_case_names, {"result": result})
+
+        durations = {}
+        for name, duration in rows:
+            durations.setdefault(name, []).append(duration)
+
+        percentiles = {}
+        for name, values in durations.items():
+            if len(values) < min_samples:
+                continue
+
+            percentiles[name] = nearest_rank_percentile(values, percent)
+
+        return percentiles
+
+    def get_result_histories(self, test_case_names, limit=DURATION_HISTORY_SIZE):
+        """Returns {test case name: the last results, the oldest first} of
+        the given test cases. Unknown test cases are skipped.
+        """
+        rows = self._select_for_names(
+            f"SELECT h.name, h.result FROM {self.name}_duration_history AS h "
+            "JOIN wanted_names USING(name) ORDER BY h.rowid;",
+            test_case_names)
+
+        histories = {}
+        for name, result in rows:
+            histories.setdefault(name, []).append(result)
+
+        return {name: results[-limit:] for name, results in histories.items()}
+
+    def update_wid_latencies(self, histograms):
+        """Adds {(project, wid, kind): WidLatencyHistogram} to the
+        histograms of the previous runs.
+        """
+        rows = [(project, wid, kind, bucket, count, histogram.totals[bucket])
+                for (project, wid, kind), histogram in histograms.items()
+                for bucket, count in enumerate(histogram.counts) if count]
+
+        with self.lock, self.conn:
+            self.cursor.executemany(
+                f"INSERT INTO {self.name}_wid_latency VALUES(?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(project, wid, kind, bucket) DO UPDATE SET "
+                "count=count + excluded.count, total=total + excluded.total;", rows)
+
+    def get_wid_latencies(self):
+        """Returns {(project, wid, kind): WidLatencyHistogram} of all runs"""
+        with self.lock:
+            self.cursor.execute(
+                f"SELECT project, wid, kind, bucket, count, total FROM {self.name}_wid_latency;")
+            rows = self.cursor.fetchall()
+
+        histograms = {}
+        for project, wid, kind, bucket, count, total in rows:
+            histogram = histograms.setdefault((project, wid, kind), WidLatencyHistogram())
+            histogram.add_bucket(bucket, count, total)
+
+        return histograms
+
+    def add_repeat_run(self, run_id, test_case_name, result, duration, signature=''):
+        with self.lock, self.conn:
+            self.cursor.execute(
+                f"INSERT INTO {self.name}_repeat_runs VALUES(:run_id, :name, :result, :duration, :signature);",
+                {"run_id": run_id, "name": test_case_name, "result": result,
+                 "duration": duration, "signature": signature})
+
+    def get_repeat_runs(self, run_id=None):
+        """Returns {test case name: TestCaseRepeats} of the test run, or of
+        all test runs if run_id is None"""
+        with self.lock:
+            if run_id is None:
+                self.cursor.execute(
+                    f"SELECT name, result, duration, signature FROM {self.name}_repeat_runs;")
+            else:
+                self.cursor.execute(
+                    f"SELECT name, result, duration, signature FROM {self.name}_repeat_runs "
+                    "WHERE run_id=:run_id;", {"run_id": run_id})
+            rows = self.cursor.fetchall()
+
+        repeats = {}
+        for name, result, duration, signature in rows:
+            repeats.setdefault(name, TestCaseRepeats()).add(result, duration, signature)
+
+        return repeats
+
+    def set_cached_result(self, test_case_name, inputs, result, duration):
+        with self.lock, self.conn:
+            self.cursor.execute(
+                f"INSERT INTO {self.name}_result_cache VALUES(:name, :inputs, :result, :duration) "
+                "ON CONFLICT(name) DO UPDATE SET inputs=excluded.inputs, "
+                "result=excluded.result, duration=excluded.duration;",
+                {"name": test_case_name, "inputs": inputs, "result": result, "duration": duration})
+
+    def get_cached_result(self, test_case_name, inputs):
+        """Returns (result, duration) of the last run of the test case with
+        the same inputs digest, None if the inputs have changed since"""
+        with self.lock:
+            self.cursor.execute(
+                f"SELECT result, duration FROM {self.name}_result_cache "
+                "WHERE name=:name AND inputs=:inputs;", {"name": test_case_name, "inputs": inputs})
+            row = self.cursor.fetchone()
+
+        return row
+
+    def get_mean_duration(self, test_case_name):
+        with self.lock:
+            self.cursor.execute(
+                f"SELECT duration FROM {self.name} "
+                "WHERE name=:name;", {"name": test_case_name})
+            row = self.cursor.fetchone()
 
         if row is not None:
             return row[0]
@@ -71,13 +449,11 @@ class TestCaseTable:
         return None
 
     def get_result(self, test_case_name):
-        self._open()
-
-        self.cursor.execute(
-            f"SELECT result FROM {self.name} "
-            "WHERE name=:name", {"name": test_case_name})
-        row = self.cursor.fetchone()
-        self._close()
+        with self.lock:
+            self.cursor.execute(
+                f"SELECT result FROM {self.name} "
+                "WHERE name=:name", {"name": test_case_name})
+            row = self.cursor.fetchone()
 
         if row is not None:
             return row[0]
@@ -88,16 +464,21 @@ class TestCaseTable:
         duration = 0
         count_unknown = 0
         num_test_cases = len(test_cases_names)
+        known = self.get_many(test_cases_names)
 
         for test_case_name in test_cases_names:
             expected_run_count = 1
 
+            if test_case_name not in known:
+                count_unknown += 1
+                continue
+
+            mean_time, last_result = known[test_case_name]
+
             # Assume worst case scenario
-            last_result = self.get_result(test_case_name)
             if last_result and last_result != 'PASS':
                 expected_run_count = run_count_max
 
-            mean_time = self.get_mean_duration(test_case_name)
             if mean_time is None:
                 count_unknown += 1
             else:
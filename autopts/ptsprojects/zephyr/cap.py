@@ -114,8 +114,7 @@ def test_cases(ptses):
         TestFunc(stack.gatt_init),
         TestFunc(btp.gap_set_connectable),
         TestFunc(btp.gap_set_general_discoverable),
-        TestFunc(btp.core_reg_svc_mics),
-        TestFunc(btp.core_reg_svc_vcs),
+        TestFunc(btp.core_reg_svcs, 'mics', 'vcs'),
         TestFunc(btp.vcs_register, 1, False, 100),
         TestFunc(stack.vcs_init),
         TestFunc(btp.core_reg_svc_aics),
@@ -123,25 +122,19 @@ def test_cases(ptses):
         TestFunc(btp.core_reg_svc_vocs),
         TestFunc(stack.vocs_init),
         # Enable GMCS and TBS to have 2 CCIDs in Zephyr stack which is required by some tests
-        TestFunc(btp.core_reg_svc_gmcs),
-        TestFunc(btp.core_reg_svc_tbs),
+        TestFunc(btp.core_reg_svcs, 'gmcs', 'tbs'),
         TestFunc(stack.gmcs_init),
         # Enable CSIP to have access to Start Ordered Access
         # procedure BTP command
         TestFunc(btp.core_reg_svc_csip),
         TestFunc(stack.csip_init),
-        TestFunc(btp.core_reg_svc_pacs),
-        TestFunc(btp.core_reg_svc_ascs),
-        TestFunc(btp.core_reg_svc_bap),
+        TestFunc(btp.core_reg_svcs, 'pacs', 'ascs', 'bap'),
         TestFunc(stack.ascs_init),
         TestFunc(stack.bap_init),
         TestFunc(stack.cap_init),
         TestFunc(stack.micp_init),
         TestFunc(stack.vcp_init),
-        TestFunc(btp.core_reg_svc_cap),
-        TestFunc(btp.core_reg_svc_cas),
-        TestFunc(btp.core_reg_svc_micp),
-        TestFunc(btp.core_reg_svc_vcp),
+        TestFunc(btp.core_reg_svcs, 'cap', 'cas', 'micp', 'vcp'),
         TestFunc(btp.gap_set_extended_advertising_on),
                 TestFunc(lambda opcodes=opcodes: tbs_register_bearer(
                 provider_name="Generic TBS",
@@ -15,11 +15,12 @@
 
 import logging
 
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__, 'autopts.wid.gmcs')
 def gmcs_wid_hdl(wid, description, test_case_name):
     log(f'{gmcs_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.gmcs'])
+    return generic_wid_hdl(wid, description, test_case_name, gmcs_wid_hdl.wid_hdl_modules)
@@ -18,10 +18,12 @@ import sys
 
 from autopts.pybtp.types import WIDParams
 from autopts.wid.micp import micp_wid_hdl as gen_wid_hdl
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__, 'autopts.wid.micp')
 def micp_wid_hdl(wid, description, test_case_name):
     log("%s, %r, %r, %s", micp_wid_hdl.__name__, wid, description,
         test_case_name)
@@ -18,14 +18,15 @@ import logging
 from autopts.ptsprojects.stack import get_stack
 from autopts.ptsprojects.zephyr.iutctl import get_iut
 from autopts.pybtp import btp
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__, 'autopts.wid.sm')
 def sm_wid_hdl(wid, description, test_case_name):
     log(f'{sm_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.sm'])
+    return generic_wid_hdl(wid, description, test_case_name, sm_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
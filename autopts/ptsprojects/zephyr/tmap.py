@@ -102,22 +102,8 @@ def test_cases(ptses):
         TestFunc(stack.gatt_init),
         TestFunc(btp.gap_set_connectable),
         TestFunc(btp.gap_set_general_discoverable),
-        TestFunc(btp.core_reg_svc_pacs),
-        TestFunc(btp.core_reg_svc_ascs),
-        TestFunc(btp.core_reg_svc_bap),
-        TestFunc(btp.core_reg_svc_cap),
-        TestFunc(btp.core_reg_svc_tmap),
-        TestFunc(btp.core_reg_svc_vcp),
-        TestFunc(btp.core_reg_svc_vcs),
-        TestFunc(btp.core_reg_svc_tbs),
-        TestFunc(btp.core_reg_svc_csip),
-        TestFunc(btp.core_reg_svc_mics),
-        TestFunc(btp.core_reg_svc_aics),
-        TestFunc(btp.core_reg_svc_vocs),
-        TestFunc(btp.core_reg_svc_gmcs),
-        TestFunc(btp.core_reg_svc_cas),
-        TestFunc(btp.core_reg_svc_micp),
-        TestFunc(btp.core_reg_svc_ccp),
+        TestFunc(btp.core_reg_svcs, 'pacs', 'ascs', 'bap', 'cap', 'tmap', 'vcp', 'vcs', 'tbs',
+                 'csip', 'mics', 'aics', 'vocs', 'gmcs', 'cas', 'micp', 'ccp'),
         TestFunc(stack.aics_init),
         TestFunc(stack.ascs_init),
         TestFunc(stack.bap_init),
@@ -0,0 +1,436 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Replaying stand-in for the autoptsserver.
+
+Serves the PyPTS XML-RPC surface used by the auto-pts client, but instead
+of running the PTS it drives the client callback with the WID sequences
+recorded from real OnImplicitSend logs. It runs on any OS, so the whole
+client orchestration can be run against a simulated IUT without Windows,
+PTS or dongles, e.g.:
+
+    python -m autopts.ptsreplay -S 65000 --recording recording.json
+    python -m autopts.ptsreplay -S 65000 --from-logs logs/ --save recording.json
+
+The recording is a JSON file of the form:
+
+    {"GAP/ADV/BV-01-C": {"project": "GAP", "verdict": "PASS",
+                         "wids": [{"wid": 35, "description": "...",
+                                   "style": 69697, "response": "OK"}]}}
+"""
+
+import argparse
+import datetime
+import io
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import xmlrpc.client
+import xmlrpc.server
+import zipfile
+from pathlib import Path
+
+from autopts.config import SERVER_PORT
+from autopts.ptsprojects import ptstypes
+from autopts.types import PTSProxy
+from autopts.utils import ResultWithFlag
+
+log = logging.debug
+
+# Default time in seconds the client has to respond to a WID. The real
+# PTS waits 900 seconds, but a replayed run is supposed to be fast.
+WID_RESPONSE_TIMEOUT = 60
+
+_FIELD_REGEX = re.compile(r"^(project_name|wid|test_case_name|description|style):\s?(.*)$")
+_TYPE_SUFFIX_REGEX = re.compile(r"\s*<class '\w+'>$")
+_STYLE_REGEX = re.compile(r"0x([0-9a-fA-F]+)")
+_RESPONSE_REGEX = re.compile(r"Sending response (.+) to wid (\d+) test case (\S+)")
+_VERDICTS = ('PASS', 'INDCSV', 'INCONC', 'FAIL')
+
+
+def _parse_log_file(log_file, recordings):
+    block = None
+    last_field = None
+
+    with open(log_file, encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            stripped = line.strip()
+
+            if stripped.startswith("BEGIN OnImplicitSend:"):
+                block = {}
+                last_field = None
+                continue
+
+            if block is not None:
+                match = _FIELD_REGEX.match(stripped)
+                if match:
+                    last_field, value = match.groups()
+                    block[last_field] = _TYPE_SUFFIX_REGEX.sub('', value)
+                elif last_field == 'description':
+                    # PTS descriptions span multiple lines
+                    block['description'] += '\n' + line.rstrip('\n')
+
+                if last_field != 'style':
+                    continue
+
+                style = _STYLE_REGEX.search(block['style'])
+                test_case_name = block.get('test_case_name', '').strip()
+                if style and 'wid' in block and test_case_name:
+                    recording = recordings.setdefault(test_case_name, {
+                        'project': block.get('project_name', test_case_name.split('/')[0]),
+                        'verdict': 'PASS',
+                        'wids': [],
+                    })
+                    recording['wids'].append({
+                        'wid': int(block['wid']),
+                        'description': _TYPE_SUFFIX_REGEX.sub('', block.get('description', '')),
+                        'style': int(style.group(1), 16),
+                    })
+                else:
+                    logging.warning(f"Incomplete OnImplicitSend block in {log_file}: {block}")
+
+                block = None
+                continue
+
+            match = _RESPONSE_REGEX.search(stripped)
+            if match:
+                response, wid, test_case_name = match.groups()
+                recording = recordings.get(test_case_name)
+                if recording and recording['wids'] and recording['wids'][-1]['wid'] == int(wid):
+                    recording['wids'][-1]['response'] = response.strip("'\"")
+                continue
+
+            if 'PTS_LOGTYPE_FINAL_VERDICT' in stripped and 'final verdict' in stripped.lower():
+                for test_case_name, recording in recordings.items():
+                    if test_case_name not in stripped:
+                        continue
+                    message = stripped.split(test_case_name, 1)[1]
+                    for verdict in _VERDICTS:
+                        if verdict in message:
+                            recording['verdict'] = verdict
+                            break
+
+
+def load_recordings_from_logs(log_dir):
+    """Builds the replay recordings from the auto-pts client logs
+
+    log_dir -- directory searched recursively for *.log files
+    """
+    recordings = {}
+
+    for log_file in sorted(Path(log_dir).rglob("*.log")):
+        log(f"Processing log file: {log_file}")
+        try:
+            _parse_log_file(log_file, recordings)
+        except OSError as e:
+            logging.warning(f"Failed to read {log_file}: {e}")
+
+    return recordings
+
+
+def load_recordings(file_path):
+    with open(file_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_recordings(recordings, file_path):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(recordings, f, indent=2)
+
+
+class PTSReplay(PTSProxy):
+    """Fake PyPTS replaying recorded WID sequences
+
+    Args:
+        recordings: dict of test case name -> recording, see module docstring
+        wid_timeout: time in seconds the client has to respond to a WID.
+         If exceeded, the test case ends with INCONC like in the real PTS.
+    """
+
+    def __init__(self, recordings, wid_timeout=WID_RESPONSE_TIMEOUT, bd_addr="00:1B:DC:F2:1C:00"):
+        self.info = "PTS replay"
+        self._recordings = recordings
+        self._wid_timeout = wid_timeout
+        self._bd_addr = bd_addr
+        self._callback = None
+        self._response = ResultWithFlag()
+        self._stop = threading.Event()
+        self._run_thread = None
+        self._last_recovery_time = datetime.datetime.now()
+        self.pixits = {}
+        self.pics = {}
+        # (test case, wid, response time in seconds) of the last run
+        self.wid_latencies = []
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+
+        return self._generic
+
+    def _generic(self, *args, **kwargs):
+        return True
+
+    def _dispatch(self, method_name, param_tuple):
+        """Dispatcher that is used by xmlrpc server"""
+        log(f"{method_name}{param_tuple}")
+        method = getattr(self, method_name)
+        return method(*param_tuple)
+
+    def _listMethods(self):
+        return [name for name in dir(self) if not name.startswith('_') and callable(getattr(self, name))]
+
+    def register_client_callback(self, kwargs):
+        if 'xmlrpc_address' in kwargs:
+            uri = f"http://{kwargs['xmlrpc_address']}:{kwargs['xmlrpc_port']}/"
+            self._callback = _ThreadLocalServerProxy(uri)
+        else:
+            self._callback = kwargs['client_callback']
+
+    def unregister_client_callback(self):
+        self._callback = None
+
+    def ready(self):
+        return True
+
+    def _set_result_async(self, method_name, result):
+        def _set_result():
+            if self._callback:
+                self._callback.set_result(method_name, result)
+
+        threading.Thread(target=_set_result, daemon=True,
+                         name=f'PTSReplay-{method_name}').start()
+        return "WAIT"
+
+    def start_pts(self):
+        return self._set_result_async('start_pts', True)
+
+    def restart_pts(self, *args):
+        self._last_recovery_time = datetime.datetime.now()
+        return self._set_result_async('restart_pts', True)
+
+    def recover_pts(self):
+        self._last_recovery_time = datetime.datetime.now()
+        return self._set_result_async('recover_pts', True)
+
+    def get_last_recovery_time(self):
+        return self._last_recovery_time
+
+    def get_version(self):
+        return 0x80000
+
+    def bd_addr(self):
+        return self._bd_addr
+
+    def get_project_list(self):
+        return sorted({recording['project'] for recording in self._recordings.values()})
+
+    def get_project_version(self, project_name):
+        return '1.0'
+
+    def get_test_case_list(self, project_name):
+        return sorted(name for name, recording in self._recordings.items()
+                      if recording['project'] == project_name)
+
+    def get_test_case_description(self, project_name, test_case_name):
+        return f'Replay of {test_case_name}'
+
+    def set_pixit(self, project_name, param_name, param_value):
+        self.pixits[(project_name, param_name)] = param_value
+
+    def update_pixit_param(self, project_name, param_name, new_param_value):
+        self.pixits[(project_name, param_name)] = new_param_value
+
+    def set_pics(self, project_name, entry_name, bool_value):
+        self.pics[(project_name, entry_name)] = bool_value
+
+    def get_system_model(self):
+        return 'Real HW'
+
+    def get_system_version(self):
+        return sys.version
+
+    def get_path(self):
+        return str(Path.cwd())
+
+    def list_workspace_tree(self, workspace_dir):
+        return []
+
+    def pull_workspace_logs(self, workspace_dir, cursor=0.0, max_bytes=None):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w'):
+            pass
+
+        return {'archive': xmlrpc.client.Binary(archive.getvalue()),
+                'pass_xmls': [], 'cursor': time.time(), 'more': False}
+
+    def set_wid_response(self, response):
+        self._response.set(response)
+
+    def stop_test_case(self, project_name, test_case_name):
+        self._stop.set()
+        self._response.set(None)
+
+    def run_test_case(self, project_name, test_case_name):
+        self._stop.clear()
+        self._response.clear()
+        self._run_thread = threading.Thread(target=self._run_test_case_thread,
+                                            args=(project_name, test_case_name),
+                                            name=f'PTSReplay-{test_case_name}', daemon=True)
+        self._run_thread.start()
+        return "WAIT"
+
+    def _run_test_case_thread(self, project_name, test_case_name):
+        try:
+            verdict = self._replay(project_name, test_case_name)
+        except Exception as e:
+            logging.exception(e)
+            verdict = ptstypes.E_FATAL_ERROR
+
+        if verdict in _VERDICTS:
+            self._log_final_verdict(test_case_name, verdict)
+
+        if self._callback:
+            self._callback.set_result('run_test_case', verdict)
+
+    def _replay(self, project_name, test_case_name):
+        recording = self._recordings.get(test_case_name)
+        if recording is None:
+            return ptstypes.E_FATAL_ERROR
+
+        self.wid_latencies = []
+
+        for step in recording['wids']:
+            if self._stop.is_set() or self._callback is None:
+                return 'INCONC'
+
+            wid = step['wid']
+            start = time.monotonic()
+            result = self._callback.on_implicit_send(project_name, wid, test_case_name,
+                                                     step['description'], step['style'])
+
+            if result == "WAIT":
+                try:
+                    result = self._response.get(timeout=self._wid_timeout,
+                                                predicate=lambda: not self._stop.is_set(),
+                                                clear=True)
+                except TimeoutError:
+                    logging.error(f"{test_case_name}: no response to wid {wid} "
+                                  f"within {self._wid_timeout}s")
+                    return 'INCONC'
+
+            latency = time.monotonic() - start
+            self.wid_latencies.append((test_case_name, wid, latency))
+            log(f"{test_case_name}: wid {wid} response {result!r} after {latency:.3f}s")
+
+            if result in ("END_TEST_CASE", None) or self._stop.is_set():
+                return 'INCONC'
+
+            expected = step.get('response')
+            if expected is not None and str(result) != expected:
+                logging.warning(f"{test_case_name}: wid {wid} response {result!r}, "
+                                f"recorded {expected!r}")
+
+        return recording.get('verdict', 'PASS')
+
+    def _log_final_verdict(self, test_case_name, verdict):
+        if not self._callback:
+            return
+
+        log_time = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        self._callback.log(ptstypes.PTS_LOGTYPE_FINAL_VERDICT, 'Final Verdict',
+                           log_time, f'Final Verdict:{verdict}', test_case_name)
+
+
+class _ThreadLocalServerProxy:
+    """Client callback proxy with one XML-RPC connection per calling thread"""
+
+    def __init__(self, uri):
+        self.uri = uri
+        self._local = threading.local()
+
+    def __getattr__(self, item):
+        proxy = getattr(self._local, 'proxy', None)
+        if proxy is None:
+            proxy = xmlrpc.client.ServerProxy(uri=self.uri, allow_none=True)
+            self._local.proxy = proxy
+
+        return getattr(proxy, item)
+
+
+class ReplayArgumentParser(argparse.ArgumentParser):
+    def __init__(self, description):
+        argparse.ArgumentParser.__init__(self, description=description)
+
+        self.add_argument("-S", "--srv_port", type=int, default=SERVER_PORT,
+                          help="Specify the server port number.")
+
+        self.add_argument("--recording", type=str, default=None,
+                          help="JSON file with the recorded WID sequences.")
+
+        self.add_argument("--from-logs", "--from_logs", type=str, default=None,
+                          help="Build the recording from the OnImplicitSend blocks "
+                               "found in the auto-pts client logs in this directory.")
+
+        self.add_argument("--save", type=str, default=None,
+                          help="Save the recording built with --from-logs to a JSON file.")
+
+        self.add_argument("--wid-timeout", "--wid_timeout", type=float, default=WID_RESPONSE_TIMEOUT,
+                          help="Time in seconds the client has to respond to a WID.")
+
+    def parse_args(self, args=None, namespace=None):
+        arg = super().parse_args(args, namespace)
+
+        if not (arg.recording or arg.from_logs):
+            self.error("One of --recording or --from-logs is required")
+
+        return arg
+
+
+def main():
+    args = ReplayArgumentParser("PTS replay server").parse_args()
+
+    logging.basicConfig(level=logging.DEBUG, filename=f'autoptsreplay_{args.srv_port}.log',
+                        filemode='w', encoding='utf-8')
+
+    if args.from_logs:
+        recordings = load_recordings_from_logs(args.from_logs)
+        if args.save:
+            save_recordings(recordings, args.save)
+    else:
+        recordings = load_recordings(args.recording)
+
+    print(f"Loaded {len(recordings)} recorded test cases")
+
+    pts = PTSReplay(recordings, wid_timeout=args.wid_timeout)
+    server = xmlrpc.server.SimpleXMLRPCServer(("", args.srv_port), allow_none=True,
+                                              logRequests=False)
+    server.register_introspection_functions()
+    server.register_instance(pts)
+
+    print(f"Serving on port {args.srv_port} ...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
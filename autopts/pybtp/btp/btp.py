@@ -19,14 +19,14 @@ import logging
 import math
 import re
 import struct
-from collections import namedtuple
+from collections import deque, namedtuple
 
 from autopts.ptsprojects.stack import get_stack, set_get_stack_method
-from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import defs
 from autopts.pybtp.common import CONTROLLER_INDEX, CONTROLLER_INDEX_NONE, reg_unreg_service, supported_svcs_cmds
 from autopts.pybtp.iutctl_common import set_event_handler
-from autopts.pybtp.types import BTPError, BTPFatalError, att_rsp_str
+from autopts.pybtp.supported_cmds_cache import get_supported_cmds_cache
+from autopts.pybtp.types import BTPError, BTPFatalError, att_rsp_str, parse_mmi_description
 
 #  get IUT global method from iutctl
 get_iut = None
@@ -34,6 +34,17 @@ get_iut = None
 # loading as CORE to maintain backward compatibility with older code snippet
 CORE = reg_unreg_service
 
+# Number of the REGISTER_SERVICE commands in flight in core_reg_svcs. The
+# Zephyr tester queues only a couple of commands, the ones above are dropped.
+CORE_REG_PIPELINE_DEPTH = 2
+
+# Names of the services of READ_SUPPORTED_COMMANDS that differ from the
+# registration keys, '' if the service has no such command
+CORE_REG_SVC_NAMES = {
+    'mmdl': 'MESH_MMDL',
+    'ias': '',
+}
+
 # Address
 LeAddress = namedtuple('LeAddress', 'addr_type addr')
 PTS_BD_ADDR = LeAddress(addr_type=0, addr='000000000000')
@@ -64,6 +75,11 @@ def read_supp_svcs():
 
     stack.supported_svcs = int.from_bytes(tuple_data[0], 'little')
 
+    fingerprint = getattr(iutctl, 'image_fingerprint', None)
+    if fingerprint:
+        # The services bitmap is the probe of the cached commands
+        get_supported_cmds_cache().verify(fingerprint, stack.supported_svcs)
+
 
 def read_supported_commands(service):
     iutctl = get_iut()
@@ -90,6 +106,16 @@ def read_supported_commands(service):
         logging.error("Invalid mask for %s: %s", svc_key, err)
         return
 
+    if not isinstance(stack.supported_cmds, dict):
+        stack.supported_cmds = {}
+
+    fingerprint = getattr(iutctl, 'image_fingerprint', None)
+    if fingerprint:
+        cached = get_supported_cmds_cache().get_commands(fingerprint, svc_key)
+        if cached is not None:
+            stack.supported_cmds[svc_key] = cached
+            return
+
     opcode_supp_cmd = entry["supported_commands"]
 
     cmd_tuple = (service_id, opcode_supp_cmd, defs.BTP_INDEX_NONE, "")
@@ -101,10 +127,11 @@ def read_supported_commands(service):
     data_bytes = tuple_data[0] if isinstance(tuple_data, tuple) and tuple_data else tuple_data
     supported_cmds_value = int.from_bytes(data_bytes, 'little')
 
-    if not isinstance(stack.supported_cmds, dict):
-        stack.supported_cmds = {}
     stack.supported_cmds[svc_key] = supported_cmds_value
 
+    if fingerprint:
+        get_supported_cmds_cache().set_commands(fingerprint, svc_key, supported_cmds_value)
+
 
 def core_reg_svc_univ(service_key: str, service_name: str):
     """
@@ -124,6 +151,91 @@ def core_reg_svc_univ(service_key: str, service_name: str):
         return
 
     core_reg_svc_rsp_succ(service_name)
+    _registered_svcs_update(service_key.removesuffix('_reg'), True)
+
+
+def _registered_svcs():
+    """Returns the keys of the services registered in the IUT, an empty
+    set if the stack does not track them."""
+    core = getattr(get_stack(), 'core', None)
+    if core is None:
+        return set()
+
+    return core.registered_svcs
+
+
+def _registered_svcs_update(svc, registered):
+    core = getattr(get_stack(), 'core', None)
+    if core is None:
+        return
+
+    if registered:
+        core.registered_svcs.add(svc)
+    else:
+        core.registered_svcs.discard(svc)
+
+
+def core_reg_svcs(*svcs):
+    """Registers the set of BTP services, by the keys of their
+    core_reg_svc_* functions, e.g. core_reg_svcs('pacs', 'ascs', 'bap').
+
+    The services already registered in the IUT are skipped. The others are
+    registered in the given order, with up to CORE_REG_PIPELINE_DEPTH
+    REGISTER_SERVICE commands in flight, and then their supported commands
+    are read.
+    """
+    logging.debug("core_reg_svcs: %r", svcs)
+    iutctl = get_iut()
+
+    registered = _registered_svcs()
+    pending = [svc for svc in dict.fromkeys(svcs) if svc not in registered]
+    for svc in pending:
+        if f'{svc}_reg' not in CORE:
+            raise BTPError(f"CORE key {svc}_reg not found")
+
+    in_flight = deque()
+    failed = None
+    for svc in pending:
+        if len(in_flight) == CORE_REG_PIPELINE_DEPTH:
+            failed = _core_reg_svcs_rsp(in_flight.popleft(), failed)
+            if failed:
+                break
+
+        iutctl.btp_socket.send(*CORE[f'{svc}_reg'])
+        in_flight.append(svc)
+
+    # Keep the responses in sync with the commands, even after a failure
+    while in_flight:
+        failed = _core_reg_svcs_rsp(in_flight.popleft(), failed)
+
+    if failed == 'gap':
+        raise BTPFatalError("Failed to register BTP GAP service in the IUT")
+
+    if failed:
+        raise BTPError(f"Failed to register BTP {failed} service in the IUT")
+
+    for svc in pending:
+        service_name = CORE_REG_SVC_NAMES.get(svc, svc.upper())
+        if not service_name:
+            continue
+
+        try:
+            read_supported_commands(service_name)
+        except Exception as e:
+            logging.warning("No read supported commands for %s: %s", service_name, e)
+
+
+def _core_reg_svcs_rsp(svc, failed):
+    """Reads the response to the registration of the service, returns
+    the first service failed to register."""
+    try:
+        core_reg_svc_rsp_check()
+    except BTPError:
+        return failed or svc
+
+    _registered_svcs_update(svc, True)
+
+    return failed
 
 
 def clear_verify_values():
@@ -279,9 +391,7 @@ def verify_multiple_read_description(description):
     """
     logging.debug("description=%r", description)
 
-    MMI.reset()
-    MMI.parse_description(description)
-    description_values = MMI.args
+    description_values = parse_mmi_description(description).args
     logging.debug("Description values: %r", description_values)
 
     got_mtp_read = [''.join(description_values)]
@@ -450,6 +560,7 @@ def core_unreg_svc_gap():
     iutctl.btp_socket.send(*CORE['gap_unreg'])
 
     core_unreg_svc_rsp_succ()
+    _registered_svcs_update('gap', False)
 
 
 def core_reg_svc_gatt():
@@ -461,6 +572,7 @@ def core_unreg_svc_gatt():
 
     iutctl = get_iut()
     iutctl.btp_socket.send_wait_rsp(*CORE['gatt_unreg'])
+    _registered_svcs_update('gatt', False)
 
 
 def core_reg_svc_l2cap():
@@ -472,6 +584,7 @@ def core_unreg_svc_l2cap():
 
     iutctl = get_iut()
     iutctl.btp_socket.send_wait_rsp(*CORE['l2cap_unreg'])
+    _registered_svcs_update('l2cap', False)
 
 
 def core_reg_svc_mesh():
@@ -483,6 +596,7 @@ def core_unreg_svc_mesh():
 
     iutctl = get_iut()
     iutctl.btp_socket.send_wait_rsp(*CORE['mesh_unreg'])
+    _registered_svcs_update('mesh', False)
 
 
 def core_reg_svc_mmdl():
@@ -494,6 +608,7 @@ def core_unreg_svc_mmdl():
 
     iutctl = get_iut()
     iutctl.btp_socket.send_wait_rsp(*CORE['mmdl_unreg'])
+    _registered_svcs_update('mmdl', False)
 
 
 def core_reg_svc_gatt_cl():
@@ -505,6 +620,7 @@ def core_unreg_svc_gatt_cl():
 
     iutctl = get_iut()
     iutctl.btp_socket.send_wait_rsp(*CORE['gatt_cl_unreg'])
+    _registered_svcs_update('gatt_cl', False)
 
 
 def core_reg_svc_vcs():
@@ -614,7 +730,7 @@ def core_reg_svc_vendor():
     core_reg_svc_univ("vendor_reg", "VENDOR")
 
 
-def core_reg_svc_rsp_succ(service_name):
+def core_reg_svc_rsp_check():
     logging.debug("")
     iutctl = get_iut()
 
@@ -633,6 +749,11 @@ def core_reg_svc_rsp_succ(service_name):
         logging.error("frames mismatch")
         raise BTPError("Unexpected response received!")
     logging.debug("response is valid")
+
+
+def core_reg_svc_rsp_succ(service_name):
+    core_reg_svc_rsp_check()
+
     service_name = service_name.strip()
     if service_name:
         logging.debug("Reading supported commands for service: %s", service_name)
@@ -17,7 +17,7 @@
 import logging
 import struct
 from enum import IntEnum, IntFlag
-from threading import Event, Timer
+from threading import Event
 from time import sleep
 
 from autopts.ptsprojects.stack import get_stack
@@ -25,6 +25,7 @@ from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import CONTROLLER_INDEX, btp_hdr_check, pts_addr_get, pts_addr_type_get
 from autopts.pybtp.btp.btp import get_iut_method as get_iut
 from autopts.pybtp.types import BTPError, addr_str_to_le_bytes, le_bytes_to_hex_str
+from autopts.utils import call_later
 
 CCP = {
     'read_supported_cmds': (defs.BTP_SERVICE_ID_CCP,
@@ -424,8 +425,7 @@ def ccp_await_event(ccp, event, timeout):
     flag.set()
 
     initial = ccp.events[event]['count']
-    timer = Timer(timeout / 1000.0, ccp_timeout, [flag])
-    timer.start()
+    timer = call_later(timeout / 1000.0, ccp_timeout, flag)
 
     while flag.is_set():
         if ccp.events[event]['count'] > initial:
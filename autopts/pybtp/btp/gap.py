@@ -206,6 +206,14 @@ def gap_device_found_ev_(gap, data, data_len):
                                               eir))
 
 
+def _invalidate_gatt_values(reason):
+    # The ATT responses of the cached attribute values depend on the
+    # security level of the link
+    stack = get_stack()
+    if stack.gatt:
+        stack.gatt.server_snapshot.invalidate_values(reason)
+
+
 def gap_connected_ev_(gap, data, data_len):
     logging.debug("%r", data)
 
@@ -218,6 +226,8 @@ def gap_connected_ev_(gap, data, data_len):
 
     gap.set_conn_params(ConnParams(itvl, itvl, latency, timeout))
 
+    _invalidate_gatt_values(f'{addr} connected')
+
 
 def gap_disconnected_ev_(gap, data, data_len):
     logging.debug("%r", data)
@@ -228,6 +238,8 @@ def gap_disconnected_ev_(gap, data, data_len):
 
     gap.remove_connection(addr)
 
+    _invalidate_gatt_values(f'{addr} disconnected')
+
 
 def gap_passkey_disp_ev_(gap, data, data_len):
     logging.debug("%r", data)
@@ -305,6 +317,8 @@ def gap_sec_level_changed_ev_(gap, data, data_len):
 
     gap.set_connection_sec_level(_addr, _level)
 
+    _invalidate_gatt_values(f'{_addr} security level changed to {_level}')
+
     logging.debug("received %r", (_addr_t, _addr, _level))
 
 
@@ -623,6 +637,25 @@ def gap_wait_for_disconnection(timeout=30):
     stack.gap.wait_for_disconnection(timeout)
 
 
+def gap_wait_for_discovery(timeout=10, condition=None, **kwargs):
+    """Waits for the ongoing discovery to find the device.
+
+    Arguments:
+    timeout -- upper bound of the wait in seconds.
+    condition -- callable checking the found devices, by default
+                 check_discovery_results called with kwargs.
+
+    Returns True if the condition was met before the timeout.
+    """
+    if condition is None:
+        def condition():
+            return check_discovery_results(**kwargs)
+
+    stack = get_stack()
+
+    return stack.gap.wait_for_found_devices(timeout, condition)
+
+
 def gap_wait_for_pairing_fail(timeout=30):
     stack = get_stack()
 
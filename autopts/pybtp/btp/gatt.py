@@ -19,7 +19,7 @@ import binascii
 import logging
 import struct
 
-from autopts.ptsprojects.stack import GattCharacteristic, GattCharacteristicDescriptor, GattService
+from autopts.ptsprojects.stack import GattCharacteristic, GattCharacteristicDescriptor, GattService, get_stack
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import (
     CONTROLLER_INDEX,
@@ -121,6 +121,7 @@ def gatt_attr_value_changed_ev_(gatt, data, data_len):
     logging.debug("%r %r",
                   handle, value)
 
+    gatt.server_snapshot.invalidate_values(f'attribute {handle:#06x} value changed')
     gatt.attr_value_set(handle, binascii.hexlify(value[0]))
     gatt.attr_value_set_changed(handle)
 
@@ -133,6 +134,26 @@ def gatt_notification_ev_(gatt, data, data_len):
     gatt.notification_ev_recv(addr_type, addr, notification_type, handle, value)
 
 
+def gatts_server_snapshot():
+    """Returns the IUT GATT server snapshot of the running test case"""
+    stack = get_stack()
+    if stack.gatt is None:
+        return None
+
+    return stack.gatt.server_snapshot
+
+
+def _gatts_snapshot_invalidate(reason, values_only=False):
+    snapshot = gatts_server_snapshot()
+    if snapshot is None:
+        return
+
+    if values_only:
+        snapshot.invalidate_values(reason)
+    else:
+        snapshot.invalidate(reason)
+
+
 GATT_EV = {
     defs.BTP_GATT_EV_ATTR_VALUE_CHANGED: gatt_attr_value_changed_ev_,
     defs.BTP_GATT_EV_NOTIFICATION: gatt_notification_ev_,
@@ -151,6 +172,7 @@ def gatts_add_svc(svc_type, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
+    _gatts_snapshot_invalidate('add_svc')
     iutctl.btp_socket.send(*GATTS['add_svc'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -168,6 +190,7 @@ def gatts_add_inc_svc(hdl):
     hdl_ba = struct.pack('H', hdl)
     data_ba.extend(hdl_ba)
 
+    _gatts_snapshot_invalidate('add_inc_svc')
     iutctl.btp_socket.send(*GATTS['add_inc_svc'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -200,6 +223,7 @@ def gatts_add_char(hdl, prop, perm, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
+    _gatts_snapshot_invalidate('add_char')
     iutctl.btp_socket.send(*GATTS['add_char'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -227,6 +251,7 @@ def gatts_set_val(hdl, val):
     data_ba.extend(val_len_ba)
     data_ba.extend(val_ba)
 
+    _gatts_snapshot_invalidate('set_val', values_only=True)
     iutctl.btp_socket.send(*GATTS['set_val'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -254,6 +279,7 @@ def gatts_add_desc(hdl, perm, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
+    _gatts_snapshot_invalidate('add_desc')
     iutctl.btp_socket.send(*GATTS['add_desc'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -277,6 +303,7 @@ def gatts_change_database(start_hdl, end_hdl, vis):
     data_ba.extend(end_hdl_ba)
     data_ba.extend(chr(vis).encode('utf-8'))
 
+    _gatts_snapshot_invalidate('change_database')
     iutctl.btp_socket.send(*GATTS['change_database'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -306,6 +333,7 @@ def gatts_start_server():
     logging.debug("")
 
     iutctl = get_iut()
+    _gatts_snapshot_invalidate('start_server')
     iutctl.btp_socket.send(*GATTS['start_server'])
 
     gatt_command_rsp_succ()
@@ -347,6 +375,7 @@ def remove_handle_from_db(hdl):
     hdl_ba = struct.pack('H', hdl)
     data_ba.extend(hdl_ba)
 
+    _gatts_snapshot_invalidate('remove_handle_from_db')
     iutctl.btp_socket.send(*GATTS['remove_handle_from_db'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -425,35 +454,42 @@ def gatts_attr_value_changed_ev():
 
 
 def dec_gatts_get_attrs_rp(data, data_len):
-    logging.debug("%r %r", data, data_len)
+    """Decodes Get Attributes Response data.
 
-    hdr = '<B'
-    hdr_len = struct.calcsize(hdr)
-    data_len = data_len - hdr_len
+    BTP Get Attributes Response frame format
+    0                  8
+    +------------------+------------+
+    | Attributes Count | Attributes |
+    +------------------+------------+
 
-    (attr_count, attrs) = struct.unpack(hdr + f"{data_len}s", data)
+    BTP Single Attribute
+    0        16           24               32
+    +--------+------------+------------------+-----------+
+    | Handle | Permission | Type UUID Length | Type UUID |
+    +--------+------------+------------------+-----------+
 
-    attributes = []
+    """
+    logging.debug("%r %r", data, data_len)
 
-    while (attr_count - 1) >= 0:
-        hdr = '<HBB'
-        hdr_len = struct.calcsize(hdr)
-        data_len = data_len - hdr_len
+    data = memoryview(data)[:data_len]
 
-        (handle, permission, type_uuid_len, frag) = struct.unpack(hdr + f"{data_len}s", attrs)
+    (attr_count,) = struct.unpack_from('<B', data)
+    offset = 1
 
-        data_len = data_len - type_uuid_len
+    hdr = struct.Struct('<HBB')
+    attributes = []
 
-        (type_uuid, attrs) = struct.unpack(f"{type_uuid_len}s{data_len}s", frag)
+    for _i in range(attr_count):
+        handle, permission, type_uuid_len = hdr.unpack_from(data, offset)
+        offset += hdr.size
 
+        (type_uuid,) = struct.unpack_from(f"{type_uuid_len}s", data, offset)
         type_uuid = le_bytes_to_uuid(type_uuid, type_uuid_len)
+        offset += type_uuid_len
 
         attributes.append((handle, permission, type_uuid))
 
-        attr_count = attr_count - 1
-
-        logging.debug("handle %r perm %r type_uuid %r", handle, permission,
-                      type_uuid)
+    logging.debug("attributes (handle, perm, type_uuid) %r", attributes)
 
     return attributes
 
@@ -478,6 +514,13 @@ def gatts_get_attrs(start_handle=0x0001, end_handle=0xffff, type_uuid=None):
     end_hdl_ba = struct.pack('H', end_handle)
     data_ba.extend(end_hdl_ba)
 
+    snapshot = gatts_server_snapshot()
+    snapshot_key = (start_handle, end_handle, str(type_uuid).upper() if type_uuid else None)
+    if snapshot is not None:
+        attrs = snapshot.get_attrs(snapshot_key)
+        if attrs is not None:
+            return list(attrs)
+
     if type_uuid:
         uuid_ba = uuid_to_le_bytes(type_uuid)
         data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
@@ -493,7 +536,31 @@ def gatts_get_attrs(start_handle=0x0001, end_handle=0xffff, type_uuid=None):
     btp_hdr_check(tuple_hdr, defs.BTP_SERVICE_ID_GATT,
                   defs.BTP_GATT_CMD_GET_ATTRIBUTES)
 
-    return dec_gatts_get_attrs_rp(tuple_data[0], tuple_hdr.data_len)
+    attrs = dec_gatts_get_attrs_rp(tuple_data[0], tuple_hdr.data_len)
+    if snapshot is not None:
+        snapshot.set_attrs(snapshot_key, tuple(attrs))
+
+    return attrs
+
+
+def dec_gatts_get_attr_val(data, data_len):
+    """Decodes Get Attribute Value Response data.
+
+    BTP Get Attribute Value Response frame format
+    0              8              24
+    +--------------+--------------+-------+
+    | ATT Response | Value Length | Value |
+    +--------------+--------------+-------+
+
+    Returns (ATT Response, Value Length, Value) where Value holds all
+    the remaining bytes of the frame.
+    """
+    hdr = '<BH'
+    hdr_len = struct.calcsize(hdr)
+
+    att_rsp, val_len = struct.unpack_from(hdr, data)
+
+    return att_rsp, val_len, bytes(memoryview(data)[hdr_len:data_len])
 
 
 def gatts_get_attr_val(bd_addr_type, bd_addr, handle):
@@ -509,6 +576,13 @@ def gatts_get_attr_val(bd_addr_type, bd_addr, handle):
 
     hdl_ba = struct.pack('H', handle)
 
+    snapshot = gatts_server_snapshot()
+    snapshot_key = (bd_addr_type, bd_addr, handle)
+    if snapshot is not None:
+        attr_val = snapshot.get_attr_val(snapshot_key)
+        if attr_val is not None:
+            return attr_val
+
     data_ba.extend(chr(bd_addr_type).encode('utf-8'))
     data_ba.extend(bd_addr_ba)
     data_ba.extend(hdl_ba)
@@ -521,11 +595,11 @@ def gatts_get_attr_val(bd_addr_type, bd_addr, handle):
     btp_hdr_check(tuple_hdr, defs.BTP_SERVICE_ID_GATT,
                   defs.BTP_GATT_CMD_GET_ATTRIBUTE_VALUE)
 
-    hdr = '<BH'
-    hdr_len = struct.calcsize(hdr)
-    data_len = tuple_hdr.data_len - hdr_len
+    attr_val = dec_gatts_get_attr_val(tuple_data[0], tuple_hdr.data_len)
+    if snapshot is not None:
+        snapshot.set_attr_val(snapshot_key, attr_val)
 
-    return struct.unpack(hdr + f"{data_len}s", tuple_data[0])
+    return attr_val
 
 
 def gattc_exchange_mtu(bd_addr_type, bd_addr):
@@ -1197,7 +1271,7 @@ def gatt_command_rsp_succ():
     btp_hdr_check(tuple_hdr, defs.BTP_SERVICE_ID_GATT)
 
 
-def gatt_dec_svc_attr(data):
+def gatt_dec_svc_attr(data, offset=0):
     """Decodes Service Attribute data from Discovery Response data.
 
     BTP Single Service Attribute
@@ -1210,14 +1284,14 @@ def gatt_dec_svc_attr(data):
     hdr = '<HHB'
     hdr_len = struct.calcsize(hdr)
 
-    start_hdl, end_hdl, uuid_len = struct.unpack_from(hdr, data)
-    (uuid,) = struct.unpack_from(f"{uuid_len}s", data, hdr_len)
+    start_hdl, end_hdl, uuid_len = struct.unpack_from(hdr, data, offset)
+    (uuid,) = struct.unpack_from(f"{uuid_len}s", data, offset + hdr_len)
     uuid = le_bytes_to_uuid(uuid, uuid_len)
 
     return (start_hdl, end_hdl, uuid), hdr_len + uuid_len
 
 
-def gatt_dec_incl_attr(data):
+def gatt_dec_incl_attr(data, offset=0):
     """Decodes Included Service Attribute data from Discovery Response data.
 
     BTP Single Included Service Attribute
@@ -1230,13 +1304,13 @@ def gatt_dec_incl_attr(data):
     hdr = '<H'
     hdr_len = struct.calcsize(hdr)
 
-    incl_hdl = struct.unpack_from(hdr, data)
-    svc, svc_len = gatt_dec_svc_attr(data[hdr_len:])
+    incl_hdl = struct.unpack_from(hdr, data, offset)
+    svc, svc_len = gatt_dec_svc_attr(data, offset + hdr_len)
 
     return (incl_hdl, svc), hdr_len + svc_len
 
 
-def gatt_dec_chrc_attr(data):
+def gatt_dec_chrc_attr(data, offset=0):
     """Decodes Characteristic Attribute data from Discovery Response data.
 
     BTP Single Characteristic Attribute
@@ -1249,14 +1323,14 @@ def gatt_dec_chrc_attr(data):
     hdr = '<HHBB'
     hdr_len = struct.calcsize(hdr)
 
-    chrc_hdl, val_hdl, props, uuid_len = struct.unpack_from(hdr, data)
-    (uuid,) = struct.unpack_from(f"{uuid_len}s", data, hdr_len)
+    chrc_hdl, val_hdl, props, uuid_len = struct.unpack_from(hdr, data, offset)
+    (uuid,) = struct.unpack_from(f"{uuid_len}s", data, offset + hdr_len)
     uuid = le_bytes_to_uuid(uuid, uuid_len)
 
     return (chrc_hdl, val_hdl, props, uuid), hdr_len + uuid_len
 
 
-def gatt_dec_desc_attr(data):
+def gatt_dec_desc_attr(data, offset=0):
     """Decodes Descriptor Attribute data from Discovery Response data.
 
     BTP Single Descriptor Attribute
@@ -1269,13 +1343,20 @@ def gatt_dec_desc_attr(data):
     hdr = '<HB'
     hdr_len = struct.calcsize(hdr)
 
-    hdl, uuid_len = struct.unpack_from(hdr, data)
-    (uuid,) = struct.unpack_from(f"{uuid_len}s", data, hdr_len)
+    hdl, uuid_len = struct.unpack_from(hdr, data, offset)
+    (uuid,) = struct.unpack_from(f"{uuid_len}s", data, offset + hdr_len)
     uuid = le_bytes_to_uuid(uuid, uuid_len)
 
     return (hdl, uuid), hdr_len + uuid_len
 
 
+_GATT_DISC_ATTR_DECODERS = {
+    "service": gatt_dec_svc_attr,
+    "include": gatt_dec_incl_attr,
+    "characteristic": gatt_dec_chrc_attr,
+}
+
+
 def gatt_dec_disc_rsp(data, attr_type):
     """Decodes Discovery Response data.
 
@@ -1286,24 +1367,17 @@ def gatt_dec_disc_rsp(data, attr_type):
     +------------------+------------+
 
     """
-    attrs_len = len(data) - 1
-    attr_cnt, attrs = struct.unpack(f"B{attrs_len}s", data)
+    data = memoryview(data)
+    (attr_cnt,) = struct.unpack_from('<B', data)
 
+    dec_attr = _GATT_DISC_ATTR_DECODERS.get(attr_type, gatt_dec_desc_attr)  # default: descriptor
     attrs_list = []
-    offset = 0
+    offset = 1
 
     # TODO: Use types instead of tuples
 
     for _x in range(attr_cnt):
-        if attr_type == "service":
-            attr, attr_len = gatt_dec_svc_attr(attrs[offset:])
-        elif attr_type == "include":
-            attr, attr_len = gatt_dec_incl_attr(attrs[offset:])
-        elif attr_type == "characteristic":
-            attr, attr_len = gatt_dec_chrc_attr(attrs[offset:])
-        else:  # descriptor
-            attr, attr_len = gatt_dec_desc_attr(attrs[offset:])
-
+        attr, attr_len = dec_attr(data, offset)
         attrs_list.append(attr)
         offset += attr_len
 
@@ -1324,7 +1398,10 @@ def gatt_dec_read_rsp(data):
     hdr_len = struct.calcsize(hdr)
 
     att_rsp, val_len = struct.unpack_from(hdr, data)
-    val = struct.unpack_from(f"{val_len}s", data, hdr_len)
+    if len(data) < hdr_len + val_len:
+        raise BTPError("Invalid data length")
+
+    val = (bytes(memoryview(data)[hdr_len:hdr_len + val_len]),)
 
     return att_rsp, val
 
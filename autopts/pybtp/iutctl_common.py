@@ -21,15 +21,18 @@ import re
 import socket
 import sys
 import threading
+import time
 from abc import abstractmethod
+from collections import deque
 from datetime import datetime
+from typing import NamedTuple
 
 import serial
 
 from autopts.pybtp import defs
 from autopts.pybtp.parser import HDR_LEN, dec_data, dec_hdr, enc_frame, repr_hdr
 from autopts.pybtp.types import BTPError
-from autopts.utils import get_global_end, raise_on_global_end
+from autopts.utils import get_global_end, raise_on_cancel, raise_on_global_end, wake_on_cancel
 
 log = logging.debug
 
@@ -38,6 +41,15 @@ BTP_ADDRESS = "/tmp/bt-stack-tester"
 
 EVENT_HANDLER = None
 
+FATAL_ERROR_HANDLER = None
+
+# Statuses of the test cases ended by an IutWatcher
+IUT_FATAL_ERROR = 'IUT FATAL ERROR'
+BTP_SOCKET_CLOSED = 'BTP SOCKET CLOSED'
+
+# Regular expressions of the IUT log lines that end the test case
+DEFAULT_FATAL_LOG_PATTERNS = ['ASSERTION', 'FATAL ERROR', 'Assert @ 0x']
+
 
 def set_event_handler(event_handler):
     """This is required by BTPWorker to drive stack"""
@@ -46,6 +58,101 @@ def set_event_handler(event_handler):
     EVENT_HANDLER = event_handler
 
 
+def set_fatal_error_handler(fatal_error_handler):
+    """The handler is called with FatalError reported by an IutWatcher"""
+    global FATAL_ERROR_HANDLER
+
+    FATAL_ERROR_HANDLER = fatal_error_handler
+
+
+class FatalError(NamedTuple):
+    status: str
+    reason: str
+    # The log lines around the reason
+    context: list
+
+
+class IutWatcher:
+    """Watches the IUT logs, streamed line by line, and the BTP socket
+    for fatal errors.
+
+    Only the first fatal error reported while armed, i.e. during a test
+    case, is passed to the FATAL_ERROR_HANDLER.
+    """
+
+    def __init__(self, patterns=None, context_lines=20):
+        self.regex = re.compile('|'.join(f'(?:{p})' for p in patterns)) if patterns else None
+        self.context_lines = context_lines
+        self.fatal = None
+        self._armed = False
+        self._lock = threading.Lock()
+        self._context = deque(maxlen=context_lines)
+        # {source: the last line not terminated yet}
+        self._partial = {}
+        self._lines_after = 0
+
+    def arm(self):
+        with self._lock:
+            self._context.clear()
+            self._partial.clear()
+            self._lines_after = 0
+            self.fatal = None
+            self._armed = True
+
+    def disarm(self):
+        with self._lock:
+            self._armed = False
+
+    def feed(self, source, data):
+        """Matches the complete lines of the data read from the source
+        against the fatal patterns."""
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8', errors='replace')
+
+        fatal = None
+        with self._lock:
+            lines = (self._partial.pop(source, '') + data).split('\n')
+            if lines[-1]:
+                self._partial[source] = lines[-1]
+
+            for line in lines[:-1]:
+                line = line.rstrip('\r')
+
+                if self.fatal:
+                    # Lines following the fatal error, e.g. a backtrace
+                    if self._lines_after < self.context_lines:
+                        self.fatal.context.append(line)
+                        self._lines_after += 1
+                    continue
+
+                self._context.append(line)
+                if self._armed and self.regex and self.regex.search(line):
+                    fatal = self._set_fatal(IUT_FATAL_ERROR, line.strip())
+
+        if fatal:
+            self._notify(fatal)
+
+    def report(self, status, reason):
+        with self._lock:
+            if not self._armed or self.fatal:
+                return
+
+            fatal = self._set_fatal(status, reason)
+
+        self._notify(fatal)
+
+    def _set_fatal(self, status, reason):
+        self.fatal = FatalError(status, reason, list(self._context))
+        return self.fatal
+
+    @staticmethod
+    def _notify(fatal):
+        logging.error(f'{fatal.status}: {fatal.reason}')
+
+        if FATAL_ERROR_HANDLER:
+            FATAL_ERROR_HANDLER(fatal)
+
+
 class BTPSocket:
 
     def __init__(self, log_dir=None, log_file="autopts-iutctl.log"):
@@ -280,12 +387,17 @@ class BTPSocketCli(BTPSocket):
             self.addr = None
 
 
+# Put on the RX queue to wake up the reader of a cancelled test case
+_WAKE_UP = object()
+
+
 class BTPWorker:
-    def __init__(self, sock, iut_name=None):
+    def __init__(self, sock, iut_name=None, watcher=None):
         super().__init__()
 
         self._socket = sock
         self._iut_name = iut_name
+        self._watcher = watcher
         self._rx_queue = queue.Queue()
         self._running = threading.Event()
         self._lock = threading.Lock()
@@ -326,38 +438,42 @@ class BTPWorker:
                 if socket_ok:
                     socket_ok = False
                     log("socket.error: BTPSocket is closed")
+                    if self._watcher:
+                        self._watcher.report(BTP_SOCKET_CLOSED, 'BTP socket closed by the IUT')
             except Exception as e:
                 logging.error("%r", e)
 
         log(f'{threading.current_thread().name} finishing...')
 
-    @staticmethod
-    def _read_timeout(flag):
-        flag.clear()
+    def _wake_up_reader(self):
+        self._rx_queue.put(_WAKE_UP)
 
     def read(self, timeout=20.0):
         logging.debug("")
 
-        flag = threading.Event()
-        flag.set()
+        deadline = time.monotonic() + timeout
 
-        t = threading.Timer(timeout, self._read_timeout, [flag])
-        t.start()
+        with wake_on_cancel(self._wake_up_reader):
+            while True:
+                raise_on_global_end()
+                raise_on_cancel()
 
-        while flag.is_set():
-            raise_on_global_end()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
 
-            if self._rx_queue.empty():
-                continue
+                try:
+                    # Wake up every second to check the global end
+                    data = self._rx_queue.get(timeout=min(remaining, 1))
+                except queue.Empty:
+                    continue
 
-            t.cancel()
+                self._rx_queue.task_done()
 
-            data = self._rx_queue.get()
-            self._rx_queue.task_done()
+                if data is _WAKE_UP:
+                    continue
 
-            return data
-
-        raise TimeoutError
+                return data
 
     def send(self, svc_id, op, ctrl_index, data):
         self._lock.acquire()
@@ -426,7 +542,8 @@ class BTPWorker:
 
 class LoggerWorker:
 
-    def __init__(self, com, baud, log_dir):
+    def __init__(self, com, baud, log_dir, watcher=None):
+        self._watcher = watcher
         self._running = threading.Event()
         self._rx_worker = threading.Thread(target=self._rx_task)
         self._rx_worker.name = f'LoggerWorker{self._rx_worker.name}'
@@ -443,6 +560,9 @@ class LoggerWorker:
             text = data.decode('utf-8', errors='replace')
             self._log_file.write(text)
 
+            if self._watcher:
+                self._watcher.feed('net', text)
+
         log(f'{threading.current_thread().name} finishing...')
 
     def start(self):
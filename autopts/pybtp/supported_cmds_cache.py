@@ -0,0 +1,170 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Cache of the services and commands supported by the IUT images.
+
+The bitmaps of READ_SUPPORTED_SERVICES and READ_SUPPORTED_COMMANDS are
+kept on disk per image fingerprint, so the same image does not have to
+report the commands of its services at every start. The services bitmap
+is read at every start anyway and verifies the cached entry.
+
+The cache file is kept next to the test case database, which outlives
+the test runs. The temporary directory is moved away by the bot at every
+fresh run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from autopts.ptsprojects.testcase_db import DATABASE_FILE
+
+log = logging.debug
+
+# Number of the most recently used images kept in the cache
+MAX_IMAGES = 16
+
+CACHE_FILE_NAME = 'supported_cmds_cache.json'
+
+# {(path, size, mtime): fingerprint} of the images hashed by this process
+_fingerprints = {}
+
+
+def image_fingerprint(path):
+    """Returns the SHA-1 of the image file, None if there is no such file.
+    The image is hashed again only if its size or mtime has changed."""
+    if not path:
+        return None
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    fingerprint = _fingerprints.get(key)
+    if fingerprint is None:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+
+        fingerprint = sha1.hexdigest()
+        _fingerprints[key] = fingerprint
+
+    return fingerprint
+
+
+class SupportedCmdsCache:
+    """{image fingerprint: {'services': bitmap, 'commands': {service: bitmap}}}"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._images = None
+
+    def _load(self):
+        if self._images is not None:
+            return
+
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self._images = json.load(f)
+        except (OSError, ValueError) as e:
+            log(f'Supported commands cache not loaded: {e}')
+            self._images = {}
+
+    def _save(self):
+        tmp_path = f'{self.path}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._images, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f'Supported commands cache not saved: {e}')
+
+    def verify(self, fingerprint, services):
+        """Drops the cached commands of the image if it reports other
+        services than cached, e.g. a fingerprint collision. The image
+        becomes the most recently used one."""
+        with self._lock:
+            self._load()
+            most_recent = next(reversed(self._images), None)
+            image = self._images.pop(fingerprint, None)
+            if image is not None and image['services'] == services:
+                self._images[fingerprint] = image
+                if fingerprint != most_recent:
+                    self._save()
+                return
+
+            if image is not None:
+                log(f'Supported services of {fingerprint} changed, refetching the commands')
+
+            self._images[fingerprint] = {'services': services, 'commands': {}}
+
+            # The least recently used images first
+            for old in list(self._images)[:-MAX_IMAGES]:
+                del self._images[old]
+
+            self._save()
+
+    def get_commands(self, fingerprint, service):
+        with self._lock:
+            self._load()
+            image = self._images.get(fingerprint)
+            if image is None:
+                return None
+
+            return image['commands'].get(service)
+
+    def set_commands(self, fingerprint, service, commands):
+        with self._lock:
+            self._load()
+            image = self._images.get(fingerprint)
+            if image is None or image['commands'].get(service) == commands:
+                return
+
+            image['commands'][service] = commands
+            self._save()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache_file(database_file=DATABASE_FILE):
+    """Returns the path of the cache file of the test case database"""
+    return os.path.join(os.path.dirname(database_file), CACHE_FILE_NAME)
+
+
+def set_supported_cmds_cache_file(path):
+    global _cache
+
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            _cache = SupportedCmdsCache(path)
+
+
+def get_supported_cmds_cache():
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = SupportedCmdsCache(get_cache_file())
+
+    return _cache
@@ -14,6 +14,8 @@
 #
 
 import binascii
+import functools
+import re
 import struct
 from enum import IntEnum, IntFlag
 from typing import Final, NamedTuple
@@ -487,11 +489,34 @@ class L2CAPConnectionResponse:
     insufficient_secure_authentication = 5
 
 
+# Arguments in MMI description are enclosed in single quotes
+MMI_ARG_PATTERN = re.compile(r"(?:'|=\s+)([0-9-xA-Fa-f]+)")
+
+
+class ParsedMmi(NamedTuple):
+    args: tuple[str, ...]
+
+
+@functools.lru_cache(maxsize=512)
+def parse_mmi_description(description):
+    """Parses PTS MMI description text for argument values.
+
+    The result is immutable and cached by the description text, so
+    it can be shared by concurrently handled MMIs.
+    """
+    return ParsedMmi(tuple(MMI_ARG_PATTERN.findall(description)))
+
+
 class WIDParams(NamedTuple):
     wid: int
     description: str
     test_case_name: str
 
+    @property
+    def mmi(self):
+        """Arguments parsed from the description"""
+        return parse_mmi_description(self.description)
+
 
 att_rsp_str = {0: "",
                1: "Invalid handle error",
@@ -251,10 +251,11 @@ class BTMON:
 
 
 class RTTLogger:
-    def __init__(self, syncto=0):
+    def __init__(self, syncto=0, watcher=None):
         self.rtt_reader = RTT()
         self.log_file = None
         self.syncto = syncto
+        self.watcher = watcher
 
     def _on_line_read_callback(self, data, user_data):
         file, = user_data
@@ -264,6 +265,9 @@ class RTTLogger:
         except UnicodeDecodeError:
             pass
 
+        if self.watcher:
+            self.watcher.feed('rtt', data)
+
     def is_running(self):
         return not self.rtt_reader.stop_thread.is_set()
 
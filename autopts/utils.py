@@ -17,14 +17,20 @@
 """Utilities"""
 import csv
 import ctypes
+import heapq
+import io
+import itertools
 import logging
 import os
 import re
 import sys
 import threading
+import time
 import traceback
 import xmlrpc.client
+import zipfile
 from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
 from time import sleep
 
@@ -34,6 +40,8 @@ import psutil
 from autopts.config import FILE_PATHS
 
 PTS_WORKSPACE_FILE_EXT = ".pqw6"
+# Workspace files that are pulled from the autoptsserver, but never deleted
+PTS_WORKSPACE_KEEP_FILE_EXTS = ('.pts', '.pqw6', '.xlsx', '.gitignore', '.bls', '.bqw', '.btt')
 
 # Global paths for wid report
 BASE_DIR = Path(__file__).parent.parent
@@ -70,6 +78,188 @@ def get_global_end():
     return GLOBAL_END
 
 
+class Cancelled(KeyboardInterrupt):
+    """Raised at a wait point of a thread whose CancellationToken was
+    cancelled. Handled like an injected KeyboardInterrupt, but raised only
+    at well-defined points, never inside a lock or a socket read."""
+    pass
+
+
+class CancellationToken:
+    """Cooperative cancellation of the work of a thread, e.g. a test case.
+
+    The thread installs the token with set_cancel_token(). The wait points
+    (ResultWithFlag.wait, BTPWorker.read, the stack event waits and the
+    WID handler sleeps) raise Cancelled within milliseconds of cancel().
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+
+            self._event.set()
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            callback()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled
+
+    def wait(self, timeout=None):
+        """Returns True if cancelled before the timeout"""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_cancel_token = threading.local()
+
+
+def set_cancel_token(token):
+    """Installs the CancellationToken of the calling thread, None to
+    disable the cancellation, e.g. for the test case teardown."""
+    _cancel_token.token = token
+
+
+def get_cancel_token():
+    return getattr(_cancel_token, 'token', None)
+
+
+def raise_on_cancel():
+    token = get_cancel_token()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def wake_on_cancel(callback):
+    """Calls the callback, e.g. to wake up a blocking wait, if the token
+    of the calling thread is cancelled within the context."""
+    token = get_cancel_token()
+    if token is None:
+        yield
+        return
+
+    token.add_callback(callback)
+    try:
+        yield
+    finally:
+        token.remove_callback(callback)
+
+
+def cancellable_sleep(seconds):
+    """time.sleep that raises Cancelled at once on the cancellation of
+    the token of the calling thread"""
+    token = get_cancel_token()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise Cancelled
+
+
+class TimerHandle:
+    """A timer of the TimerService, cancellable like threading.Timer"""
+
+    __slots__ = ('when', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerService:
+    """Runs the callbacks of all timers on one thread at their monotonic
+    deadlines, instead of a threading.Timer thread per timer. The
+    callbacks must be short, e.g. set an event."""
+
+    def __init__(self, name='TimerService'):
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, callback, *args):
+        handle = TimerHandle(time.monotonic() + delay, callback, args)
+
+        with self._cond:
+            # The sequence number keeps the order of the timers of the
+            # same deadline
+            heapq.heappush(self._heap, (handle.when, next(self._seq), handle))
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            elif self._heap[0][2] is handle:
+                # Earlier than the timer the thread sleeps for
+                self._cond.notify()
+
+        return handle
+
+    def _next_expired(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                delay = self._heap[0][0] - time.monotonic()
+                if delay <= 0:
+                    return heapq.heappop(self._heap)[2]
+
+                self._cond.wait(delay)
+
+    def _run(self):
+        while True:
+            handle = self._next_expired()
+            if handle.cancelled:
+                continue
+
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                logging.exception(e)
+
+
+_timer_service = TimerService()
+
+
+def call_later(delay, callback, *args):
+    """Calls callback(*args) after delay seconds on the shared timer
+    thread. Returns the TimerHandle to cancel it."""
+    return _timer_service.call_later(delay, callback, *args)
+
+
 def log_running_threads():
     active_threads = threading.enumerate()
     logging.debug("Active threads:")
@@ -81,19 +271,28 @@ class ResultWithFlag:
     """"""
     def __init__(self, init_value=None):
         self.result = init_value
-        self.event = threading.Event()
         self.lock = threading.Lock()
+        # Notified when the flag is set, the result changes or the wait
+        # is cancelled
+        self.cond = threading.Condition()
+        self.flag = False
 
     def is_set(self):
-        return self.event.is_set()
+        return self.flag
 
     def set_flag(self):
-        self.event.set()
+        with self.cond:
+            self.flag = True
+            self.cond.notify_all()
+
+    def notify(self):
+        with self.cond:
+            self.cond.notify_all()
 
     def set(self, value):
         with self.lock:
             self.result = value
-            self.event.set()
+            self.set_flag()
 
     def get(self, timeout=None, predicate=None, clear=False):
         """
@@ -108,7 +307,7 @@ class ResultWithFlag:
             result = self.result
             if clear:
                 self.result = None
-                self.event.clear()
+                self.flag = False
             return result
 
     def wait(self, timeout=None, predicate=lambda: True):
@@ -133,18 +332,20 @@ class ResultWithFlag:
         def on_timeout():
             nonlocal raise_timeout
             raise_timeout = True
-            self.event.set()
+            self.set_flag()
 
         timer = None
         if timeout:
-            timer = threading.Timer(timeout, on_timeout)
-            timer.name = f'Timer{timer.name}'
-            timer.start()
+            timer = call_later(timeout, on_timeout)
 
         try:
-            while predicate() and not self.event.is_set():
-                raise_on_global_end()
-                self.event.wait(1)
+            with wake_on_cancel(self.notify):
+                while predicate() and not self.flag:
+                    raise_on_global_end()
+                    raise_on_cancel()
+                    with self.cond:
+                        if not self.flag:
+                            self.cond.wait(1)
         finally:
             if timer:
                 timer.cancel()
@@ -161,7 +362,7 @@ class ResultWithFlag:
     def clear(self):
         with self.lock:
             self.result = None
-        self.event.clear()
+        self.flag = False
 
 
 class CounterWithFlag(ResultWithFlag):
@@ -172,8 +373,7 @@ class CounterWithFlag(ResultWithFlag):
     def add(self, value):
         with self.lock:
             self.result += value
-        with self.event._cond:
-            self.event._cond.notify_all()
+        self.notify()
 
     def wait_for(self, value, timeout=None):
         def predicate():
@@ -213,7 +413,8 @@ class InterruptableThread(threading.Thread):
         return None
 
     def interrupt(self):
-        thread_id = self.get_id()
+        # The thread ids do not fit the C int the ctypes passes by default
+        thread_id = ctypes.c_ulong(self.get_id())
         # Inject raise KeyboardInterrupt into a thread. Under Windows will not
         # work if a thread stacked on wait() or get() from the 'threading' module.
         with self.interrupt_lock:
@@ -223,6 +424,11 @@ class InterruptableThread(threading.Thread):
             ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, 0)
             logging.debug(f'Failed to inject an KeyboardInterrupt into a thread {self.name}')
 
+    def clear_interrupt(self):
+        """Drops the KeyboardInterrupt injected into the thread, if not
+        raised yet"""
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.get_id()), 0)
+
 
 pykush_installed = False
 try:
@@ -266,6 +472,100 @@ def get_own_workspaces():
     return workspaces
 
 
+def archive_workspace_logs(logs_root, cursor=0.0, max_bytes=None):
+    """Pack the PTS workspace logs into a compressed zip archive.
+
+    The files are filtered, checked for the PASS verdict and deleted in
+    a single pass over the workspace tree.
+
+    Args:
+        logs_root: path to the workspace directory
+        cursor: the workspace files are packed only if modified after
+                this time. The logs are deleted after packing, so this
+                matters only for the files that are kept.
+        max_bytes: stop packing the logs after this amount of the files
+                   content, the rest will be packed at the next call.
+                   The kept files are packed only with the last logs,
+                   whatever their size.
+
+    Returns: dictionary with:
+        archive: zip archive bytes, paths relative to the logs_root
+        pass_xmls: archive paths of the PTS .xml logs with PASS verdict
+        cursor: cursor value to pass with the next call
+        more: True if max_bytes was reached before packing all the files
+    """
+    scan_start_time = time.time()
+    buffer = io.BytesIO()
+    pass_xmls = []
+    keep_paths = []
+    packed_bytes = 0
+    more = False
+
+    def _pack(zf, file_path):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        arcname = os.path.relpath(file_path, logs_root).replace('\\', '/')
+        zf.writestr(arcname, data)
+
+        if arcname.endswith('.xml') and 'tc_log' not in arcname and \
+                b'Final Verdict:PASS' in data:
+            pass_xmls.append(arcname)
+
+        return len(data)
+
+    def _try_pack(zf, file_path):
+        try:
+            _pack(zf, file_path)
+        except OSError as e:
+            logging.debug(e)
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for root, _dirs, files in os.walk(logs_root, topdown=False):
+            for name in files:
+                file_path = os.path.join(root, name)
+
+                try:
+                    if name.endswith(PTS_WORKSPACE_KEEP_FILE_EXTS):
+                        if os.path.getmtime(file_path) > cursor:
+                            keep_paths.append(file_path)
+                        continue
+
+                    if max_bytes and packed_bytes and \
+                            packed_bytes + os.path.getsize(file_path) > max_bytes:
+                        more = True
+                        continue
+
+                    packed_bytes += _pack(zf, file_path)
+                except OSError as e:
+                    logging.debug(e)
+                    continue
+
+                try:
+                    os.remove(file_path)
+                except OSError as e:
+                    logging.debug(e)
+
+            if os.path.abspath(root) != os.path.abspath(logs_root):
+                try:
+                    # Removes only empty directories
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+        if not more:
+            # The kept files are sent once, not with every chunk
+            for file_path in keep_paths:
+                _try_pack(zf, file_path)
+
+    return {
+        'archive': buffer.getvalue(),
+        'pass_xmls': pass_xmls,
+        'cursor': cursor if more else scan_start_time,
+        'more': more,
+    }
+
+
 def count_script_instances(script_name):
     count = 0
     for proc in psutil.process_iter(['name', 'cmdline']):
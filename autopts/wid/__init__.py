@@ -46,7 +46,7 @@ from .vcs import vcs_wid_hdl
 from .vocs import vocs_wid_hdl
 
 # GENERATOR append 1
-from .wid import generic_wid_hdl
+from .wid import generic_wid_hdl, wid_hdl_modules
 
 __all__ = [
     "aics_wid_hdl",
@@ -81,4 +81,5 @@ __all__ = [
     "rfcomm_wid_hdl",
 # GENERATOR append 2
     "generic_wid_hdl",
+    "wid_hdl_modules",
 ]
@@ -18,6 +18,7 @@ import logging
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
@@ -25,10 +26,11 @@ addr_type = 0
 addr = "000000000000"
 
 
+@wid_hdl_modules(__name__)
 def aics_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{aics_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, aics_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
@@ -20,14 +20,16 @@ from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
 from autopts.wid.bap import create_lc3_ltvs_bytes
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def ascs_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{ascs_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, ascs_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
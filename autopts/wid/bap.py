@@ -18,11 +18,9 @@ import struct
 from argparse import Namespace
 from dataclasses import dataclass
 from enum import Enum, auto
-from time import sleep
 from typing import Final
 
 from autopts.ptsprojects.stack import WildCard, get_stack
-from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp, defs
 from autopts.pybtp.btp import (
     lt2_addr_get,
@@ -49,6 +47,7 @@ from autopts.pybtp.types import (
     uuid_to_le_hex_str,
 )
 from autopts.wid.common import _safe_bap_send
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
@@ -658,10 +657,11 @@ def ascs_release(addr_type: int, addr: str, ase_id: int) -> bool:
     return False
 
 
+@wid_hdl_modules(__name__)
 def bap_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{bap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, bap_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
@@ -1099,14 +1099,11 @@ def hdl_wid_300(_: WIDParams):
     """
 
     btp.gap_start_discovery(discov_type='passive', mode='observe')
-    sleep(5)
+    found = btp.gap_wait_for_discovery(5, lambda: btp.check_discovery_results(uuids=[UUID.ASCS]) and
+                                       btp.check_discovery_results(uuids=[UUID.AVAILABLE_AUDIO_CTXS]))
     btp.gap_stop_discovery()
 
-    found = btp.check_discovery_results(uuids=[UUID.ASCS])
-    if not found:
-        return False
-
-    return btp.check_discovery_results(uuids=[UUID.AVAILABLE_AUDIO_CTXS])
+    return found
 
 
 def bytes_to_ltvs(data):
@@ -2948,9 +2945,7 @@ def hdl_wid_20107(params: WIDParams):
 
     logging.debug("description=%r", params.description)
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-    handle = MMI.args[0]
+    handle = params.mmi.args[0]
 
     btp.gattc_read(btp.pts_addr_type_get(), btp.pts_addr_get(), handle)
     btp.gattc_read_rsp()
@@ -29,14 +29,16 @@ from autopts.pybtp.types import (
     gap_settings_btp2txt,
     uuid_to_le_hex_str,
 )
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def bass_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{bass_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, bass_wid_hdl.wid_hdl_modules)
 
 
 def hdl_wid_100(param: WIDParams):
@@ -20,6 +20,7 @@ from enum import IntEnum, IntFlag
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import WIDParams
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
@@ -77,10 +78,11 @@ global __gtbs_ccpc_handle, __round
 __gtbs_ccpc_handle, __round = None, None
 
 
+@wid_hdl_modules(__name__)
 def ccp_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{ccp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, ccp_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
@@ -20,14 +20,16 @@ import struct
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import AdType, OwnAddrType, WIDParams, gap_settings_btp2txt
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def csip_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{csip_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, csip_wid_hdl.wid_hdl_modules)
 
 
 def hdl_wid_3(_: WIDParams):
@@ -18,7 +18,6 @@ import copy
 import logging
 import re
 import struct
-from time import sleep
 
 from autopts.ptsprojects.stack import ConnParams, get_stack
 from autopts.pybtp import btp, defs, types
@@ -34,21 +33,37 @@ from autopts.pybtp.types import (
     addr_str_to_le_bytes,
     gap_settings_btp2txt,
 )
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def gap_wid_hdl(wid, description, test_case_name):
     log(f'{gap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, gap_wid_hdl.wid_hdl_modules)
+
+
+def _is_found_over_br_and_le():
+    return btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE) and btp.check_discovery_results()
+
+
+def _is_found_over_br_or_le():
+    return btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE) or btp.check_discovery_results()
+
+
+def _is_ead_found():
+    stack = get_stack()
+
+    return any(device.eir and AdType.encrypted_data in btp.parse_eir_data(device.eir)
+               for device in stack.gap.found_devices.data)
 
 
 # wid handlers section begin
 def hdl_wid_4(_: WIDParams):
-    sleep(10)  # Give some time to discover devices
+    found = btp.gap_wait_for_discovery(10)
     btp.gap_stop_discovery()
-    return btp.check_discovery_results()
+    return found
 
 
 def hdl_wid_5(_: WIDParams):
@@ -492,9 +507,14 @@ def hdl_wid_77(params: WIDParams):
     if params.test_case_name.startswith("GAP/BOND/BON/BV-04-C"):
 
         # PTS sends WID before IUT finishes encryption
-        # This is a temporary workaround. Ultimately
-        # we should wait for an event here or submit a PTS Issue.
-        sleep(10)
+        stack = get_stack()
+        if stack.gap.is_connected():
+            try:
+                stack.gap.gap_wait_for_sec_lvl_change(min_level=2, timeout=10)
+            except Exception as e:
+                # Disconnected since the check
+                logging.error("Security level change not awaited: %s", e)
+                return False
     try:
         if params.test_case_name in ['GAP/DM/LEP/BV-09-C']:
             get_stack().gap.wait_for_connection(timeout=5, conn_count=2)
@@ -843,9 +863,9 @@ def hdl_wid_137(params: WIDParams):
 
 def hdl_wid_138(_: WIDParams):
     btp.gap_start_discovery(transport='le', discov_type='active', mode='observe')
-    sleep(10)  # Give some time to discover devices
+    found = btp.gap_wait_for_discovery(10)
     btp.gap_stop_discovery()
-    return btp.check_discovery_results()
+    return found
 
 
 def hdl_wid_139(params: WIDParams):
@@ -1108,11 +1128,11 @@ def hdl_wid_156(_: WIDParams):
 
 
 def hdl_wid_157(params: WIDParams):
+    report, response = re.findall(r'[a-fA-F0-9]{62}', params.description)
     btp.gap_start_discovery(transport='le', discov_type='active', mode='observe')
-    sleep(10)  # Give some time to discover devices
+    found = btp.gap_wait_for_discovery(10, lambda: btp.check_scan_report_and_response(report, response))
     btp.gap_stop_discovery()
-    report, response = re.findall(r'[a-fA-F0-9]{62}', params.description)
-    return btp.check_scan_report_and_response(report, response)
+    return found
 
 
 def hdl_wid_158(_: WIDParams):
@@ -1251,9 +1271,9 @@ def hdl_wid_179(_: WIDParams):
 
 def hdl_wid_204(_: WIDParams):
     btp.gap_start_discovery(discov_type='passive', mode='observe')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10)
     btp.gap_stop_discovery()
-    return btp.check_discovery_results()
+    return found
 
 
 def hdl_wid_206(params: WIDParams):
@@ -2034,9 +2054,9 @@ def hdl_wid_502(params: WIDParams):
         return False
     expected_payload = max(payload_candidates, key=len)
     log(f'expected payload: {expected_payload}')
-    # scan for a while to get encrypted adv packet
+    # scan until an encrypted adv packet is received
     btp.gap_start_discovery(discov_type='passive', mode='observe')
-    sleep(5)
+    btp.gap_wait_for_discovery(5, _is_ead_found)
     btp.gap_stop_discovery()
     decrypted = btp.decrypt_ead_from_devices()
     return btp.verify_ead_payload(decrypted, expected_payload)
@@ -2295,9 +2315,9 @@ def hdl_wid_146(_: WIDParams):
     initiate a create connection otherwise click 'No'.
     """
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10, addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discovery()
-    return btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE)
+    return found
 
 
 def hdl_wid_147(_: WIDParams):
@@ -2305,9 +2325,9 @@ def hdl_wid_147(_: WIDParams):
     Please start limited inquiry. Click 'Yes' If IUT does discovers PTS otherwise click 'No'.
     """
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='limited')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10, addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discovery()
-    return btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE)
+    return found
 
 
 def hdl_wid_164(_: WIDParams):
@@ -2322,10 +2342,6 @@ def hdl_wid_165(params: WIDParams):
     """
     Please confirm that IUT has discovered PTS and retrieved its name 'PTS-GAP-E449'.
     """
-    btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
-    btp.gap_stop_discovery()
-
     pattern = re.compile(r"'(.*)'")
     macthed = pattern.findall(params.description)
     if not macthed:
@@ -2335,7 +2351,11 @@ def hdl_wid_165(params: WIDParams):
     name = macthed[0]
     name = binascii.hexlify(name.encode()).decode()
 
-    return btp.check_scan_report_and_response(name, name)
+    btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='general')
+    found = btp.gap_wait_for_discovery(10, lambda: btp.check_scan_report_and_response(name, name))
+    btp.gap_stop_discovery()
+
+    return found
 
 
 def hdl_wid_102(params: WIDParams):
@@ -2350,10 +2370,10 @@ def hdl_wid_102(params: WIDParams):
         return True
 
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10, addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discovery()
 
-    if not btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
+    if not found:
         return False
 
     btp.gap_connect(bd_addr_type=defs.BTP_BR_ADDRESS_TYPE)
@@ -2513,13 +2533,10 @@ def hdl_wid_36(_: WIDParams):
     """
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='general')
     btp.gap_start_discovery(transport='le', discov_type='passive', mode='general')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10, _is_found_over_br_and_le)
     btp.gap_stop_discovery()
 
-    if not btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
-        return False
-
-    if not btp.check_discovery_results():
+    if not found:
         return False
 
     get_stack().gap.reset_discovery()
@@ -2533,13 +2550,10 @@ def hdl_wid_7(_: WIDParams):
     """
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='limited')
     btp.gap_start_discovery(transport='le', discov_type='passive', mode='limited')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10, _is_found_over_br_and_le)
     btp.gap_stop_discovery()
 
-    if not btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
-        return False
-
-    if not btp.check_discovery_results():
+    if not found:
         return False
 
     get_stack().gap.reset_discovery()
@@ -2553,13 +2567,11 @@ def hdl_wid_123(_: WIDParams):
     """
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='limited')
     btp.gap_start_discovery(transport='le', discov_type='passive', mode='limited')
-    sleep(10)
+    # Not discovering PTS is expected, so stop early only if it is found
+    found = btp.gap_wait_for_discovery(10, _is_found_over_br_or_le)
     btp.gap_stop_discovery()
 
-    if btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
-        return False
-
-    if btp.check_discovery_results():
+    if found:
         return False
 
     get_stack().gap.reset_discovery()
@@ -2571,10 +2583,10 @@ def hdl_wid_86(_: WIDParams):
     Please start device name discovery over BR/EDR . If IUT discovers PTS, press OK to continue.
     """
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10, addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discovery()
 
-    if not btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
+    if not found:
         return False
     get_stack().gap.reset_discovery()
     return True
@@ -2769,9 +2781,9 @@ def hdl_wid_352(params: WIDParams):
         addr_type = pts_addr_type_get()
 
         btp.gap_start_discovery(transport='le', discov_type='passive', mode='observe')
-        sleep(10)
+        found = btp.gap_wait_for_discovery(10, addr_type=addr_type, addr=addr)
         btp.gap_stop_discovery()
-        if not btp.check_discovery_results(addr_type=addr_type, addr=addr):
+        if not found:
             log('Peer device not found.')
             return False
 
@@ -16,7 +16,6 @@ import logging
 import re
 import struct
 from binascii import hexlify
-from time import sleep
 
 from autopts.ptsprojects.stack import (
     GattCharacteristic,
@@ -28,22 +27,29 @@ from autopts.ptsprojects.stack import (
     GattServiceIncluded,
     get_stack,
 )
-from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp
 from autopts.pybtp.types import UUID, BTPError, IOCap, Perm, Prop, WIDParams, le_bytes_to_hex_str, le_bytes_to_uuid
-from autopts.wid import generic_wid_hdl
+from autopts.utils import cancellable_sleep
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 indication_subbed_already = False
 
 
+@wid_hdl_modules(__name__)
 def gatt_wid_hdl(wid, description, test_case_name):
     log(f'{gatt_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, gatt_wid_hdl.wid_hdl_modules)
 
 
 def gatt_server_fetch_db():
+    snapshot = btp.gatts_server_snapshot()
+    if snapshot is not None:
+        db = snapshot.get_db()
+        if db is not None:
+            return db
+
     db = GattDB()
     bd_addr = btp.pts_addr_get()
     bd_addr_type = btp.pts_addr_type_get()
@@ -89,6 +95,9 @@ def gatt_server_fetch_db():
 
             db.attr_add(handle, GattCharacteristicDescriptor(handle, perm, uuid, att_rsp, val))
 
+    if snapshot is not None:
+        snapshot.set_db(db)
+
     return db
 
 
@@ -166,9 +175,7 @@ def hdl_wid_17(params: WIDParams):
     if params.test_case_name.startswith('GATT/CL'):
         return btp.verify_description(params.description)
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-    pts_services = MMI.args
+    pts_services = params.mmi.args
     if not pts_services:
         logging.error("%s parsing error", hdl_wid_17.__name__)
         return False
@@ -197,10 +204,7 @@ def hdl_wid_17(params: WIDParams):
 
 
 def hdl_wid_18(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     if not uuid:
         logging.error("%s parsing error", hdl_wid_18.__name__)
@@ -224,10 +228,7 @@ def hdl_wid_21(params: WIDParams):
 
 
 def hdl_wid_20(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     if not uuid:
         logging.error("%s parsing error", hdl_wid_20.__name__)
@@ -243,10 +244,7 @@ def hdl_wid_20(params: WIDParams):
 
 
 def hdl_wid_22(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    parsed_args = [[char for char in arg if char != "-"] for arg in MMI.args]
+    parsed_args = [[char for char in arg if char != "-"] for arg in params.mmi.args]
 
     handles = []
     uuids = []
@@ -297,10 +295,7 @@ def hdl_wid_22(params: WIDParams):
 
 
 def hdl_wid_23(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    pts_services = [[int(MMI.args[1], 16), int(MMI.args[2], 16), MMI.args[0]]]
+    pts_services = [[int(params.mmi.args[1], 16), int(params.mmi.args[2], 16), params.mmi.args[0]]]
 
     if not pts_services:
         logging.debug("parsing error")
@@ -349,28 +344,25 @@ def hdl_wid_24(params: WIDParams):
     if params.test_case_name.startswith('GATT/CL'):
         return btp.verify_description(params.description)
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-
     db = gatt_server_fetch_db()
 
-    if not MMI.args:
+    if not params.mmi.args:
         return False
 
-    incl_handle = int(MMI.args[1], 16)
+    incl_handle = int(params.mmi.args[1], 16)
     attr = db.attr_lookup_handle(incl_handle)
     if attr is None or not isinstance(attr, GattService):
         logging.error("service not found")
         return False
 
     incl_uuid = attr.uuid
-    attr = db.attr_lookup_handle(int(MMI.args[0], 16))
+    attr = db.attr_lookup_handle(int(params.mmi.args[0], 16))
     if attr is None or not isinstance(attr, GattServiceIncluded):
         logging.error("included not found")
         return False
 
-    if attr.end_grp_hdl != int(MMI.args[2], 16) \
-            or incl_uuid != MMI.args[3]:
+    if attr.end_grp_hdl != int(params.mmi.args[2], 16) \
+            or incl_uuid != params.mmi.args[3]:
         logging.error("end group handle not found")
         return False
 
@@ -378,11 +370,8 @@ def hdl_wid_24(params: WIDParams):
 
 
 def hdl_wid_25(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    pts_chrc_uuid = MMI.args[0]
-    pts_chrc_handles = [int(MMI.args[i], 16) for i in range(1, len(MMI.args))]
+    pts_chrc_uuid = params.mmi.args[0]
+    pts_chrc_handles = [int(params.mmi.args[i], 16) for i in range(1, len(params.mmi.args))]
 
     iut_start_handle = None
     iut_end_handle = None
@@ -432,11 +421,8 @@ def hdl_wid_26(params: WIDParams):
 
 
 def hdl_wid_27(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    start_hdl = MMI.args[1]
-    end_hdl = MMI.args[2]
+    start_hdl = params.mmi.args[1]
+    end_hdl = params.mmi.args[2]
 
     if not start_hdl or not end_hdl:
         logging.error("parsing error")
@@ -455,12 +441,9 @@ def hdl_wid_28(params: WIDParams):
 
 
 def hdl_wid_29(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    start_hdl = MMI.args[0]
-    end_hdl = MMI.args[1]
-    uuid = MMI.args[2]
+    start_hdl = params.mmi.args[0]
+    end_hdl = params.mmi.args[1]
+    uuid = params.mmi.args[2]
 
     if not start_hdl or not end_hdl or not uuid:
         logging.error("parsing error")
@@ -480,11 +463,8 @@ def hdl_wid_30(params: WIDParams):
 
 
 def hdl_wid_31(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    start_hdl = MMI.args[0]
-    end_hdl = MMI.args[1]
+    start_hdl = params.mmi.args[0]
+    end_hdl = params.mmi.args[1]
 
     if not start_hdl or not end_hdl:
         logging.error("parsing error")
@@ -513,10 +493,8 @@ def hdl_wid_35(params: WIDParams):
 
 
 def hdl_wid_36(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    pts_services = [[int(MMI.args[0], 16), int(MMI.args[1], 16), int(MMI.args[2], 16), MMI.args[3]]]
+    args = params.mmi.args
+    pts_services = [[int(args[0], 16), int(args[1], 16), int(args[2], 16), args[3]]]
 
     if not pts_services:
         logging.debug("parsing error")
@@ -592,10 +570,7 @@ def hdl_wid_47(params: WIDParams):
 
 
 def hdl_wid_48(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.debug("parsing error")
@@ -641,12 +616,9 @@ def hdl_wid_50(params: WIDParams):
 
 
 def hdl_wid_51(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
-    start_hdl = MMI.args[1]
-    end_hdl = MMI.args[2]
+    uuid = params.mmi.args[0]
+    start_hdl = params.mmi.args[1]
+    end_hdl = params.mmi.args[2]
 
     if not uuid or not start_hdl or not end_hdl:
         logging.debug("parsing error")
@@ -667,11 +639,8 @@ def hdl_wid_52(params: WIDParams):
     if params.test_case_name.startswith('GATT/CL'):
         return btp.verify_description(params.description)
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    handle = int(MMI.args[0], 16)
-    value = MMI.args[1]
+    handle = int(params.mmi.args[0], 16)
+    value = params.mmi.args[1]
 
     db = gatt_server_fetch_db()
     attr = db.attr_lookup_handle(handle)
@@ -698,11 +667,8 @@ def hdl_wid_52(params: WIDParams):
 
 
 def hdl_wid_53(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    read_hdl = MMI.args[0]
-    offset = MMI.args[1]
+    read_hdl = params.mmi.args[0]
+    offset = params.mmi.args[1]
 
     if not read_hdl or not offset:
         logging.debug("parsing error")
@@ -722,15 +688,12 @@ def hdl_wid_55(params: WIDParams):
 
 
 def hdl_wid_56(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    if not MMI.args or len(MMI.args) != 3:
+    if not params.mmi.args or len(params.mmi.args) != 3:
         logging.error("parsing error")
 
-    handle1 = MMI.args[0]
-    handle2 = MMI.args[1]
-    values = MMI.args[2]
+    handle1 = params.mmi.args[0]
+    handle2 = params.mmi.args[1]
+    values = params.mmi.args[2]
 
     values_read = ""
 
@@ -750,11 +713,8 @@ def hdl_wid_56(params: WIDParams):
 
 
 def hdl_wid_57(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
 
     if not hdl1 or not hdl2:
         logging.error("parsing error")
@@ -772,10 +732,7 @@ def hdl_wid_57(params: WIDParams):
 
 
 def hdl_wid_58(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -821,15 +778,12 @@ def hdl_wid_67(params: WIDParams):
 
 
 def hdl_wid_69(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    if not MMI.args:
+    if not params.mmi.args:
         logging.error("parsing error")
         return False
 
-    handle = int(MMI.args[0], 16)
-    size = int(MMI.args[1], 10)
+    handle = int(params.mmi.args[0], 16)
+    size = int(params.mmi.args[1], 10)
 
     btp.gattc_write_long(btp.pts_addr_type_get(), btp.pts_addr_get(),
                          handle, 0, '12', size)
@@ -860,10 +814,7 @@ def hdl_wid_71(_: WIDParams):
 
 
 def hdl_wid_72(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -876,11 +827,8 @@ def hdl_wid_72(params: WIDParams):
 
 
 def hdl_wid_74(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    size = int(MMI.args[1])
+    hdl = params.mmi.args[0]
+    size = int(params.mmi.args[1])
 
     if not hdl or size == 0:
         logging.error("parsing error")
@@ -898,13 +846,11 @@ def hdl_wid_74(params: WIDParams):
 
 
 def hdl_wid_75(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-    if not MMI.args:
+    if not params.mmi.args:
         logging.debug("parsing error")
 
-    handle = int(MMI.args[0], 16)
-    value = int(MMI.args[1], 16)
+    handle = int(params.mmi.args[0], 16)
+    value = int(params.mmi.args[1], 16)
 
     stack = get_stack()
 
@@ -948,11 +894,8 @@ def hdl_wid_76(params: WIDParams):
 
 
 def hdl_wid_77(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    length = int(MMI.args[1])
+    hdl = params.mmi.args[0]
+    length = int(params.mmi.args[1])
 
     if not hdl or not length:
         logging.error("parsing error")
@@ -975,11 +918,8 @@ def hdl_wid_77(params: WIDParams):
 
 
 def hdl_wid_80(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    val_mtp = MMI.args[1]
+    hdl = params.mmi.args[0]
+    val_mtp = params.mmi.args[1]
 
     if not hdl or not val_mtp:
         logging.error("parsing error")
@@ -994,11 +934,8 @@ def hdl_wid_80(params: WIDParams):
 
 
 def hdl_wid_81(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    val_mtp = int(MMI.args[1], 10) + 1
+    hdl = params.mmi.args[0]
+    val_mtp = int(params.mmi.args[1], 10) + 1
 
     if not hdl or not val_mtp:
         logging.error("parsing error")
@@ -1065,7 +1002,7 @@ def hdl_wid_92(params: WIDParams):
         return False
 
     # delay, to let the PTS subscribe for notifications
-    sleep(2)
+    cancellable_sleep(2)
 
     if value_len == 0:
         value = b'\x01'
@@ -1119,18 +1056,16 @@ def hdl_wid_96(_: WIDParams):
 
 
 def hdl_wid_97(_: WIDParams):
-    sleep(30)
+    cancellable_sleep(30)
     return True
 
 
 def hdl_wid_98(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-    if not MMI.args:
+    if not params.mmi.args:
         logging.error("parsing error")
         return False
 
-    handle = int(MMI.args[0], 16)
+    handle = int(params.mmi.args[0], 16)
     bd_addr = btp.pts_addr_get()
     bd_addr_type = btp.pts_addr_type_get()
 
@@ -1141,7 +1076,7 @@ def hdl_wid_98(params: WIDParams):
         return False
 
     # delay, to let the PTS subscribe for notifications
-    sleep(2)
+    cancellable_sleep(2)
 
     btp.gatts_set_val(handle, hexlify(value))
 
@@ -1272,10 +1207,7 @@ def hdl_wid_107(_: WIDParams):
 
 
 def hdl_wid_108(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     if not uuid:
         logging.debug("parsing error")
@@ -1293,10 +1225,7 @@ def hdl_wid_108(params: WIDParams):
 
 
 def hdl_wid_109(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     if not uuid:
         logging.debug("parsing error")
@@ -1695,10 +1624,7 @@ def hdl_wid_134(_: WIDParams):
 
 
 def hdl_wid_135(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -1721,10 +1647,7 @@ def hdl_wid_137(_: WIDParams):
 
 
 def hdl_wid_138(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -1743,11 +1666,8 @@ def hdl_wid_140(params: WIDParams):
 
     Description: Verify that the Implementation Under Test (IUT) can receive multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
     btp.gattc_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
 
     if params.test_case_name.startswith("GATT/CL/GAR/BI"):
@@ -1769,11 +1689,8 @@ def hdl_wid_141(params: WIDParams):
 
     Description: Verify that the Implementation Under Test (IUT) can receive multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
     btp.gattc_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
 
     if params.test_case_name.startswith("GATT/CL/GAR/BI"):
@@ -1789,10 +1706,7 @@ def hdl_wid_141(params: WIDParams):
 
 
 def hdl_wid_142(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -1834,11 +1748,8 @@ def hdl_wid_147(params: WIDParams):
 
     Description: Verify that the Implementation Under Test (IUT) can receive multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
     btp.gattc_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
     btp.gattc_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
     return True
@@ -1851,11 +1762,8 @@ def hdl_wid_148(params: WIDParams):
 
     Description: Verify that the Implementation Under Test (IUT) can receive multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
     btp.gattc_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
     btp.gattc_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
     return True
@@ -1870,10 +1778,7 @@ def hdl_wid_149(params: WIDParams):
 
 
 def hdl_wid_139(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -1888,10 +1793,7 @@ def hdl_wid_150(params: WIDParams):
     Please send an ATT_Write_Request to Client Support Features handle = 'XXXX'O to enable Multiple Handle Value Notifications.
     Discover all characteristics if needed.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     # First read the existing value in Client Supported Features.
     btp.gattc_read(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl)
@@ -2005,21 +1907,15 @@ def hdl_wid_167(params: WIDParams):
     """
     description: Please change IUT's GATT database by removing the handle 'XXXX'O
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
     btp.remove_handle_from_db(hdl)
 
     return True
 
 
 def hdl_wid_304(params: WIDParams):
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    val = MMI.args[1]
+    hdl = params.mmi.args[0]
+    val = params.mmi.args[1]
     _, _, data = btp.gatts_get_attr_val(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl)
     data = hexlify(data).decode().upper()
     return bool(data in val)
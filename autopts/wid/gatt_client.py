@@ -16,22 +16,21 @@
 
 import logging
 import re
-from time import sleep
 
 from autopts.ptsprojects.stack import get_stack
-from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp
 from autopts.pybtp.types import GATTErrorCodes, IOCap, WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
 indication_subbed_already = False
 
 
+@wid_hdl_modules(__name__)
 def gatt_cl_wid_hdl(wid, description, test_case_name):
     log(f'{gatt_cl_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, gatt_cl_wid_hdl.wid_hdl_modules)
 
 
 # TODO: port all GATT wids to GATT Client service
@@ -180,10 +179,7 @@ def hdl_wid_18(params: WIDParams):
     """
     stack = get_stack()
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     if not uuid:
         logging.error("%s parsing error", hdl_wid_18.__name__)
@@ -219,10 +215,7 @@ def hdl_wid_20(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover Primary Services UUID = '0000-A00C-0000-0000-0123-4567-89AB-CDEF'O.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     stack = get_stack()
 
@@ -275,14 +268,11 @@ def hdl_wid_24(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover all include services in database.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    if not MMI.args:
+    if not params.mmi.args:
         return False
 
     # split MMI args into tuples (att_hdl, incl_svc_hdl, end_gp_hdl, svc_uuid)
-    mmi_args_tupled = [tuple(MMI.args[i:i + 4]) for i in range(0, len(MMI.args), 4)]
+    mmi_args_tupled = [tuple(params.mmi.args[i:i + 4]) for i in range(0, len(params.mmi.args), 4)]
 
     stack = get_stack()
     return set(stack.gatt_cl.incl_svcs).issubset(set(mmi_args_tupled))
@@ -309,13 +299,10 @@ def hdl_wid_27(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover all charactieristics of a service.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
     stack = get_stack()
 
-    start_hdl = MMI.args[1]
-    end_hdl = MMI.args[2]
+    start_hdl = params.mmi.args[1]
+    end_hdl = params.mmi.args[2]
 
     if not start_hdl or not end_hdl:
         logging.error("parsing error")
@@ -338,13 +325,10 @@ def hdl_wid_28(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover all characteristics of a service in database."
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
     stack = get_stack()
     stack.gatt_cl.wait_for_chrcs()
 
-    for hdl in MMI.args:
+    for hdl in params.mmi.args:
         hdl = int(hdl, 16)
         result = [item for item in stack.gatt_cl.chrcs if item[0] == hdl]
         if result is None:
@@ -360,12 +344,9 @@ def hdl_wid_29(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover characteristics by UUID."
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    start_hdl = MMI.args[0]
-    end_hdl = MMI.args[1]
-    uuid = MMI.args[2]
+    start_hdl = params.mmi.args[0]
+    end_hdl = params.mmi.args[1]
+    uuid = params.mmi.args[2]
 
     if not start_hdl or not end_hdl or not uuid:
         logging.error("parsing error")
@@ -385,15 +366,12 @@ def hdl_wid_30(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover primary service by UUID in database."
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
     stack = get_stack()
-    sleep(1)
-    stack.gatt_cl.wait_for_chrcs()
+    if not stack.gatt_cl.wait_for_chrcs():
+        return False
 
-    if int(MMI.args[0], 16) == stack.gatt_cl.chrcs[0][0] and \
-            MMI.args[1].replace('-', '') == stack.gatt_cl.chrcs[0][1]:
+    if int(params.mmi.args[0], 16) == stack.gatt_cl.chrcs[0][0] and \
+            params.mmi.args[1].replace('-', '') == stack.gatt_cl.chrcs[0][1]:
         return True
     return False
 
@@ -406,11 +384,8 @@ def hdl_wid_31(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover characteristics descriptor.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    start_hdl = MMI.args[0]
-    end_hdl = MMI.args[1]
+    start_hdl = params.mmi.args[0]
+    end_hdl = params.mmi.args[1]
 
     if not start_hdl or not end_hdl:
         logging.error("parsing error")
@@ -431,15 +406,12 @@ def hdl_wid_32(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Discover characteristic descriptors in database."
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
     stack = get_stack()
     stack.gatt_cl.wait_for_descs()
 
     val = re.search(r"0x[A-F0-9]+", params.description).group(0)[2:]
 
-    if MMI.args[0] == stack.gatt_cl.dscs[0][0] and \
+    if params.mmi.args[0] == stack.gatt_cl.dscs[0][0] and \
             val == stack.gatt_cl.dscs[0][1]:
         return True
     return False
@@ -606,10 +578,7 @@ def hdl_wid_48(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send Read
     characteristic.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.debug("parsing error")
@@ -648,13 +617,11 @@ def hdl_wid_50(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read characteristic to PTS random select adopted database."
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
     stack = get_stack()
     stack.gatt_cl.wait_for_read()
-    MMI.args.pop(0)  # get rid of parsing artifact
-    for i in range(len(MMI.args) // 2):
-        comparing = (int(MMI.args[i], 16), bytes(MMI.args[i + 1], 'utf-8'))
+    args = params.mmi.args[1:]  # get rid of parsing artifact
+    for i in range(len(args) // 2):
+        comparing = (int(args[i], 16), bytes(args[i + 1], 'utf-8'))
         if comparing not in btp.get_verify_values():
             btp.clear_verify_values()
             return False
@@ -670,12 +637,9 @@ def hdl_wid_51(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send Read
     characteristic by UUID.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
-    start_hdl = MMI.args[1]
-    end_hdl = MMI.args[2]
+    uuid = params.mmi.args[0]
+    start_hdl = params.mmi.args[1]
+    end_hdl = params.mmi.args[2]
 
     if not uuid or not start_hdl or not end_hdl:
         logging.debug("parsing error")
@@ -696,10 +660,7 @@ def hdl_wid_52(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send Read
     long characteristic to PTS random select adopted database.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    value = MMI.args[1]
+    value = params.mmi.args[1]
 
     stack = get_stack()
     stack.gatt_cl.wait_for_read()
@@ -719,11 +680,8 @@ def hdl_wid_53(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read with invalid offset.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    read_hdl = MMI.args[0]
-    offset = MMI.args[1]
+    read_hdl = params.mmi.args[0]
+    offset = params.mmi.args[1]
 
     if not read_hdl or not offset:
         logging.debug("parsing error")
@@ -743,9 +701,6 @@ def hdl_wid_55(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
     stack = get_stack()
 
     stack.gatt_cl.wait_for_verify_values(expected_count=2)
@@ -753,7 +708,7 @@ def hdl_wid_55(params: WIDParams):
     for saved_val in btp.get_verify_values():
         logging.debug("received value: %s", saved_val[1].decode().upper())
 
-    for value in MMI.args:
+    for value in params.mmi.args:
         check = False
         for saved_val in btp.get_verify_values():
             if value in saved_val[1].decode().upper():
@@ -772,11 +727,8 @@ def hdl_wid_57(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
 
     if not hdl1 or not hdl2:
         logging.error("parsing error")
@@ -794,10 +746,7 @@ def hdl_wid_58(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read characteristic descriptor.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -823,10 +772,7 @@ def hdl_wid_59(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read Descriptor to PTS random select adopted database.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    value = MMI.args[0]
+    value = params.mmi.args[0]
 
     stack = get_stack()
     stack.gatt_cl.wait_for_read()
@@ -958,15 +904,12 @@ def hdl_wid_69(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     data according to negotiate MTU size.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    if not MMI.args:
+    if not params.mmi.args:
         logging.error("parsing error")
         return False
 
-    handle = int(MMI.args[0], 16)
-    size = int(MMI.args[1], 10)
+    handle = int(params.mmi.args[0], 16)
+    size = int(params.mmi.args[1], 10)
 
     btp.gatt_cl_write_long(btp.pts_addr_type_get(), btp.pts_addr_get(),
                            handle, 0, '12', size)
@@ -1017,10 +960,7 @@ def hdl_wid_72(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Signed write command.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
+    hdl = params.mmi.args[0]
 
     if not hdl:
         logging.error("parsing error")
@@ -1039,11 +979,8 @@ def hdl_wid_74(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can
     send write request."
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    size = int(MMI.args[1])
+    hdl = params.mmi.args[0]
+    size = int(params.mmi.args[1])
 
     if not hdl or size == 0:
         logging.error("parsing error")
@@ -1088,11 +1025,8 @@ def hdl_wid_77(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     prepare write request.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    offset = int(MMI.args[1]) + 2
+    hdl = params.mmi.args[0]
+    offset = int(params.mmi.args[1]) + 2
 
     if not hdl or not offset:
         logging.error("parsing error")
@@ -1111,11 +1045,8 @@ def hdl_wid_80(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     write request.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    val_mtp = MMI.args[1]
+    hdl = params.mmi.args[0]
+    val_mtp = params.mmi.args[1]
 
     if not hdl or not val_mtp:
         logging.error("parsing error")
@@ -1135,11 +1066,8 @@ def hdl_wid_81(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     prepare write request.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl = MMI.args[0]
-    val_mtp = MMI.args[1]
+    hdl = params.mmi.args[0]
+    val_mtp = params.mmi.args[1]
 
     if not hdl or not val_mtp:
         logging.error("parsing error")
@@ -1244,10 +1172,7 @@ def hdl_wid_108(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read characteristic.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     if not uuid:
         logging.debug("parsing error")
@@ -1267,10 +1192,7 @@ def hdl_wid_109(params: WIDParams):
     Description: Verify that the Implementation Under Test (IUT) can send
     Read characteristic.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    uuid = MMI.args[0]
+    uuid = params.mmi.args[0]
 
     if not uuid:
         logging.debug("parsing error")
@@ -1297,11 +1219,8 @@ def hdl_wid_140(params: WIDParams):
 
     Description: Verify that the Implementation Under Test (IUT) can receive multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
     btp.gatt_cl_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
 
     return True
@@ -1314,11 +1233,8 @@ def hdl_wid_141(params: WIDParams):
 
     Description: Verify that the Implementation Under Test (IUT) can receive multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
     btp.gatt_cl_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
 
     # No response expected
@@ -1332,11 +1248,8 @@ def hdl_wid_147(params: WIDParams):
 
     Description: Verify that the Implementation Under Test (IUT) can receive multiple characteristics.
     """
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    hdl1 = MMI.args[0]
-    hdl2 = MMI.args[1]
+    hdl1 = params.mmi.args[0]
+    hdl2 = params.mmi.args[1]
 
     btp.gatt_cl_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
     btp.gatt_cl_read_multiple_var(btp.pts_addr_type_get(), btp.pts_addr_get(), hdl1, hdl2)
@@ -16,14 +16,16 @@
 import logging
 
 from autopts.pybtp.types import WIDParams
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def gtbs_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{gtbs_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, gtbs_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
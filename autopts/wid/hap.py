@@ -19,7 +19,6 @@ import re
 from argparse import Namespace
 
 from autopts.ptsprojects.stack import get_stack
-from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp, defs
 from autopts.pybtp.btp.audio import pack_metadata
 from autopts.pybtp.btp.btp import lt2_addr_get, lt2_addr_type_get, pts_addr_get, pts_addr_type_get
@@ -32,7 +31,7 @@ from autopts.pybtp.types import (
     WIDParams,
     create_lc3_ltvs_bytes,
 )
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_hdl_modules
 
 log = logging.debug
 
@@ -55,9 +54,10 @@ def create_default_config():
                      mono=None)
 
 
+@wid_hdl_modules(__name__)
 def hap_wid_hdl(wid, description, test_case_name):
     log(f'{hap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, hap_wid_hdl.wid_hdl_modules)
 
 
 def hap_start_hap_discovery(addr_type, addr):
@@ -613,10 +613,7 @@ def hdl_wid_20107(params: WIDParams):
     addr_type = pts_addr_type_get()
     stack = get_stack()
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    value_handle = MMI.args[0]
+    value_handle = params.mmi.args[0]
 
     if not value_handle:
         logging.debug("parsing error")
@@ -694,17 +691,14 @@ def hdl_wid_20206(params: WIDParams):
     addr = pts_addr_get()
     addr_type = pts_addr_type_get()
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-
-    if not MMI.args:
+    if not params.mmi.args:
         return False
 
     # split MMI args into dict[uuid] = val_hdl
     val_hdl_dict = {}
-    for i in range(0, len(MMI.args), 4):
-        uuid = MMI.args[i + 3].upper().replace("0X", "")
-        value_hdl = int(MMI.args[i + 2], 16)
+    for i in range(0, len(params.mmi.args), 4):
+        uuid = params.mmi.args[i + 3].upper().replace("0X", "")
+        value_hdl = int(params.mmi.args[i + 2], 16)
 
         val_hdl_dict[uuid] = value_hdl
 
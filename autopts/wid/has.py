@@ -20,6 +20,7 @@ from enum import IntFlag
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import WIDParams
+from autopts.wid.wid import wid_hdl_modules
 
 
 class PresetProperty(IntFlag):
@@ -31,10 +32,11 @@ class PresetProperty(IntFlag):
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def has_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{has_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, has_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
@@ -15,20 +15,22 @@
 import binascii
 import logging
 import re
-import time
 
-from autopts.ptsprojects.stack import get_stack
+from autopts.ptsprojects.stack import get_stack, wait_for_event
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import BTPError, WIDParams
+from autopts.utils import cancellable_sleep
 from autopts.wid.common import _l2cap_send_forever, _safe_l2cap_disconnect
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def l2cap_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{l2cap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, l2cap_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
@@ -325,7 +327,7 @@ def hdl_wid_57(_: WIDParams):
 
     for _i in range(4):
         btp.l2cap_send_data(0, '00')
-        time.sleep(2)
+        cancellable_sleep(2)
     return True
 
 
@@ -383,7 +385,7 @@ def hdl_wid_103(_: WIDParams):
     stack = get_stack()
     stack.l2cap.clear_data()
     chan = stack.l2cap.chan_lookup_id(0)
-    time.sleep(10)
+    cancellable_sleep(10)
     btp.l2cap_reconfigure(None, None, chan.our_mtu + 1,
                           [chan.id for chan in stack.l2cap.channels])
     return True
@@ -594,9 +596,13 @@ def hdl_wid_260(_: WIDParams):
 
 
 def hdl_wid_261(_: WIDParams):
-    time.sleep(2)
     stack = get_stack()
     chan = stack.l2cap.chan_lookup_id(0)
+    if chan is None:
+        return False
+
+    # Both SDUs are expected
+    wait_for_event(2, lambda: len(chan.data_rx) >= 2)
     rx_data = stack.l2cap.rx_data_get(0, 10)
 
     if rx_data is None:
@@ -615,7 +621,7 @@ def hdl_wid_262(_: WIDParams):
 
     for _ in range(5):
         btp.l2cap_send_data(0, '00' * channel.peer_mtu)
-        time.sleep(2)
+        cancellable_sleep(2)
     return True
 
 
@@ -745,11 +751,11 @@ def hdl_wid_49(params: WIDParams):
                           mode=defs.L2CAP_CONNECT_V2_MODE_RET)
 
     if params.test_case_name in ['L2CAP/COS/CED/BV-10-C', 'L2CAP/COS/CFD/BV-13-C']:
-        time.sleep(2)
-        btp.l2cap_conn_v2(None, defs.BTP_BR_ADDRESS_TYPE, l2cap.psm, l2cap.initial_mtu,
-                          mode=defs.L2CAP_CONNECT_V2_MODE_FC)
-        time.sleep(2)
-        l2cap = get_stack().l2cap
+        cancellable_sleep(2)
+        chan_ids = btp.l2cap_conn_v2(None, defs.BTP_BR_ADDRESS_TYPE, l2cap.psm, l2cap.initial_mtu,
+                                     mode=defs.L2CAP_CONNECT_V2_MODE_FC)
+        for chan_id in chan_ids:
+            l2cap.wait_for_connection(chan_id, timeout=2)
         for _ in range(0, 5):
             for channel in l2cap.channels:
                 _l2cap_chann_send_safely(channel.id, '00', 1)
@@ -15,22 +15,25 @@
 
 import logging
 import re
-import time
 
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.types import MeshVals, Perm, WIDParams
+from autopts.utils import cancellable_sleep
+from autopts.wid.wid import wid_hdl_modules
 
 # Mesh ATS ver. 1.0
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def mesh_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{mesh_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, mesh_wid_hdl.wid_hdl_modules)
 
 
+@wid_hdl_modules(__name__)
 def mesh_wid_hdl_rpr_2ptses(wid, description, test_case_name):
     if wid == 33:
         log("%s, %r, %r, %s", mesh_wid_hdl_rpr_2ptses.__name__, wid, description,
@@ -39,6 +42,7 @@ def mesh_wid_hdl_rpr_2ptses(wid, description, test_case_name):
     return mesh_wid_hdl(wid, description, test_case_name)
 
 
+@wid_hdl_modules(__name__)
 def mesh_wid_hdl_rpr_persistent_storage(wid, description, test_case_name):
     if wid == 13:
         log("%s, %r, %r, %s", mesh_wid_hdl_rpr_persistent_storage.__name__,
@@ -48,6 +52,7 @@ def mesh_wid_hdl_rpr_persistent_storage(wid, description, test_case_name):
     return mesh_wid_hdl(wid, description, test_case_name)
 
 
+@wid_hdl_modules(__name__)
 def mesh_wid_hdl_rpr_persistent_storage_alt(wid, description, test_case_name):
     if wid == 13:
         log("%s, %r, %r, %s", mesh_wid_hdl_rpr_persistent_storage_alt.__name__,
@@ -892,7 +897,7 @@ def hdl_wid_104(_: WIDParams):
 
     ret = stack.gap.wait_for_connection(30)
     if ret:
-        time.sleep(5)
+        cancellable_sleep(5)
 
     return ret
 
@@ -1021,7 +1026,7 @@ def hdl_wid_218(_: WIDParams):
     """
     stack = get_stack()
 
-    time.sleep(stack.mesh.iv_update_timeout.data)
+    cancellable_sleep(stack.mesh.iv_update_timeout.data)
     return True
 
 
@@ -1857,7 +1862,7 @@ def hdl_wid_347(_: WIDParams):
     if group_address not in stack.mesh.lpn_subscriptions:
         btp.mesh_lpn_subscribe(group_address)
         stack.mesh.lpn_subscriptions.append(group_address)
-        time.sleep(10)  # Give some time to subscribe
+        cancellable_sleep(10)  # Give some time to subscribe
 
     btp.mesh_lpn_unsubscribe(group_address)
     stack.mesh.lpn_subscriptions.remove(group_address)
@@ -2703,7 +2708,7 @@ def hdl_wid_521(_: WIDParams):
     description: Please configure the IUT to stop advertising on all networks.
     """
 
-    time.sleep(60)
+    cancellable_sleep(60)
     return True
 
 
@@ -3327,7 +3332,7 @@ def hdl_wid_702(_: WIDParams):
     """
     stack = get_stack()
 
-    time.sleep(1)
+    cancellable_sleep(1)
     btp.mesh_rpr_scan_start(stack.mesh.address_lt1, 5, stack.mesh.dev_uuid)
     return True
 
@@ -3361,7 +3366,7 @@ def hdl_wid_705(_: WIDParams):
     """
     stack = get_stack()
 
-    time.sleep(5)
+    cancellable_sleep(5)
 
     btp.mesh_rpr_link_get(stack.mesh.address_lt1)
     return True
@@ -21,10 +21,12 @@ import sys
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import WIDParams
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def micp_wid_hdl(wid, description, test_case_name, logs=True):
     if logs:
         log(f'{micp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
@@ -16,26 +16,28 @@
 import logging
 import re
 import struct
-import time
 
-from autopts.ptsprojects.stack import get_stack
+from autopts.ptsprojects.stack import get_stack, wait_for_event
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
+from autopts.utils import cancellable_sleep
+from autopts.wid.wid import wid_hdl_modules
 
 # MMDL ATS ver. 1.0
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def mmdl_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{mmdl_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, mmdl_wid_hdl.wid_hdl_modules)
 
 
 def iut_reset():
     # Wait a few seconds before resetting so that all settings are stored on the flash
     # Some models save from a callback that is triggered after a few seconds.
-    time.sleep(5)
+    cancellable_sleep(5)
     zephyrctl = btp.get_iut_method()
 
     zephyrctl.wait_iut_ready_event()
@@ -2070,7 +2072,7 @@ def hdl_wid_666(params: WIDParams):
     global sensor_value
     # Wait a few seconds before publishing a new state to satisfy a
     # requirement for Min Interval between published messages.
-    time.sleep(5)
+    cancellable_sleep(5)
 
     prop_id = int(re.findall(r'0x([0-9A-F]{2,})', params.description)[0], 16)
     sensor_value = int(0xffff / 2)
@@ -2091,7 +2093,7 @@ def hdl_wid_667(params: WIDParams):
     global sensor_value
     # Wait a few seconds before publishing a new state to satisfy a
     # requirement for Min Interval between published messages.
-    time.sleep(5)
+    cancellable_sleep(5)
 
     prop_id = int(re.findall(r'0x([0-9A-F]{2,})', params.description)[0], 16)
     if 'percent' in params.description:
@@ -2117,7 +2119,7 @@ def hdl_wid_668(params: WIDParams):
     global sensor_value
     # Wait a few seconds before publishing a new state to satisfy a
     # requirement for Min Interval between published messages.
-    time.sleep(5)
+    cancellable_sleep(5)
 
     prop_id = int(re.findall(r'0x([0-9A-F]{2,})', params.description)[0], 16)
     if 'percent' in params.description:
@@ -2144,7 +2146,7 @@ def hdl_wid_669(params: WIDParams):
     global sensor_value
     # Wait a few seconds before publishing a new state to satisfy a
     # requirement for Min Interval between published messages.
-    time.sleep(5)
+    cancellable_sleep(5)
 
     prop_id = int(re.findall(r'0x([0-9A-F]{2,})', params.description)[0], 16)
     if 'percent' in params.description:
@@ -2166,7 +2168,7 @@ def hdl_wid_670(params: WIDParams):
     global sensor_value
     # Wait a few seconds before publishing a new state to satisfy a
     # requirement for Min Interval between published messages.
-    time.sleep(5)
+    cancellable_sleep(5)
 
     prop_id = int(re.findall(r'0x([0-9A-F]{2,})', params.description)[0], 16)
     if 'percent' in params.description:
@@ -2202,7 +2204,7 @@ def hdl_wid_850(params: WIDParams):
 
     btp.mmdl_blob_info_get(addr)
 
-    time.sleep(5)
+    cancellable_sleep(5)
 
     btp.mmdl_blob_transfer_start(blob_id, block_size, chunk_size, timeout_base, ttl, blob_data_size)
 
@@ -2224,7 +2226,7 @@ def hdl_wid_851(_: WIDParams):
 
     btp.mmdl_blob_info_get(addr)
 
-    time.sleep(5)
+    cancellable_sleep(5)
 
     btp.mmdl_blob_transfer_start(blob_id, block_size, chunk_size, timeout_base, ttl, blob_data_size)
 
@@ -2238,8 +2240,8 @@ def hdl_wid_852(params: WIDParams):
     stack = get_stack()
 
     to_rx = int(re.findall(r'0x([0-9A-F]{2,})', params.description)[0], 16)
-    # Give some time so last mesh_model_recv_ev's are processed
-    time.sleep(5)
+    # Wait for the last mesh_model_recv_ev's to be processed
+    wait_for_event(5, lambda: stack.mesh.blob_rxed_bytes == to_rx)
 
     return stack.mesh.blob_rxed_bytes == to_rx
 
@@ -2268,7 +2270,7 @@ def hdl_wid_855(_: WIDParams):
     Please query the state of BLOB transfer by sending Lower Tester BLOB_TRANSFER_GET message.
     """
     btp.mmdl_blob_info_get(["0001"])
-    time.sleep(5)
+    cancellable_sleep(5)
     btp.mmdl_blob_transfer_get()
     return True
 
@@ -2285,7 +2287,7 @@ def hdl_wid_856(params: WIDParams):
     blob_data_size = 80
 
     btp.mmdl_blob_info_get(addrs)
-    time.sleep(5)
+    cancellable_sleep(5)
     btp.mmdl_blob_transfer_start(blob_id, block_size, chunk_size, timeout_base, ttl, blob_data_size)
 
     return True
@@ -2379,7 +2381,7 @@ def hdl_wid_991(_: WIDParams):
     # Give some time so LT side can finish verifying image before calling apply
     # as IUT has to receive Firmware Update Status with
     # phase 0x04 Verification Succeeded first
-    time.sleep(20)
+    cancellable_sleep(20)
     btp.mmdl_dfu_update_firmware_apply()
     return True
 
@@ -23,14 +23,16 @@ from autopts.pybtp.btp.audio import pack_metadata
 from autopts.pybtp.types import CODEC_CONFIG_SETTINGS, WIDParams, create_lc3_ltvs_bytes, hex_str_to_le_bytes
 from autopts.wid.bap import BAS_CONFIG_SETTINGS
 from autopts.wid.common import _safe_bap_send
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def pbp_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{pbp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, pbp_wid_hdl.wid_hdl_modules)
 
 
 def hdl_wid_100(_: WIDParams):
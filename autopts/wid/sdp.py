@@ -14,18 +14,19 @@
 #
 
 import logging
-from time import sleep
 
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import WIDParams
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
 
+@wid_hdl_modules(__name__)
 def sdp_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{sdp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, sdp_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
@@ -75,10 +76,10 @@ def hdl_wid_102(params: WIDParams):
     global SDP_RECORD_HANDLE
 
     btp.gap_start_discovery(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    found = btp.gap_wait_for_discovery(10, addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discovery()
 
-    if not btp.check_discovery_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
+    if not found:
         return False
 
     btp.gap_connect(bd_addr_type=defs.BTP_BR_ADDRESS_TYPE)
@@ -19,7 +19,6 @@ import re
 from argparse import Namespace
 
 from autopts.ptsprojects.stack import get_stack
-from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp, defs
 from autopts.pybtp.btp.audio import pack_metadata
 from autopts.pybtp.btp.btp import lt2_addr_get, lt2_addr_type_get, pts_addr_get, pts_addr_type_get
@@ -35,6 +34,7 @@ from autopts.pybtp.types import (
 from autopts.wid.bap import BAS_CONFIG_SETTINGS, create_default_config, get_audio_locations_from_pac
 from autopts.wid.ccp import BT_TBS_GTBS_INDEX
 from autopts.wid.common import _safe_bap_send
+from autopts.wid.wid import wid_hdl_modules
 
 log = logging.debug
 
@@ -62,10 +62,11 @@ def trigger_discovery_if_needed(params):
         stack.vcp.wait_discovery_completed_ev(addr_type, addr, 10)
 
 
+@wid_hdl_modules(__name__)
 def tmap_wid_hdl(wid, description, test_case_name):
     from autopts.wid import generic_wid_hdl
     log(f'{tmap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, tmap_wid_hdl.wid_hdl_modules)
 
 
 # wid handlers section begin
@@ -894,9 +895,7 @@ def hdl_wid_20107(params: WIDParams):
         if ev is not None:
             return True
 
-    MMI.reset()
-    MMI.parse_description(params.description)
-    handle = MMI.args[0]
+    handle = params.mmi.args[0]
 
     btp.gattc_read(addr_type, addr, handle)
     btp.gattc_read_rsp()
@@ -1,23 +1,84 @@
 import importlib
 import logging
+import re
+import threading
+from collections import defaultdict
 
 from autopts.pybtp.types import MissingWIDError, WIDParams
+from autopts.utils import load_wid_report
 
 log = logging.debug
 
+WID_HDL_REGEX = re.compile(r'^hdl_wid_(\d+)$')
 
-def _generic_wid_hdl(wid, description, test_case_name, module_names):
-    wid_hdl = None
-    wid_str = f'hdl_wid_{wid}'
+# (module names) -> {wid: handler}, built once per module list
+_wid_registry = {}
+_wid_registry_lock = threading.Lock()
+
+
+def wid_hdl_modules(*module_names, overrides=None):
+    """Declares the modules of the hdl_wid_<N> handlers the decorated
+    profile WID handler, e.g. gatt_wid_hdl, dispatches to. The first
+    module has the highest priority. overrides maps a test case name
+    prefix to the modules of its test cases, e.g. 'GATT/CL'.
+    """
+    def decorator(profile_wid_hdl):
+        profile_wid_hdl.wid_hdl_modules = module_names
+        profile_wid_hdl.wid_hdl_overrides = overrides or {}
+        return profile_wid_hdl
+
+    return decorator
+
+
+def get_declared_wid_hdl_modules(profile_wid_hdl, test_case_name):
+    """Returns the modules of the WID handlers declared by the profile
+    WID handler for the test case, None if not declared"""
+    for prefix, module_names in getattr(profile_wid_hdl, 'wid_hdl_overrides', {}).items():
+        if test_case_name.startswith(prefix):
+            return module_names
+
+    return getattr(profile_wid_hdl, 'wid_hdl_modules', None)
+
+
+def _module_wid_handlers(module_name):
+    module = importlib.import_module(module_name)
+    handlers = {}
 
-    for module_name in module_names:
-        module = importlib.import_module(module_name)
-        if hasattr(module, wid_str):
-            wid_hdl = getattr(module, wid_str)
-            break
+    for name, value in vars(module).items():
+        match = WID_HDL_REGEX.match(name)
+        if match and callable(value):
+            handlers[int(match.group(1))] = value
+
+    return handlers
+
+
+def get_wid_handlers(module_names):
+    """Returns {wid: handler} of the modules, the first module has the
+    highest priority, e.g. a zephyr override over the generic handler.
+    """
+    key = tuple(module_names)
+    registry = _wid_registry.get(key)
+    if registry is not None:
+        return registry
+
+    with _wid_registry_lock:
+        registry = _wid_registry.get(key)
+        if registry is None:
+            registry = {}
+            for module_name in reversed(key):
+                registry.update(_module_wid_handlers(module_name))
+
+            log(f'Registered {len(registry)} WID handlers of {key}')
+            _wid_registry[key] = registry
+
+    return registry
+
+
+def _generic_wid_hdl(wid, description, test_case_name, module_names):
+    wid_hdl = get_wid_handlers(module_names).get(wid)
 
     if wid_hdl is None:
-        raise MissingWIDError(f'No {wid_str} found!')
+        raise MissingWIDError(f'No hdl_wid_{wid} found!')
 
     return wid_hdl(WIDParams(wid, description, test_case_name))
 
@@ -26,3 +87,68 @@ def generic_wid_hdl(wid, description, test_case_name, module_names):
     response = _generic_wid_hdl(wid, description, test_case_name, module_names)
 
     return response
+
+
+def resolve_wid_hdl(profile_wid_hdl, wid, test_case_name):
+    """Returns the handler of the WID in the modules declared by the
+    profile WID handler, e.g. gatt_wid_hdl, None if there is no such
+    handler or no modules are declared. The profile WID handler is not
+    called.
+    """
+    module_names = get_declared_wid_hdl_modules(profile_wid_hdl, test_case_name)
+    if module_names is None:
+        return None
+
+    return get_wid_handlers(module_names).get(wid)
+
+
+def report_unhandled_wids(test_case_instances, test_case_names):
+    """Reports WIDs without handler before the test cases are run.
+
+    The WIDs expected by each test case are taken from the WID usage
+    report, see tools/wid_usage.py.
+
+    Returns {test case name: [unhandled wids]}
+    """
+    try:
+        wid_report = load_wid_report()
+    except (FileNotFoundError, RuntimeError) as e:
+        log(f'Unhandled WIDs not checked: {e}')
+        return {}
+
+    expected_wids = defaultdict(set)
+    for (_service, wid), test_cases in wid_report.items():
+        if not wid.isdigit():
+            continue
+        for test_case_name in test_cases:
+            expected_wids[test_case_name].add(int(wid))
+
+    test_case_names = set(test_case_names)
+    handled = defaultdict(set)
+    checked = set()
+
+    for instance in test_case_instances:
+        name = instance.name
+        if name not in test_case_names or name not in expected_wids or instance.generic_wid_hdl is None:
+            continue
+
+        module_names = get_declared_wid_hdl_modules(instance.generic_wid_hdl, name)
+        if module_names is None:
+            log(f'WID handler modules of {name} not declared, unhandled WIDs not checked')
+            continue
+
+        checked.add(name)
+        handlers = get_wid_handlers(module_names)
+        handled[name].update(wid for wid in expected_wids[name] if wid in handlers)
+
+    unhandled = {}
+    for name in sorted(checked):
+        missing = sorted(expected_wids[name] - handled[name])
+        if missing:
+            unhandled[name] = missing
+            logging.warning(f'{name}: no handler for WIDs {missing}')
+
+    if unhandled:
+        print(f"Test cases with unhandled WIDs: {len(unhandled)}, see the log for details")
+
+    return unhandled
@@ -57,6 +57,7 @@ from autopts.utils import (
     CounterWithFlag,
     active_hub_server_replug_usb,
     active_hub_server_set_usb_power,
+    archive_workspace_logs,
     exit_if_admin,
     get_global_end,
     print_thread_stack_trace,
@@ -105,25 +106,56 @@ def init_logging(_args):
         root_logger.addHandler(file_handler)
 
 
-class PtsClientProxy(xmlrpc.client.ServerProxy):
-    """TCP/IP socket for sending callbacks to the auto-pts client.
+class PtsClientProxy:
+    """TCP/IP sockets for sending callbacks to the auto-pts client.
+
+    Every calling thread keeps its own persistent (HTTP/1.1 keep-alive)
+    connection per lane. The WID and method result callbacks go through
+    the priority lane, so they never queue behind the log traffic.
+
     Args:
         client_address: IP address of the auto-pts client that started
          its own xmlrpc server to receive callback messages
 
         client_port: TCP port
     """
+    PRIORITY_LANE = 'priority'
+    LOG_LANE = 'log'
+
     def __init__(self, client_address, client_port):
-        super().__init__(uri=f"http://{client_address}:{client_port}/",
-                         allow_none=True, transport=None,
-                         encoding=None, verbose=False,
-                         use_datetime=False, use_builtin_types=False,
-                         headers=(), context=None)
+        self.uri = f"http://{client_address}:{client_port}/"
 
         log(f"{self.__init__.__name__}, uri={self.uri}")
 
         self.client_address = client_address
         self.client_port = client_port
+        self._lanes = threading.local()
+
+    def _get_lane(self, lane):
+        proxy = getattr(self._lanes, lane, None)
+        if proxy is None:
+            proxy = xmlrpc.client.ServerProxy(uri=self.uri,
+                                              allow_none=True, transport=None,
+                                              encoding=None, verbose=False,
+                                              use_datetime=False, use_builtin_types=False,
+                                              headers=(), context=None)
+            setattr(self._lanes, lane, proxy)
+
+        return proxy
+
+    def on_implicit_send(self, project_name, wid, test_case_name, description, style):
+        return self._get_lane(self.PRIORITY_LANE).on_implicit_send(
+            project_name, wid, test_case_name, description, style)
+
+    def set_result(self, method_name, result):
+        return self._get_lane(self.PRIORITY_LANE).set_result(method_name, result)
+
+    def log(self, log_type, logtype_string, log_time, log_message, test_case_name):
+        return self._get_lane(self.LOG_LANE).log(
+            log_type, logtype_string, log_time, log_message, test_case_name)
+
+    def log_batch(self, records, test_case_name):
+        return self._get_lane(self.LOG_LANE).log_batch(records, test_case_name)
 
 
 class PyPTSWithCallback(ptscontrol.PyPTS, threading.Thread):
@@ -536,6 +568,7 @@ class Server(threading.Thread, PTSProxy):
         self.server.register_function(self.list_workspace_tree, 'list_workspace_tree')
         self.server.register_function(self.copy_file, 'copy_file')
         self.server.register_function(self.delete_file, 'delete_file')
+        self.server.register_function(self.pull_workspace_logs, 'pull_workspace_logs')
         self.server.register_function(self.get_system_model, 'get_system_model')
         self.server.register_function(self.get_system_version, 'get_system_version')
         self.server.register_function(self.shutdown_pts_bpv, 'shutdown_pts_bpv')
@@ -611,6 +644,19 @@ class Server(threading.Thread, PTSProxy):
 
         return file_list
 
+    def pull_workspace_logs(self, workspace_dir, cursor=0.0, max_bytes=None):
+        """Returns a compressed archive of the workspace logs created or
+        modified since the cursor. The pulled logs are deleted."""
+        self._update_request_time()
+        if Path(workspace_dir).is_absolute():
+            logs_root = workspace_dir
+        else:
+            logs_root = get_workspace(workspace_dir)
+
+        result = archive_workspace_logs(logs_root, cursor, max_bytes)
+        result['archive'] = xmlrpc.client.Binary(result['archive'])
+        return result
+
     def copy_file(self, file_path):
         self._update_request_time()
         file_bin = None
@@ -27,13 +27,16 @@ from itertools import zip_longest
 from pathlib import Path
 
 from autopts.config import CLIENT_PORT, FILE_PATHS, MAX_SERVER_RESTART_TIME, SERIAL_BAUDRATE, SERVER_PORT
+from autopts.ptsprojects import ptstypes
 from autopts.ptsprojects.boards import com_to_tty, get_debugger_snr, get_free_device, get_tty, tty_exists
 from autopts.ptsprojects.testcase_db import DATABASE_FILE
+from autopts.pybtp.iutctl_common import DEFAULT_FATAL_LOG_PATTERNS
 from autopts.types import AutoPTSMode
 from autopts.utils import active_hub_server_replug_usb, get_tc_from_wid, load_wid_report, raise_on_global_end, ykush_replug_usb
 
 log = logging.debug
 IUT_MODES = ['tty', 'qemu', 'native', 'btpclient_path']
+PTS_LOG_TYPES = [name.removeprefix('PTS_LOGTYPE_').lower() for name in ptstypes.PTS_LOGTYPE_STRING]
 
 
 class SmartDefaultsMixin:
@@ -103,6 +106,12 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
                                "to running test case in PTS GUI using "
                                "'Run (Debug Logs)'")
 
+        self.add_argument("--pts-log-types", "--pts_log_types", nargs='+', default=None,
+                          type=str.lower, choices=PTS_LOG_TYPES,
+                          help="PTS log types forwarded from the autoptsserver to the client. "
+                               "By default only the test start/end, error and verdict logs "
+                               "are forwarded, or all of them with --debug-logs.")
+
         self.add_argument("-c", "--test-cases", nargs='+', default=[],
                           action="extend",
                           help="Names of test cases to run. Groups of "
@@ -130,12 +139,34 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
                                " the failure is regression, test case  will be retried for retry number of times. If"
                                " you set retry to zero, no failed test cases will be retried.")
 
+        self.add_argument("--adaptive_retry", action='store_true', default=False,
+                          help="Retry a failed test case only if its failure class, e.g. INCONC,"
+                               " PTS TIMEOUT, BTP TIMEOUT or an IUT assert, and its last results"
+                               " in the test case database suggest flakiness, and limit the"
+                               " recovery to the failed side. Retries stay limited by --retry.")
+
+        self.add_argument("--reuse_cached_pass", action='store_true', default=False,
+                          help="Do not run again the test cases that passed in their last run"
+                               " with the same IUT image, tester config, workspace, PTS version"
+                               " and autopts code, and report their cached PASS verdicts as"
+                               " such. Requires --store, which keeps the results.")
+
         self.add_argument("--repeat_until_fail", action='store_true', default=False,
                           help="Repeat test case until non-pass verdict")
 
         self.add_argument("--stress_test", action='store_true', default=False,
                           help="Repeat every test even if previous result was PASS")
 
+        self.add_argument("--repeat", type=int, default=0, metavar='COUNT',
+                          help="Run each test case COUNT times, whatever the verdicts, without"
+                               " retries, and summarize the verdicts, duration percentiles,"
+                               " failure signatures and flake score of the runs. With --store"
+                               " the runs are kept in the test case database.")
+
+        self.add_argument("--repeat_time", type=float, default=0, metavar='MINUTES',
+                          help="Repeat each test case for the given wall-clock time, at least"
+                               " once. With --repeat the repeats end at the first limit reached.")
+
         self.add_argument("-S", "--srv_port", type=int, nargs="+", default=[SERVER_PORT],
                           help="Specify the server port number. "
                           "If running with multiple servers(PTS dongles), "
@@ -161,10 +192,26 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
                           help="Specify at which statuses autoptsclient should "
                                "try to recover itself.")
 
+        self.add_argument("--skip_healthy_recovery", action='store_true', default=False,
+                          help="Skip the PTS recovery after an IUT failure, e.g. BTP TIMEOUT,"
+                               " if the PTS is ready, and the IUT USB replug after an XML-RPC"
+                               " ERROR, if no IUT fatal error was seen.")
+
         self.add_argument("--superguard", default=0, metavar='MINUTES', type=float,
                           help="Specify amount of time in minutes, after which"
                                " super guard will blindly trigger recovery steps.")
 
+        self.add_argument("--learned_superguard", action='store_true', default=False,
+                          help="Shorten the super guard time of each test case to its"
+                               " 99th percentile PASS duration from the test case"
+                               " database times a margin. Retries use the --superguard.")
+
+        self.add_argument("--fatal_log_patterns", nargs='*', metavar='REGEX',
+                          default=DEFAULT_FATAL_LOG_PATTERNS,
+                          help="Regular expressions of the IUT log lines, e.g. an assert,"
+                               " that end the test case immediately with the IUT FATAL"
+                               " ERROR status. Without a value only the BTP socket is watched.")
+
         self.add_argument("--ykush", metavar='YKUSH_PORT', type=str,
                           nargs="+", action="extend", default=None,
                           help="Specify ykush downstream port number, so on BTP TIMEOUT "
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of the assertion lookup over the IUT logs of a session.
+
+Builds a synthetic session directory of 5000 test case logs, every 10th
+with an assertion, and looks up the assertions of the failed test cases
+with a recursive glob per test case, like the bot did before, and with
+the AssertionIndex, e.g.:
+
+    python -m test.benchmark-assertion-index
+
+"""
+
+import glob
+import logging
+import os
+import tempfile
+import time
+
+from autopts.bot.zephyr import AssertionIndex
+
+NUM_LOGS = 5000
+FAIL_EVERY = 10
+LOG_LINES = 200
+# The glob lookup is too slow to look up all the failed test cases
+GLOB_LOOKUPS = 100
+
+
+def test_case_name(i):
+    return f"GAP/BENCH/BV-{i:04d}-C"
+
+
+def build_session(logs_dir):
+    session_dir = os.path.join(logs_dir, 'cli_port_65001', '2026_01_01_00_00_00')
+    line = "[00:00:01.000,000] <inf> bttester: BTP command received\n"
+
+    for i in range(NUM_LOGS):
+        name = test_case_name(i).replace('/', '_')
+        test_case_dir = os.path.join(session_dir, f'{name}_2026_01_01_00_00_00')
+        os.makedirs(test_case_dir)
+
+        lines = [line] * LOG_LINES
+        if i % FAIL_EVERY == 0:
+            lines[LOG_LINES // 2] = "ASSERTION FAIL [err == 0] @ WEST_TOPDIR/bt/host/conn.c:42\n"
+
+        with open(os.path.join(test_case_dir, f'{name}_iut0_iutctl.log'), 'w') as f:
+            f.writelines(lines)
+
+
+def glob_get_assertion_info(logs_dir, name):
+    pattern = name.replace('/', '_')
+    search_pattern = os.path.join(logs_dir, '**', f'{pattern}_*', f'{pattern}_*iutctl.log')
+
+    for log_file in glob.glob(search_pattern, recursive=True):
+        with open(log_file, encoding='utf-8') as f:
+            for line in f:
+                if 'ASSERTION' in line:
+                    return line.strip()
+
+    return None
+
+
+def bench(name, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{name:<45} {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+    return result
+
+
+if __name__ == '__main__':
+    # Do not measure the debug logs
+    logging.disable(logging.DEBUG)
+
+    failed = [test_case_name(i) for i in range(0, NUM_LOGS, FAIL_EVERY)]
+
+    with tempfile.TemporaryDirectory() as logs_dir:
+        build_session(logs_dir)
+        print(f"{NUM_LOGS} test case logs, {len(failed)} with an assertion:")
+
+        expected = bench(f"glob per test case, {GLOB_LOOKUPS} lookups",
+                         lambda: [glob_get_assertion_info(logs_dir, name) for name in failed[:GLOB_LOOKUPS]])
+
+        index = AssertionIndex(logs_dir)
+        bench("AssertionIndex backfill", index.update)
+        found = bench(f"AssertionIndex, {len(failed)} lookups", lambda: [index.get(name) for name in failed])
+        assert found[:GLOB_LOOKUPS] == expected
+        assert all(found)
+
+        # One test case more, as indexed by the bot between the test cases
+        new_dir = os.path.join(logs_dir, 'cli_port_65001', '2026_01_01_00_00_00',
+                               'GAP_BENCH_BV-9999-C_2026_01_01_00_00_01')
+        os.makedirs(new_dir)
+        bench("AssertionIndex incremental update", index.update)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Micro-benchmark of the BTP GATT response decoders.
+
+Decodes a Get Attributes response and a characteristic Discovery response
+of a 1000-attribute server database, e.g.:
+
+    python -m test.benchmark-gatt-decoders
+
+"""
+
+import logging
+import struct
+import timeit
+
+from autopts.pybtp.btp.gatt import dec_gatts_get_attrs_rp, gatt_dec_disc_rsp
+
+NUM_ATTRS = 1000
+REPEAT = 20
+
+
+def build_get_attrs_rp(num_attrs):
+    frame = bytearray(struct.pack('<B', num_attrs))
+    for hdl in range(1, num_attrs + 1):
+        uuid = struct.pack('<H', 0x2800 + hdl % 4) if hdl % 2 else bytes(range(16))
+        frame += struct.pack('<HBB', hdl, 0x01, len(uuid)) + uuid
+
+    return bytes(frame)
+
+
+def build_disc_chrc_rsp(num_attrs):
+    frame = bytearray(struct.pack('<B', num_attrs))
+    for hdl in range(1, num_attrs + 1):
+        uuid = struct.pack('<H', 0x2a00 + hdl % 64)
+        frame += struct.pack('<HHBB', hdl, hdl + 1, 0x02, len(uuid)) + uuid
+
+    return bytes(frame)
+
+
+def bench(name, fn):
+    best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+    print(f"{name:<40} {best * 1000:8.3f} ms")
+
+
+if __name__ == '__main__':
+    # Do not measure the debug logs
+    logging.disable(logging.DEBUG)
+
+    # 255 is the maximum attribute count of a single BTP response
+    attrs_rp = build_get_attrs_rp(255)
+    chrc_rsp = build_disc_chrc_rsp(255)
+    assert len(dec_gatts_get_attrs_rp(attrs_rp, len(attrs_rp))) == 255
+    assert len(gatt_dec_disc_rsp(chrc_rsp, "characteristic")) == 255
+
+    # Decode a whole 1000-attribute database in 255-attribute chunks,
+    # like gatts_get_attrs does for a big GATT/SR database.
+    chunks = [build_get_attrs_rp(min(255, NUM_ATTRS - i)) for i in range(0, NUM_ATTRS, 255)]
+    disc_chunks = [build_disc_chrc_rsp(min(255, NUM_ATTRS - i)) for i in range(0, NUM_ATTRS, 255)]
+
+    print(f"Decoding {NUM_ATTRS} attributes, best of {REPEAT}:")
+    bench("dec_gatts_get_attrs_rp", lambda: [dec_gatts_get_attrs_rp(c, len(c)) for c in chunks])
+    bench("gatt_dec_disc_rsp characteristic", lambda: [gatt_dec_disc_rsp(c, "characteristic")
+                                                      for c in disc_chunks])
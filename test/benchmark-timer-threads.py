@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of the threads created by the bounded waits of a test case.
+
+Runs the waits of a typical test case, the PTS callback results, the
+superguard wait of the lower testers and the BTP event waits, with a
+threading.Timer per wait, like before, and with the shared TimerService,
+e.g.:
+
+    python -m test.benchmark-timer-threads
+
+"""
+
+import logging
+import threading
+import time
+from unittest.mock import patch
+
+from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.utils import CounterWithFlag, ResultWithFlag
+
+TESTS = 20
+# Bounded waits of each kind per test case
+RESULT_WAITS = 100
+EVENT_WAITS = 100
+LT_COUNT = 2
+
+
+def thread_timer(delay, callback, *args):
+    timer = threading.Timer(delay, callback, args)
+    timer.start()
+
+    return timer
+
+
+def run_test():
+    for _ in range(RESULT_WAITS):
+        result = ResultWithFlag()
+        result.set(True)
+        result.get(timeout=10)
+
+    event_queue = [('ev', 1)]
+    for _ in range(EVENT_WAITS):
+        wait_event_with_condition(event_queue, lambda name, value: value == 1, 10, False)
+
+    # The superguard wait of the lower testers
+    finish_count = CounterWithFlag(init_count=0)
+    finish_count.add(LT_COUNT)
+    finish_count.wait_for(LT_COUNT, timeout=600)
+
+
+def bench(name):
+    started = 0
+    thread_start = threading.Thread.start
+
+    def counting_start(thread):
+        nonlocal started
+        started += 1
+        thread_start(thread)
+
+    with patch.object(threading.Thread, 'start', counting_start):
+        start = time.perf_counter()
+        for _ in range(TESTS):
+            run_test()
+        duration = time.perf_counter() - start
+
+    print(f"{name:<25} {started / TESTS:8.1f} threads/test {duration * 1000 / TESTS:8.2f} ms/test")
+
+
+if __name__ == '__main__':
+    # Do not measure the debug logs
+    logging.disable(logging.DEBUG)
+
+    print(f"{TESTS} test cases of {RESULT_WAITS + EVENT_WAITS + 1} bounded waits:")
+
+    with patch('autopts.utils.call_later', thread_timer), \
+            patch('autopts.ptsprojects.stack.common.call_later', thread_timer):
+        bench("threading.Timer per wait")
+
+    bench("TimerService")
@@ -136,9 +136,9 @@ if __name__ == '__main__':
     for item in descriptions:
         description, args = item
         print(f"\nParsing: {description!r}\nExpecting: {args!r}")
-        MMI.parse_description(description)
-        print("Got:", 5 * " ", MMI.args)
-        assert args == MMI.args, (
-            f"Error parsing description found={MMI.args!r}, expected={args!r}"
+        parsed_args = list(MMI.parse_description(description).args)
+        print("Got:", 5 * " ", parsed_args)
+        assert args == parsed_args, (
+            f"Error parsing description found={parsed_args!r}, expected={args!r}"
         )
         print("OK")
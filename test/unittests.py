@@ -13,25 +13,92 @@
 # more details.
 #
 
+import ast
+import importlib
+import io
 import os
+import queue
 import shutil
 import struct
 import sys
+import threading
+import time
 import unittest
+import zipfile
+from argparse import Namespace
+from contextlib import contextmanager
 from os.path import abspath, dirname
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
-from autopts.bot.common_features import report
-from autopts.client import FakeProxy, TestCaseRunStats
+from autopts.bot.common import schedule_quarantine
+from autopts.bot.common_features import report, run_journal
+from autopts.bot.zephyr import AssertionIndex
+from autopts.client import (
+    LT_JOB_POST_RUN,
+    LT_JOB_RUNNING,
+    FakeProxy,
+    LTJob,
+    TestCaseRunStats,
+    get_adaptive_retry,
+    get_failure_signature,
+    get_formatted_flakiness,
+    get_formatted_slowest_wids,
+    get_learned_superguards,
+    get_lt_thread,
+    run_recovery,
+    run_test_cases,
+    stop_lt_threads,
+)
 from autopts.config import FILE_PATHS
+from autopts.ptsprojects.result_cache import ResultCacheInputs
+from autopts.ptsprojects.stack.layers.core import CORE
+from autopts.ptsprojects.stack.layers.gap import Gap
+from autopts.ptsprojects.stack.layers.gatt import Gatt
+from autopts.ptsprojects.testcase import MMI, TestCase, TestFunc, WidTiming
 from autopts.ptsprojects.testcase_db import TestCaseTable
-from autopts.pybtp import defs
+from autopts.ptsprojects.zephyr import micp_wid, sm_wid
+from autopts.ptsreplay import PTSReplay, load_recordings_from_logs
+from autopts.pybtp import defs, supported_cmds_cache
+from autopts.pybtp.btp import gap as btp_gap
+from autopts.pybtp.btp import gatt as btp_gatt
 from autopts.pybtp.btp.audio import pack_metadata
 from autopts.pybtp.btp.gap import gap_set_uuid16_svc_data
-from autopts.pybtp.types import AdType
+from autopts.pybtp.btp.gatt import dec_gatts_get_attr_val, dec_gatts_get_attrs_rp, gatt_dec_disc_rsp
+from autopts.pybtp.iutctl_common import (
+    BTP_SOCKET_CLOSED,
+    DEFAULT_FATAL_LOG_PATTERNS,
+    IUT_FATAL_ERROR,
+    BTPWorker,
+    IutWatcher,
+    set_fatal_error_handler,
+)
+from autopts.pybtp.parser import dec_hdr
+from autopts.pybtp.supported_cmds_cache import (
+    CACHE_FILE_NAME,
+    MAX_IMAGES,
+    SupportedCmdsCache,
+    get_cache_file,
+    image_fingerprint,
+    set_supported_cmds_cache_file,
+)
+from autopts.pybtp.types import AdType, BTPError, WIDParams
+from autopts.types import AutoPTSMode
+from autopts.utils import (
+    CancellationToken,
+    Cancelled,
+    CounterWithFlag,
+    ResultWithFlag,
+    TimerService,
+    archive_workspace_logs,
+    cancellable_sleep,
+    set_cancel_token,
+)
+from autopts.wid import gap as gap_wid
+from autopts.wid import mesh, micp, sm
+from autopts.wid.wid import get_wid_handlers, resolve_wid_hdl
 from autoptsclient_bot import import_bot_module, import_bot_projects
 from test.mocks.mocked_test_cases import (
     mock_workspace_test_cases,
@@ -40,6 +107,54 @@ from test.mocks.mocked_test_cases import (
 
 DATABASE_FILE = 'test/mocks/zephyr_database.db'
 
+# Fixed delays in autopts/wid that do not stand in for any BTP event or
+# layer state. Any other sleep should wait for the event it stands in for.
+WID_SLEEP_ALLOWLIST = {
+    ('gatt', 'hdl_wid_92'): 'PTS CCC write is not reported over BTP',
+    ('gatt', 'hdl_wid_97'): 'ATT transaction timeout of PTS',
+    ('gatt', 'hdl_wid_98'): 'PTS CCC write is not reported over BTP',
+    ('l2cap', 'hdl_wid_49'): 'PTS setup after ACL connection',
+    ('l2cap', 'hdl_wid_57'): 'data sent at an interval',
+    ('l2cap', 'hdl_wid_103'): 'PTS setup before reconfiguration',
+    ('l2cap', 'hdl_wid_262'): 'data sent at an interval',
+    ('mesh', 'hdl_wid_104'): 'PTS proxy setup after connection',
+    ('mesh', 'hdl_wid_218'): 'IV Update procedure timer',
+    ('mesh', 'hdl_wid_347'): 'Friend Subscription List Confirm is not reported over BTP',
+    ('mesh', 'hdl_wid_521'): 'Node Identity advertising period',
+    ('mesh', 'hdl_wid_702'): 'PTS setup before scan start',
+    ('mesh', 'hdl_wid_705'): 'PTS setup before link get',
+    ('mmdl', 'iut_reset'): 'IUT stores settings from a delayed callback',
+    ('mmdl', 'hdl_wid_666'): 'Sensor Status Min Interval',
+    ('mmdl', 'hdl_wid_667'): 'Sensor Status Min Interval',
+    ('mmdl', 'hdl_wid_668'): 'Sensor Status Min Interval',
+    ('mmdl', 'hdl_wid_669'): 'Sensor Status Min Interval',
+    ('mmdl', 'hdl_wid_670'): 'Sensor Status Min Interval',
+    ('mmdl', 'hdl_wid_850'): 'BLOB Information Status is not reported over BTP',
+    ('mmdl', 'hdl_wid_851'): 'BLOB Information Status is not reported over BTP',
+    ('mmdl', 'hdl_wid_855'): 'BLOB Information Status is not reported over BTP',
+    ('mmdl', 'hdl_wid_856'): 'BLOB Information Status is not reported over BTP',
+    ('mmdl', 'hdl_wid_991'): 'LT verifies the image before apply',
+}
+
+
+def find_sleep_calls(path):
+    """Returns the names of the functions of the module calling sleep()"""
+    tree = ast.parse(Path(path).read_text(), filename=str(path))
+    callers = set()
+
+    for func in ast.walk(tree):
+        if not isinstance(func, ast.FunctionDef):
+            continue
+
+        for node in ast.walk(func):
+            if not isinstance(node, ast.Call):
+                continue
+            name = node.func.id if isinstance(node.func, ast.Name) else getattr(node.func, 'attr', None)
+            if name in ('sleep', 'cancellable_sleep'):
+                callers.add(func.name)
+
+    return callers
+
 
 def delete_file(file_path):
     try:
@@ -51,6 +166,19 @@ def delete_file(file_path):
         pass
 
 
+@contextmanager
+def temp_test_case_db(name):
+    """Yields a new test case database, deleted at exit"""
+    database_file = f'test/mocks/{name}.db'
+    delete_file(database_file)
+    db = TestCaseTable('zephyr', database_file)
+    try:
+        yield db
+    finally:
+        db.close()
+        delete_file(database_file)
+
+
 class MyTestCase(unittest.TestCase):
     def setUp(self):
         os.chdir(dirname(dirname(abspath(__file__))))
@@ -275,6 +403,818 @@ class MyTestCase(unittest.TestCase):
                                 results, regressions, progresses, new_cases)
         assert os.path.exists(FILE_PATHS['REPORT_DIFF_TXT_FILE'])
 
+    def test_wid_latencies(self):
+        test_case = TestCase('GAP', 'GAP/DISC/GENM/BV-01-C', generic_wid_hdl=lambda *_: True)
+        test_case.get_iut = MagicMock()
+        test_case.reset()
+        test_case.on_implicit_send('GAP', 14, test_case.name, 'Description', 0x11141)
+        with patch('autopts.ptsprojects.testcase.get_stack', return_value=MagicMock(synch=None)):
+            assert test_case.run_next_step() == 'OK'
+        assert [timing.wid for timing in test_case.wid_timings] == [14]
+
+        with temp_test_case_db('wid_latency') as db:
+            stats = TestCaseRunStats(['GAP'], [test_case.name], 0, db,
+                                     xml_results_file=FILE_PATHS['ALL_STATS_RESULTS_XML_FILE'])
+            for _ in range(2):
+                stats.update_wid_latencies([WidTiming('GAP', 14, 0.3, 0.2), WidTiming('GAP', 4, 12.0, 11.5)])
+
+            # Histograms of the run and of all runs in the database
+            for histograms in (stats.wid_latencies, db.get_wid_latencies()):
+                assert histograms[('GAP', 4, 'response')].count == 2
+                assert histograms[('GAP', 4, 'handler')].mean() == 11.5
+                assert histograms[('GAP', 14, 'response')].percentile(95) == 0.5
+
+            rows = get_formatted_slowest_wids(stats.wid_latencies).splitlines()
+            assert rows[1].split() == ['GAP', '4', '2', '12.00', '30.00', '11.50', '30.00']
+            assert rows[2].split()[:2] == ['GAP', '14']
+
+    def test_get_many(self):
+        with temp_test_case_db('get_many') as db:
+            db.update_statistics('GAP/A', 10, 'PASS')
+            db.update_statistics('GAP/A', 20, 'PASS')
+            db.update_statistics('GAP/B', 30, 'FAIL')
+            names = ['GAP/A', 'GAP/B', 'GAP/NEW', 'GAP/A']
+
+            assert db.get_many(names) == {'GAP/A': (15, 'PASS'), 'GAP/B': (30, 'FAIL')}
+            assert db.get_many([]) == {}
+
+            # The estimation of the per test case queries
+            duration = 0
+            count_unknown = 0
+            for name in names:
+                mean_time = db.get_mean_duration(name)
+                if mean_time is None:
+                    count_unknown += 1
+                    continue
+                duration += mean_time * (3 if db.get_result(name) != 'PASS' else 1)
+            duration += count_unknown * duration // (len(names) - count_unknown)
+
+            assert db.estimate_session_duration(names, 3) == duration == 160
+
+    def test_learned_superguards(self):
+        with temp_test_case_db('learned_superguard') as db:
+            for duration in range(10, 70, 10):
+                db.update_statistics('GAP/BROB/BCST/BV-01-C', duration, 'PASS')
+            db.update_statistics('GAP/BROB/BCST/BV-01-C', 900, 'SUPERGUARD TIMEOUT')
+            db.update_statistics('GAP/BROB/BCST/BV-02-C', 20, 'PASS')
+
+            assert db.get_duration_percentiles(['GAP/BROB/BCST/BV-01-C', 'GAP/BROB/BCST/BV-02-C'], 99) == \
+                {'GAP/BROB/BCST/BV-01-C': 60}
+
+            stats = MagicMock(db=db)
+            args = Namespace(learned_superguard=True, superguard=900)
+            assert get_learned_superguards(args, stats, ['GAP/BROB/BCST/BV-01-C']) == {'GAP/BROB/BCST/BV-01-C': 180}
+            args.superguard = 150
+            assert get_learned_superguards(args, stats, ['GAP/BROB/BCST/BV-01-C']) == {'GAP/BROB/BCST/BV-01-C': 150}
+            args.learned_superguard = False
+            assert get_learned_superguards(args, stats, ['GAP/BROB/BCST/BV-01-C']) == {}
+
+    def test_quarantine(self):
+        with temp_test_case_db('quarantine') as db:
+            db.update_statistics('GAP/A', 10, 'PASS')
+            for result in ('PASS', 'FAIL', 'PASS'):
+                db.update_statistics('GAP/B', 10, result)
+            for result in ('FAIL', 'INCONC', 'FAIL'):
+                db.update_statistics('GAP/C', 10, result)
+            # Failed and passed at a retry
+            db.update_quarantine('GAP/D', 'FAIL')
+            db.update_statistics('GAP/D', 10, 'PASS')
+            assert db.get_quarantine() == {'GAP/B': 'flaky', 'GAP/C': 'failing', 'GAP/D': 'flaky'}
+
+            # Released after 3 passes in a row
+            db.update_statistics('GAP/B', 10, 'PASS')
+            assert 'GAP/B' in db.get_quarantine()
+            db.update_statistics('GAP/B', 10, 'PASS')
+            assert 'GAP/B' not in db.get_quarantine()
+
+            # A failing test case that passed is flaky
+            db.update_statistics('GAP/C', 10, 'PASS')
+            assert db.get_quarantine()['GAP/C'] == 'flaky'
+
+            # The quarantine of a database without one is seeded from its history
+            quarantine = db.get_quarantine()
+            with db.lock, db.conn:
+                db.cursor.execute("DROP TABLE zephyr_quarantine;")
+            seeded_db = TestCaseTable('zephyr', db.database_file)
+            try:
+                assert seeded_db.get_quarantine() == {name: state for name, state in quarantine.items()
+                                                      if name != 'GAP/D'}
+            finally:
+                seeded_db.close()
+
+        run_config = [{'config_file': 'a.conf', 'iut_map': {}, 'test_cases': ['GAP/A', 'GAP/B', 'GAP/C']},
+                      {'config_file': 'b.conf', 'iut_map': {}, 'test_cases': ['GAP/E', 'GAP/F']}]
+        schedule = schedule_quarantine(run_config, {'GAP/B': 'flaky', 'GAP/C': 'failing', 'GAP/F': 'flaky'},
+                                       {'flaky_retry': 5})
+        assert [(e['config_file'], e['phase'], e['test_cases'], e.get('retry')) for e in schedule] == [
+            ('a.conf', None, ['GAP/A'], None),
+            ('b.conf', None, ['GAP/E'], None),
+            ('a.conf', 'flaky', ['GAP/B'], 5),
+            ('b.conf', 'flaky', ['GAP/F'], 5),
+            ('a.conf', 'failing', ['GAP/C'], None),
+        ]
+
+    def test_quarantine_retries(self):
+        xml_results_file = 'test/mocks/quarantine_retries.xml'
+        delete_file(xml_results_file)
+        test_cases = ['GAP/FAIL', 'GAP/FLAKY']
+        results = {'GAP/FAIL': ['FAIL', 'FAIL', 'FAIL'], 'GAP/FLAKY': ['INCONC', 'PASS']}
+
+        def run_test_case(ptses, test_case_instances, test_case, stats, *args):
+            return results[test_case].pop(0), 1
+
+        args = Namespace(test_cases=test_cases, retry=2, superguard=0, autopts_mode=None, recovery=False,
+                         stress_test=False, no_retry_on_regression=False, cli_port=[65001])
+        with temp_test_case_db('quarantine_retries') as db:
+            try:
+                with patch('autopts.client.run_test_case', run_test_case), \
+                        patch('autopts.client.report_unhandled_wids'), \
+                        patch('autopts.client.get_result_cache_inputs', return_value=None):
+                    stats = TestCaseRunStats(['GAP'], test_cases, args.retry, db, xml_results_file=xml_results_file)
+                    stats.session_log_dir = 'test/mocks'
+                    run_test_cases([], [], args, stats)
+
+                assert results == {'GAP/FAIL': [], 'GAP/FLAKY': []}
+                # A test run fails at most once in a row, whatever its retries
+                assert db.get_quarantine() == {'GAP/FAIL': 'flaky', 'GAP/FLAKY': 'flaky'}
+                with db.lock:
+                    db.cursor.execute("SELECT name, passes, fails FROM zephyr_quarantine ORDER BY name;")
+                    assert db.cursor.fetchall() == [('GAP/FAIL', 0, 1), ('GAP/FLAKY', 1, 0)]
+            finally:
+                delete_file(xml_results_file)
+
+    def test_adaptive_retry(self):
+        with temp_test_case_db('adaptive_retry') as db:
+            for result in ('PASS', 'FAIL', 'FAIL'):
+                db.update_statistics('GAP/FLAKY/BV-01-C', 10, result)
+            for result in ('FAIL', 'FAIL', 'INCONC', 'FAIL'):
+                db.update_statistics('GAP/BROKEN/BV-01-C', 10, result)
+
+            histories = db.get_result_histories(['GAP/FLAKY/BV-01-C', 'GAP/BROKEN/BV-01-C', 'GAP/NEW/BV-01-C'], 3)
+            assert histories == {'GAP/FLAKY/BV-01-C': ['PASS', 'FAIL', 'FAIL'],
+                                 'GAP/BROKEN/BV-01-C': ['FAIL', 'INCONC', 'FAIL']}
+            flaky = histories['GAP/FLAKY/BV-01-C']
+            broken = histories['GAP/BROKEN/BV-01-C']
+
+            # Deterministic failures are retried only with a PASS in the history
+            assert get_adaptive_retry('FAIL', flaky)[0]
+            assert not get_adaptive_retry('FAIL', broken)[0]
+            assert get_adaptive_retry('FAIL', [])[0]
+            assert not get_adaptive_retry('IUT FATAL ERROR', broken)[0]
+
+            # Transient failures need a long enough failing history to be skipped
+            assert get_adaptive_retry('INCONC', broken[:2])[0]
+            assert not get_adaptive_retry('BTP TIMEOUT', broken)[0]
+            assert get_adaptive_retry('PTS TIMEOUT', flaky)[0]
+
+            assert not get_adaptive_retry('NOT_IMPLEMENTED', [])[0]
+            assert not get_adaptive_retry('LT2_NOT_AVAILABLE', [])[0]
+
+    def test_repeat_runs(self):
+        with temp_test_case_db('repeat_runs') as db:
+            assert get_failure_signature('PASS') == ''
+            assert get_failure_signature('BTP TIMEOUT') == 'BTP TIMEOUT'
+            signature = get_failure_signature('IUT FATAL ERROR', 'ASSERTION FAIL @ conn.c:42 0xdead')
+            assert signature == 'IUT FATAL ERROR: ASSERTION FAIL @ conn.c:N N'
+            assert get_failure_signature('FAIL', exception_msg='\nBTPError: rsp 3\n') == 'FAIL: BTPError: rsp N'
+
+            for result, duration in (('PASS', 10), ('PASS', 12), ('FAIL', 30), ('PASS', 11)):
+                db.add_repeat_run('run_1', 'GAP/CONN/BV-01-C', result, duration, get_failure_signature(result))
+            db.add_repeat_run('run_1', 'GAP/CONN/BV-02-C', 'PASS', 5)
+            db.add_repeat_run('run_2', 'GAP/CONN/BV-02-C', 'INCONC', 5, 'INCONC')
+
+            repeats = db.get_repeat_runs('run_1')
+            flaky = repeats['GAP/CONN/BV-01-C']
+            assert flaky.count == 4
+            assert flaky.verdicts == {'PASS': 3, 'FAIL': 1}
+            assert flaky.flake_score() == 0.5
+            assert flaky.percentile(50) == 11
+            assert flaky.percentile(95) == 30
+            assert flaky.signatures == {'FAIL': 1}
+            assert repeats['GAP/CONN/BV-02-C'].flake_score() == 0
+            assert db.get_repeat_runs()['GAP/CONN/BV-02-C'].flake_score() == 1
+
+            table = get_formatted_flakiness(repeats).splitlines()
+            assert table[1].startswith('GAP/CONN/BV-01-C  4     PASS:3 FAIL:1')
+            assert table[1].endswith('0.50   FAIL')
+
+    def test_result_cache(self):
+        image_file = 'test/mocks/result_cache_image.bin'
+        code_root = 'test/mocks/result_cache_code'
+        shutil.rmtree(code_root, ignore_errors=True)
+        args = Namespace(workspace='zephyr-master', iut_config_file='prj.conf')
+        with temp_test_case_db('result_cache') as db:
+            try:
+                Path(image_file).write_bytes(b'image 1')
+                iut = Namespace(image_file=image_file)
+                os.makedirs(os.path.join(code_root, 'wid'))
+                os.makedirs(os.path.join(code_root, 'pybtp', 'btp'))
+                Path(code_root, 'wid', 'cap.py').write_text('from autopts.pybtp.btp import audio\n')
+                Path(code_root, 'pybtp', 'btp', 'audio.py').write_text('CONTEXT = 1\n')
+
+                assert ResultCacheInputs(args, iut, pts_version=None).digest('GAP/CONN/BV-01-C') is None
+                assert ResultCacheInputs(args, None, '8.5').digest('GAP/CONN/BV-01-C') is None
+
+                inputs = ResultCacheInputs(args, iut, '8.5', code_root)
+                digest = inputs.digest('CAP/INI/BV-01-C')
+                assert digest == ResultCacheInputs(args, iut, '8.5', code_root).digest('CAP/INI/BV-01-C')
+                assert digest != inputs.digest('CAP/INI/BV-02-C')
+                assert digest != ResultCacheInputs(args, iut, '8.6', code_root).digest('CAP/INI/BV-01-C')
+                args.iut_config_file = 'overlay.conf'
+                assert digest != ResultCacheInputs(args, iut, '8.5', code_root).digest('CAP/INI/BV-01-C')
+                args.iut_config_file = 'prj.conf'
+
+                # A change to a module shared by the profiles changes the inputs
+                Path(code_root, 'pybtp', 'btp', 'audio.py').write_text('CONTEXT = 2\n')
+                assert digest != ResultCacheInputs(args, iut, '8.5', code_root).digest('CAP/INI/BV-01-C')
+                Path(code_root, 'pybtp', 'btp', 'audio.py').write_text('CONTEXT = 1\n')
+
+                db.set_cached_result('CAP/INI/BV-01-C', digest, 'PASS', 12.5)
+                assert db.get_cached_result('CAP/INI/BV-01-C', digest) == ('PASS', 12.5)
+                db.set_cached_result('CAP/INI/BV-01-C', digest, 'FAIL', 3)
+                assert db.get_cached_result('CAP/INI/BV-01-C', digest) == ('FAIL', 3)
+
+                # A new image of the same size changes the inputs
+                Path(image_file).write_bytes(b'image 2')
+                os.utime(image_file, ns=(1, 1))
+                new_digest = ResultCacheInputs(args, iut, '8.5', code_root).digest('CAP/INI/BV-01-C')
+                assert new_digest != digest
+                assert db.get_cached_result('CAP/INI/BV-01-C', new_digest) is None
+            finally:
+                delete_file(image_file)
+                shutil.rmtree(code_root, ignore_errors=True)
+
+    def test_iut_watcher(self):
+        fatal_errors = []
+        set_fatal_error_handler(fatal_errors.append)
+        watcher = IutWatcher(DEFAULT_FATAL_LOG_PATTERNS, context_lines=2)
+        try:
+            # Not armed between the test cases
+            watcher.feed('rtt', b'ASSERTION FAIL [0] @ WEST_TOPDIR/a.c:1\n')
+            watcher.report(BTP_SOCKET_CLOSED, 'closed')
+            assert not fatal_errors
+
+            watcher.arm()
+            watcher.feed('rtt', b'[00:00:01.000,000] <inf> bttester: Ready\r\n[00:00:02')
+            watcher.feed('net', 'net line\n')
+            watcher.feed('rtt', '.000,000] <err> os: ASSERTION FAIL [err == 0] @ WEST_TOPDIR/b.c:42\n')
+            watcher.feed('rtt', b'\tbacktrace\n>>> ZEPHYR FATAL ERROR 4\nafter\n')
+            watcher.report(BTP_SOCKET_CLOSED, 'closed')
+
+            assert len(fatal_errors) == 1
+            assert fatal_errors[0].status == IUT_FATAL_ERROR
+            assert fatal_errors[0].reason == \
+                '[00:00:02.000,000] <err> os: ASSERTION FAIL [err == 0] @ WEST_TOPDIR/b.c:42'
+            assert fatal_errors[0].context == ['net line', fatal_errors[0].reason,
+                                               '\tbacktrace', '>>> ZEPHYR FATAL ERROR 4']
+
+            watcher.arm()
+            watcher.report(BTP_SOCKET_CLOSED, 'closed')
+            assert fatal_errors[1] == (BTP_SOCKET_CLOSED, 'closed', [])
+        finally:
+            set_fatal_error_handler(None)
+
+    def test_cancellation_token(self):
+        token = CancellationToken()
+        cancelled = []
+
+        def wait(wait_point):
+            set_cancel_token(token)
+            try:
+                wait_point()
+            except Cancelled:
+                cancelled.append(time.monotonic())
+
+        wait_points = (ResultWithFlag().get, BTPWorker(None).read, lambda: cancellable_sleep(30))
+        threads = [threading.Thread(target=wait, args=(wait_point,)) for wait_point in wait_points]
+        for thread in threads:
+            thread.start()
+
+        time.sleep(0.1)
+        start = time.monotonic()
+        token.cancel()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(cancelled) == len(wait_points)
+        assert max(cancelled) - start < 0.5
+
+        # No token, no cancellation
+        cancellable_sleep(0)
+
+    def test_timer_service(self):
+        service = TimerService()
+        fired = []
+        done = threading.Event()
+
+        service.call_later(0.2, fired.append, 'late')
+        service.call_later(0.2, done.set)
+        cancelled = service.call_later(0.05, fired.append, 'cancelled')
+        # Earlier than the timer the service thread sleeps for
+        service.call_later(0.01, fired.append, 'early')
+        cancelled.cancel()
+
+        assert done.wait(5)
+        assert fired == ['early', 'late']
+
+    def test_supported_cmds_cache(self):
+        cache_file = 'test/mocks/supported_cmds_cache.json'
+        image_file = 'test/mocks/zephyr.elf'
+        delete_file(cache_file)
+        try:
+            Path(image_file).write_bytes(b'image 1')
+            fingerprint = image_fingerprint(image_file)
+            assert fingerprint == image_fingerprint(image_file)
+            assert image_fingerprint('test/mocks/no_such.elf') is None
+
+            cache = SupportedCmdsCache(cache_file)
+            cache.verify(fingerprint, 0b111)
+            assert cache.get_commands(fingerprint, 'GAP') is None
+            cache.set_commands(fingerprint, 'GAP', 0xfffe)
+
+            # Read back by the next run
+            cache = SupportedCmdsCache(cache_file)
+            cache.verify(fingerprint, 0b111)
+            assert cache.get_commands(fingerprint, 'GAP') == 0xfffe
+
+            # Other services reported, the commands are fetched again
+            cache.verify(fingerprint, 0b101)
+            assert cache.get_commands(fingerprint, 'GAP') is None
+
+            # A rebuilt image
+            Path(image_file).write_bytes(b'image 2')
+            os.utime(image_file, ns=(0, 1))
+            assert image_fingerprint(image_file) != fingerprint
+
+            # The least recently used images are dropped
+            cache.set_commands(fingerprint, 'GAP', 0xfffe)
+            for i in range(MAX_IMAGES - 1):
+                cache.verify(f'image {i}', 0b1)
+            cache.verify(fingerprint, 0b101)
+            cache.verify('image 15', 0b1)
+            cache = SupportedCmdsCache(cache_file)
+            assert cache.get_commands(fingerprint, 'GAP') == 0xfffe
+            assert 'image 0' not in cache._images
+        finally:
+            delete_file(cache_file)
+            delete_file(image_file)
+
+    def test_supported_cmds_cache_sessions(self):
+        btp = importlib.import_module('autopts.pybtp.btp.btp')
+        database_dir = 'test/mocks/supported_cmds_db'
+        database_file = os.path.join(database_dir, 'TestCase.db')
+        delete_file(database_dir)
+
+        def read():
+            op = iutctl.btp_socket.send.call_args.args[1]
+            if op == defs.BTP_CORE_CMD_READ_SUPPORTED_SERVICES:
+                return dec_hdr(struct.pack('<BBBH', defs.BTP_SERVICE_ID_CORE, op, 0, 1)), (b'\x07',)
+            return dec_hdr(struct.pack('<BBBH', defs.BTP_SERVICE_ID_GAP, op, 0, 2)), (b'\xfe\xff',)
+
+        iutctl = MagicMock(image_fingerprint='c0ffee')
+        iutctl.btp_socket.read.side_effect = read
+
+        try:
+            # Every client session is a new process, with the cache file
+            # of its test case database
+            for session in range(2):
+                stack = MagicMock(supported_cmds={})
+                iutctl.btp_socket.send.reset_mock()
+                with patch.object(supported_cmds_cache, '_cache', None), \
+                        patch.object(btp, 'get_iut', return_value=iutctl), \
+                        patch.object(btp, 'get_stack', return_value=stack):
+                    set_supported_cmds_cache_file(get_cache_file(database_file))
+                    btp.read_supp_svcs()
+                    btp.read_supported_commands('gap')
+
+                assert stack.supported_cmds == {'GAP': 0xfffe}
+                sent_ops = [c.args[1] for c in iutctl.btp_socket.send.call_args_list]
+                if session == 0:
+                    assert defs.BTP_GAP_CMD_READ_SUPPORTED_COMMANDS in sent_ops
+                else:
+                    assert sent_ops == [defs.BTP_CORE_CMD_READ_SUPPORTED_SERVICES]
+
+            # Not in the temporary directory moved away by the bot
+            assert os.path.isfile(os.path.join(database_dir, CACHE_FILE_NAME))
+        finally:
+            delete_file(database_dir)
+
+    def test_core_reg_svcs_pipelined(self):
+        # The package re-exports a btp name over its btp module
+        btp = importlib.import_module('autopts.pybtp.btp.btp')
+        sent = []
+        in_flight = 0
+        max_in_flight = 0
+
+        def send(svc_id, op, ctrl_index, data):
+            nonlocal in_flight, max_in_flight
+            sent.append(data)
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+
+        def read():
+            nonlocal in_flight
+            in_flight -= 1
+            if sent[-in_flight - 1] == defs.BTP_SERVICE_ID_ASCS:
+                return (defs.BTP_SERVICE_ID_CORE, defs.BTP_STATUS, defs.BTP_INDEX_NONE, 1), (b'\x01',)
+            return (defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_CMD_REGISTER_SERVICE, defs.BTP_INDEX_NONE, 0), (b'',)
+
+        iutctl = MagicMock()
+        iutctl.btp_socket.send.side_effect = send
+        iutctl.btp_socket.read.side_effect = read
+        stack = MagicMock()
+        stack.core = CORE()
+
+        with patch.object(btp, 'get_iut', return_value=iutctl), \
+                patch.object(btp, 'get_stack', return_value=stack), \
+                patch.object(btp, 'read_supported_commands') as read_supported_commands:
+            btp.core_reg_svcs('gap', 'pacs', 'bap')
+            assert sent == [defs.BTP_SERVICE_ID_GAP, defs.BTP_SERVICE_ID_PACS, defs.BTP_SERVICE_ID_BAP]
+            assert max_in_flight == btp.CORE_REG_PIPELINE_DEPTH
+            assert stack.core.registered_svcs == {'gap', 'pacs', 'bap'}
+            assert [c.args[0] for c in read_supported_commands.call_args_list] == ['GAP', 'PACS', 'BAP']
+
+            # Only the services not registered yet are sent
+            sent.clear()
+            btp.core_reg_svcs('gap', 'pacs', 'ias', 'bap')
+            assert sent == [defs.BTP_SERVICE_ID_IAS]
+
+            # All responses are read after a failure
+            sent.clear()
+            with pytest.raises(BTPError):
+                btp.core_reg_svcs('ascs', 'cap', 'cas')
+            assert sent == [defs.BTP_SERVICE_ID_ASCS, defs.BTP_SERVICE_ID_CAP]
+            assert in_flight == 0
+            assert 'cap' in stack.core.registered_svcs
+            assert 'ascs' not in stack.core.registered_svcs
+
+            # A restarted IUT has no services registered
+            stack.core.event_received(defs.BTP_CORE_EV_IUT_READY, True)
+            assert not stack.core.registered_svcs
+
+    def test_lt_thread_reused(self):
+        run_by = []
+
+        def run_test_case(_self, pts, test_case, exceptions, finish_count, mode):
+            run_by.append((threading.current_thread(), test_case))
+
+        try:
+            with patch('autopts.client.LTThread._run_test_case', run_test_case), \
+                    patch('autopts.client.get_iut', return_value=MagicMock()):
+                finish_count = CounterWithFlag(init_count=0)
+                jobs = [LTJob(None, name, queue.Queue(), finish_count, None) for name in ('GAP/A', 'GAP/B')]
+                for job in jobs:
+                    get_lt_thread(1).submit(job)
+                    assert job.done.wait(5)
+
+                assert finish_count.get_nowait() == 2
+                assert run_by[0][0] is run_by[1][0] is get_lt_thread(1)
+                assert [test_case for _, test_case in run_by] == ['GAP/A', 'GAP/B']
+
+                # An idle worker is not interrupted
+                get_lt_thread(1).interrupt()
+                assert get_lt_thread(1).is_alive()
+        finally:
+            stop_lt_threads()
+
+    def test_lt_thread_interrupt(self):
+        post_runs = []
+        post_run_started = threading.Event()
+
+        def run_test_case(_self, pts, test_case, exceptions, finish_count, mode):
+            _self._set_job_state(_self.job, LT_JOB_RUNNING)
+            try:
+                # Waits outside the wait points, e.g. on the PTS
+                while test_case == 'GAP/STUCK':
+                    time.sleep(0.01)
+            finally:
+                _self._end_running(_self.job, LT_JOB_POST_RUN)
+                post_run_started.set()
+                time.sleep(0.3)
+                post_runs.append(test_case)
+
+        try:
+            with patch('autopts.client.LTThread._run_test_case', run_test_case), \
+                    patch('autopts.client.get_iut', return_value=MagicMock()), \
+                    patch('autopts.client.CANCEL_GRACE_TIME', 0.1):
+                lt_thread = get_lt_thread(1)
+                finish_count = CounterWithFlag(init_count=0)
+
+                # The post-test-case steps outlasting the grace time are not broken
+                job = LTJob(None, 'GAP/SLOW', queue.Queue(), finish_count, None)
+                lt_thread.submit(job)
+                assert post_run_started.wait(5)
+                lt_thread.interrupt()
+                assert job.done.wait(5)
+                assert post_runs == ['GAP/SLOW']
+
+                # A stuck test case is interrupted, its post-test-case steps
+                # run and the worker survives
+                post_run_started.clear()
+                job = LTJob(None, 'GAP/STUCK', queue.Queue(), finish_count, None)
+                lt_thread.submit(job)
+                time.sleep(0.1)
+                lt_thread.interrupt()
+                assert job.done.wait(5)
+                assert post_runs == ['GAP/SLOW', 'GAP/STUCK']
+                assert finish_count.get_nowait() == 2
+                assert lt_thread.is_alive()
+        finally:
+            stop_lt_threads()
+
+    def test_run_recovery_skips_healthy_pts(self):
+        healthy_pts = MagicMock()
+        healthy_pts.ready.return_value = True
+        broken_pts = MagicMock()
+        broken_pts.ready.side_effect = ConnectionRefusedError
+        broken_pts.callback.get_result.return_value = True
+        iut = MagicMock(spec=['stop', 'cleanup_stack'])
+        args = Namespace(iut_map={'0': 'iut0'}, usb_replug_available=False, skip_healthy_recovery=True,
+                         max_server_restart_time=5, superguard=0)
+
+        with patch('autopts.client.get_iut', return_value=iut):
+            durations = run_recovery(args, [healthy_pts, broken_pts], 'BTP TIMEOUT')
+
+        assert len(durations) == 3
+        healthy_pts.recover_pts.assert_not_called()
+        broken_pts.recover_pts.assert_called_once()
+        iut.stop.assert_called_once()
+        iut.cleanup_stack.assert_called_once()
+
+        # Not an IUT failure, the PTS is not probed
+        with patch('autopts.client.get_iut', return_value=iut):
+            run_recovery(args, [healthy_pts], 'SUPERGUARD TIMEOUT')
+
+        healthy_pts.ready.assert_called_once()
+        healthy_pts.recover_pts.assert_called_once()
+
+    def test_run_journal_resume(self):
+        journal_file = 'test/mocks/run_journal.jsonl'
+        delete_file(journal_file)
+        schedule = [{'config_file': 'a.conf', 'test_cases': ['GAP/A', 'GAP/B'], 'iut_map': {}},
+                    {'config_file': 'b.conf', 'test_cases': ['GAP/C', 'GAP/D', 'GAP/E'], 'iut_map': {}}]
+        journal = run_journal.RunJournal(journal_file)
+        journal.open()
+        try:
+            journal.append(run_journal.SCHEDULE, run_config=schedule)
+            for config, test_cases in ((0, ['GAP/A', 'GAP/B']), (1, ['GAP/C'])):
+                journal.append(run_journal.CONFIG, config=config)
+                for test_case in test_cases:
+                    journal.append(run_journal.START, config=config, test_case=test_case, session_log_dir='logs')
+                    journal.append(run_journal.DONE, config=config, test_case=test_case, status='PASS')
+            journal.append(run_journal.CONFIG_DONE, config=0)
+            journal.append(run_journal.START, config=1, test_case='GAP/D', session_log_dir='logs')
+            journal.close()
+            # Torn by a power loss
+            with open(journal_file, 'a') as f:
+                f.write('{"type": "done", "con')
+
+            plan = run_journal.plan_resume(run_journal.RunJournal.read(journal_file))
+            assert plan.config == 1
+            assert plan.done_count == 1
+            assert plan.retried_test_case == 'GAP/D'
+            assert plan.timed_out_test_case is None
+            assert plan.run_config == [(1, dict(schedule[1], test_cases=['GAP/D', 'GAP/E']))]
+            assert plan.session_log_dir == 'logs'
+            assert not plan.completed
+
+            # Terminated again before the retried test case started
+            journal.open()
+            journal.append(run_journal.CONFIG, config=1)
+            journal.close()
+
+            plan = run_journal.plan_resume(run_journal.RunJournal.read(journal_file))
+            assert plan.retried_test_case == 'GAP/D'
+            assert plan.timed_out_test_case is None
+
+            # The retried test case terminates the test run again
+            journal.open()
+            journal.append(run_journal.RESUME, config=1, test_case='GAP/D')
+            journal.append(run_journal.START, config=1, test_case='GAP/D', session_log_dir='logs')
+            journal.close()
+
+            plan = run_journal.plan_resume(run_journal.RunJournal.read(journal_file))
+            assert plan.retried_test_case is None
+            assert plan.timed_out_test_case == 'GAP/D'
+            assert plan.run_config == [(1, dict(schedule[1], test_cases=['GAP/E']))]
+        finally:
+            journal.close()
+            delete_file(journal_file)
+
+    def test_pull_workspace_logs(self):
+        workspace = Path(FILE_PATHS['TMP_DIR'], 'server', 'zephyr-master')
+        shutil.rmtree(workspace, ignore_errors=True)
+        (workspace / 'GAP').mkdir(parents=True)
+        (workspace / 'zephyr-master.pqw6').write_bytes(b'workspace')
+        # Kept files larger than a chunk, walked before the logs
+        (workspace / 'GAP' / 'GAP.bls').write_bytes(b'b' * 64)
+        (workspace / 'GAP_ADV_BV_01_C_2023_08_30_08_50_01.xml').write_bytes(b'<x>Final Verdict:PASS</x>')
+        (workspace / 'GAP_ADV_BV_02_C_2023_08_30_08_51_01.xml').write_bytes(b'<x>Final Verdict:FAIL</x>')
+        (workspace / 'GAP_ADV_BV_03_C_2023_08_30_08_52_01.xml').write_bytes(b'<x>Final Verdict:FAIL</x>')
+
+        chunks = []
+
+        def pull_workspace_logs(workspace_dir, cursor, max_bytes):
+            assert len(chunks) < 10, 'The pull does not end'
+            result = archive_workspace_logs(workspace_dir, cursor, max_bytes)
+            with zipfile.ZipFile(io.BytesIO(result['archive'])) as zf:
+                chunks.append(sorted(zf.namelist()))
+            return result
+
+        proxy = MagicMock()
+        proxy.__enter__.return_value = proxy
+        proxy.pull_workspace_logs.side_effect = pull_workspace_logs
+        args = Namespace(workspace=str(workspace / 'zephyr-master.pqw6'), autopts_mode=AutoPTSMode.AUTO_TCP_IP,
+                         ip_addr=['192.168.0.2'], srv_port=[65000], cron_optim=False)
+        puller = report.ServerLogsPuller(args, FILE_PATHS['TMP_DIR'], FILE_PATHS['PTS_XMLS_DIR'])
+
+        with patch.object(report, 'ServerProxy', return_value=proxy), \
+                patch.object(report, 'copy_server_log_file'), \
+                patch.object(report, 'SERVER_LOGS_CHUNK_SIZE', 32):
+            report.pull_server_logs(args, FILE_PATHS['TMP_DIR'], FILE_PATHS['PTS_XMLS_DIR'], puller=puller)
+
+            # One log per chunk, the kept files only with the last one
+            kept = {'GAP/GAP.bls', 'zephyr-master.pqw6'}
+            assert [len(set(chunk) - kept) for chunk in chunks] == [1, 1, 1]
+            assert [set(chunk) & kept for chunk in chunks] == [set(), set(), kept]
+
+            # The logs are deleted from the workspace, the workspace files are kept
+            assert not list(workspace.glob('*.xml'))
+            assert (workspace / 'zephyr-master.pqw6').exists()
+            assert os.listdir(FILE_PATHS['PTS_XMLS_DIR']) == ['GAP_ADV_BV_01_C_2023_08_30_08_50_01.xml']
+
+            pulled = Path(puller.logs_folder)
+            assert (pulled / 'GAP_ADV_BV_02_C_2023_08_30_08_51_01.xml').exists()
+            assert (pulled / 'GAP' / 'GAP.bls').read_bytes() == b'b' * 64
+
+            # Only new files are pulled at the next call
+            chunks.clear()
+            report.pull_server_logs(args, FILE_PATHS['TMP_DIR'], FILE_PATHS['PTS_XMLS_DIR'], puller=puller)
+            assert chunks == [[]]
+
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    def test_assertion_index(self):
+        session_dir = Path(FILE_PATHS['TMP_DIR'], 'iut_logs', 'cli_port_65001', '2026_01_01_00_00_00')
+
+        def add_run(name, timestamp, content):
+            prefix = name.replace('/', '_')
+            test_case_dir = session_dir / f'{prefix}_{timestamp}'
+            test_case_dir.mkdir(parents=True)
+            (test_case_dir / f'{prefix}_iut0_iutctl.log').write_text(content)
+            return test_case_dir
+
+        first_run = add_run('GAP/ADV/BV-01-C', '2026_01_01_00_00_01', 'ASSERTION FAIL [0] @ a.c:1\n')
+        add_run('GAP/ADV/BV-01-C', '2026_01_01_00_00_02', 'boot\nASSERTION FAIL [1] @ b.c:2\n')
+        add_run('GAP/ADV/BV-02-C', '2026_01_01_00_00_03', 'boot\n')
+
+        index = AssertionIndex(str(session_dir.parent.parent))
+        index.update()
+        # The latest run wins
+        assert index.get('GAP/ADV/BV-01-C') == 'ASSERTION FAIL [1] @ b.c:2'
+        assert index.get('GAP/ADV/BV-02-C') is None
+
+        # Only the new test case directories are scanned
+        (first_run / 'GAP_ADV_BV-01-C_iut0_iutctl.log').write_text('ASSERTION late\n')
+        add_run('GAP/ADV/BV-02-C', '2026_01_01_00_00_04', 'ASSERTION FAIL [2] @ c.c:3')
+        index.update()
+        assert index.get('GAP/ADV/BV-01-C') == 'ASSERTION FAIL [1] @ b.c:2'
+        assert index.get('GAP/ADV/BV-02-C') == 'ASSERTION FAIL [2] @ c.c:3'
+
+    def test_pts_replay(self):
+        logs_dir = Path(FILE_PATHS['TMP_DIR'], 'replay_logs')
+        logs_dir.mkdir(parents=True, exist_ok=True)
+        (logs_dir / 'GAP_ADV_BV_01_C.log').write_text(
+            "2024-01-01 ClientCallback.on_implicit_send INFO client.py 224 on_implicit_send : \n"
+            "    ********************\n"
+            "    BEGIN OnImplicitSend:\n"
+            "    project_name: GAP\n"
+            "    wid: 35\n"
+            "    test_case_name: GAP/ADV/BV-01-C\n"
+            "    description: Please start advertising.\n"
+            "    style: MMI_Style_Ok_Cancel2 0x11141\n"
+            "2024-01-01 DEBUG testcase.py : Sending response True to wid 35 test case GAP/ADV/BV-01-C\n"
+            "2024-01-01 ClientCallback.log INFO client.py : PTS_LOGTYPE_FINAL_VERDICT Final verdict "
+            "10:00:00 GAP/ADV/BV-01-C Final Verdict:FAIL\n")
+
+        recordings = load_recordings_from_logs(logs_dir)
+        assert recordings['GAP/ADV/BV-01-C'] == {
+            'project': 'GAP', 'verdict': 'FAIL',
+            'wids': [{'wid': 35, 'description': 'Please start advertising.',
+                      'style': 0x11141, 'response': 'True'}]}
+
+        pts = PTSReplay(recordings, wid_timeout=5)
+        results = {}
+        done = threading.Event()
+
+        class Callback:
+            def on_implicit_send(self, project_name, wid, test_case_name, description, style):
+                threading.Thread(target=pts.set_wid_response, args=('True',)).start()
+                return "WAIT"
+
+            def log(self, *args):
+                pass
+
+            def set_result(self, method_name, result):
+                results[method_name] = result
+                done.set()
+
+        pts.register_client_callback({'client_callback': Callback()})
+        assert pts.get_test_case_list('GAP') == ['GAP/ADV/BV-01-C']
+        assert pts.run_test_case('GAP', 'GAP/ADV/BV-01-C') == "WAIT"
+        assert done.wait(timeout=5)
+        assert results['run_test_case'] == 'FAIL'
+        assert [wid for _, wid, _ in pts.wid_latencies] == [35]
+
+    def test_wid_handlers_registry(self):
+        handlers = get_wid_handlers([sm_wid.__name__, sm.__name__])
+        assert handlers is get_wid_handlers([sm_wid.__name__, sm.__name__])
+
+        # Stack overrides take precedence over the generic handlers
+        assert handlers[143] is sm_wid.hdl_wid_143
+        assert handlers[100] is sm.hdl_wid_100
+        assert 1 not in handlers
+
+        assert resolve_wid_hdl(sm_wid.sm_wid_hdl, 143, 'SM/PER/KDU/BV-01-C') is sm_wid.hdl_wid_143
+        assert resolve_wid_hdl(sm_wid.sm_wid_hdl, 1, 'SM/PER/KDU/BV-01-C') is None
+
+        # The declared modules are resolved, the dispatchers are never called
+        with patch.object(mesh, 'hdl_wid_13_persistent_storage') as persistent_storage, \
+                patch.object(micp_wid, 'gen_wid_hdl') as gen_wid_hdl:
+            assert resolve_wid_hdl(mesh.mesh_wid_hdl_rpr_persistent_storage, 13, 'MESH/SR/RPR/PDU/BV-01-C') \
+                is mesh.hdl_wid_13
+            assert resolve_wid_hdl(micp_wid.micp_wid_hdl, 2, 'MICP/CL/CGGIT/SER/BV-01-C') is micp.hdl_wid_2
+            persistent_storage.assert_not_called()
+            gen_wid_hdl.assert_not_called()
+
+    def test_wid_handlers_no_bare_sleep(self):
+        sleeps = set()
+        for path in Path('autopts/wid').glob('*.py'):
+            sleeps.update((path.stem, name) for name in find_sleep_calls(path))
+
+        new_sleeps = sorted(sleeps - WID_SLEEP_ALLOWLIST.keys())
+        assert not new_sleeps, f'Wait for the event instead of sleep in {new_sleeps}'
+
+        stale = sorted(WID_SLEEP_ALLOWLIST.keys() - sleeps)
+        assert not stale, f'Remove {stale} from WID_SLEEP_ALLOWLIST'
+
+    def test_test_func_mmi_args(self):
+        received = {}
+
+        def run_lt(handle):
+            test_case = TestCase('GATT', f'GATT/CL/GAW/BV-0{handle}-C',
+                                 cmds=[TestFunc(received.setdefault(handle, []).append, MMI.arg_1, start_wid=69)])
+            for _ in range(100):
+                test_case.start_stop_cmds_by_wid(69, f"Please send prepare write request with handle = '000{handle}'O")
+
+        threads = [threading.Thread(target=run_lt, args=(handle,)) for handle in (1, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Each lower tester gets the arguments of its own MMI
+        assert received == {1: ['0001'] * 100, 2: ['0002'] * 100}
+        assert not hasattr(MMI, 'args')
+
+    def test_gap_bond_disconnected_before_encryption(self):
+        gap = Gap(None, None, None, None, None, None)
+        params = WIDParams(77, 'Please send a disconnect request to terminate connection.', 'GAP/BOND/BON/BV-04-C')
+
+        # The link is dropped between the connection check and the wait
+        with patch.object(gap, 'is_connected', side_effect=[True, False]), \
+                patch.object(gap_wid, 'get_stack', return_value=MagicMock(gap=gap)), \
+                patch.object(gap_wid, 'btp') as btp:
+            assert gap_wid.hdl_wid_77(params) is False
+
+        btp.gap_disconnect.assert_not_called()
+
+    def test_gap_wait_for_found_devices(self):
+        gap = Gap(None, None, None, None, None, None)
+        checks = []
+
+        def condition():
+            checks.append(len(gap.found_devices.data))
+            return len(gap.found_devices.data) == 2
+
+        threading.Timer(0.2, gap.found_devices.data.append, ['dev1']).start()
+        threading.Timer(0.4, gap.found_devices.data.append, ['dev2']).start()
+        assert gap.wait_for_found_devices(5, condition)
+        # Checked once per found device, not at every poll
+        assert checks == [0, 1, 2]
+
+        assert not gap.wait_for_found_devices(0.3, lambda: False)
+
+    def test_wid_params_mmi(self):
+        description = "Please send prepare write request with handle = '00D3'O and size = '45' to the PTS."
+        params = WIDParams(69, description, 'GATT/CL/GAW/BV-01-C')
+        other_lt_params = WIDParams(69, description, 'GATT/CL/GAW/BV-01-C-LT2')
+
+        assert params.mmi.args == ('00D3', '45')
+        # Parsed once and shared by the handlers of both LTs
+        assert params.mmi is other_lt_params.mmi
+        assert WIDParams(69, 'No arguments', '').mmi.args == ()
+
     def test_gap_set_uuid16_svc_data(self):
         advData = {}
         # Test invalid inputs
@@ -305,6 +1245,77 @@ class MyTestCase(unittest.TestCase):
         assert advData[AdType.uuid16_svc_data][1] == struct.pack('<HB', 0xAABB, 1)
         assert advData[AdType.uuid16_svc_data][2] == struct.pack('<HH', 0xFFFF, 0xABCD)
 
+    def test_gatt_decoders(self):
+        uuid128 = bytes(range(16))
+        attrs_rp = (struct.pack('<B', 2) +
+                    struct.pack('<HBB', 0x0001, 0x01, 2) + struct.pack('<H', 0x2800) +
+                    struct.pack('<HBB', 0x0002, 0x11, 16) + uuid128)
+        assert dec_gatts_get_attrs_rp(attrs_rp, len(attrs_rp)) == [
+            (0x0001, 0x01, '2800'), (0x0002, 0x11, '0F0E0D0C0B0A09080706050403020100')]
+
+        incl_rsp = (struct.pack('<B', 1) + struct.pack('<H', 0x0010) +
+                    struct.pack('<HHB', 0x0020, 0x0030, 2) + struct.pack('<H', 0x180F))
+        assert gatt_dec_disc_rsp(incl_rsp, "include") == [((0x0010,), (0x0020, 0x0030, '180F'))]
+
+        desc_rsp = struct.pack('<BHB', 1, 0x0005, 2) + struct.pack('<H', 0x2902)
+        assert gatt_dec_disc_rsp(desc_rsp, "descriptor") == [(0x0005, '2902')]
+
+        attr_val_rp = struct.pack('<BH', 0, 2) + b'\x01\x02'
+        assert dec_gatts_get_attr_val(attr_val_rp, len(attr_val_rp)) == (0, 2, b'\x01\x02')
+
+    def test_gatt_server_snapshot(self):
+        attrs_rp = struct.pack('<BHBB', 1, 0x0001, 0x01, 2) + struct.pack('<H', 0x2803)
+        iut = MagicMock()
+        iut.btp_socket.read.return_value = (
+            dec_hdr(struct.pack('<BBBH', defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_GET_ATTRIBUTES, 0, len(attrs_rp))),
+            [attrs_rp])
+        stack = MagicMock(gatt=Gatt())
+
+        with patch.object(btp_gatt, 'get_iut', return_value=iut), \
+                patch.object(btp_gatt, 'get_stack', return_value=stack):
+            assert btp_gatt.gatts_get_attrs(type_uuid='2803') == [(0x0001, 0x01, '2803')]
+            assert btp_gatt.gatts_get_attrs(type_uuid='2803') == [(0x0001, 0x01, '2803')]
+            assert iut.btp_socket.send.call_count == 1
+
+            # Other filters are separate queries
+            btp_gatt.gatts_get_attrs(type_uuid='2800')
+            assert iut.btp_socket.send.call_count == 2
+
+            # Own database changes invalidate the snapshot
+            stack.gatt.server_snapshot.invalidate('test')
+            btp_gatt.gatts_get_attrs(type_uuid='2803')
+            assert iut.btp_socket.send.call_count == 3
+
+        assert stack.gatt.server_snapshot.hits == 1
+        assert stack.gatt.server_snapshot.misses == 3
+
+    def test_gatt_server_snapshot_values(self):
+        val_rp = struct.pack('<BH', 0, 2) + b'\x01\x02'
+        iut = MagicMock()
+        iut.btp_socket.read.return_value = (
+            dec_hdr(struct.pack('<BBBH', defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_GET_ATTRIBUTE_VALUE, 0,
+                                len(val_rp))),
+            [val_rp])
+        stack = MagicMock(gatt=Gatt())
+        addr = bytes.fromhex('c0ded5bd8813')
+        conn_ev = struct.pack('<B6sHHH', 0, addr, 40, 0, 400)
+        disc_ev = struct.pack('<B6s', 0, addr)
+
+        with patch.object(btp_gatt, 'get_iut', return_value=iut), \
+                patch.object(btp_gatt, 'get_stack', return_value=stack), \
+                patch.object(btp_gap, 'get_stack', return_value=stack):
+            btp_gatt.gatts_get_attr_val(0, '13:88:BD:D5:DE:C0', 0x0003)
+            btp_gatt.gatts_get_attr_val(0, '13:88:BD:D5:DE:C0', 0x0003)
+            assert iut.btp_socket.send.call_count == 1
+
+            # The ATT responses depend on the link, values are read again
+            # after a connection or disconnection
+            for ev, event_data in ((btp_gap.gap_disconnected_ev_, disc_ev), (btp_gap.gap_connected_ev_, conn_ev)):
+                ev(MagicMock(), event_data, len(event_data))
+                btp_gatt.gatts_get_attr_val(0, '13:88:BD:D5:DE:C0', 0x0003)
+
+            assert iut.btp_socket.send.call_count == 3
+
     def test_audio_pack_metadata(self):
         try:
             pack_metadata(stream_context=1234, ccid_list=[0x00], program_info="Abc")
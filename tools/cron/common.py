@@ -630,7 +630,7 @@ def _run_test_without_backup(config):
 
 def _await_test_run_start(config):
     cancel_job = config['cron']['cancel_job']
-    results_file = config['file_paths']['TC_STATS_JSON_FILE']
+    results_file = config['file_paths']['RUN_JOURNAL_FILE']
     error_file = config['file_paths']['ERROR_TXT_FILE']
     timeguard = config['cron']['test_run_timeguard']
     check_interval = config['cron']['check_interval']
@@ -682,7 +682,7 @@ def _is_test_run_completed(final_bot_state_dir):
 
 def _await_test_run_end(config, srv_proc, bot_proc):
     cancel_job = config['cron']['cancel_job']
-    results_file = config['file_paths']['TC_STATS_JSON_FILE']
+    results_file = config['file_paths']['RUN_JOURNAL_FILE']
     error_file = config['file_paths']['ERROR_TXT_FILE']
     final_bot_state_dir = config['file_paths']['BOT_STATE_DIR']
     timeguard = config['cron']['test_run_timeguard']
@@ -701,7 +701,7 @@ def _await_test_run_end(config, srv_proc, bot_proc):
 
         timeout = None
         if os.path.exists(results_file):
-            # After each completed test case the result file should be updated.
+            # The run journal should be appended at each test case.
             # If it is not, it means the bot is stuck on some test case.
             timeout = (timedelta(seconds=current_time - os.path.getmtime(results_file))
                        > timedelta(seconds=timeguard))